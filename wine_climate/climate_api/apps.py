@@ -3,32 +3,60 @@ import os
 import threading
 import time
 from django.apps import AppConfig
+from django.conf import settings
 from django.utils.timezone import now
 
-def run_periodically(interval):  # Interval in seconds (86400s = 1 day)
+def run_periodically(interval):  # Interval in seconds (see CLIMATE_UPDATE_INTERVAL)
     def task():
-        from climate_api.services import update_climate_data_for_all_regions, calculate_climate_insights_for_all_regions
-        from climate_api.models import ClimateInsights
+        from climate_api.services import (
+            update_climate_data_for_all_regions,
+            calculate_climate_insights_for_dirty_regions,
+            compact_climate_insights_history,
+        )
+        from climate_api.partitions import add_upcoming_climate_metrics_partitions
         while True:
             print(f"Fetching latest metrics at {now()}")
             update_data_response = update_climate_data_for_all_regions()
             print(f"Fetching latest metrics response: {update_data_response}")
 
-            if update_data_response["num_days_fetched"] > 0 or not ClimateInsights.objects.exists():
-                print("Calculating climate insights...")
-                insights_response = calculate_climate_insights_for_all_regions()
-                print(f"Climate insights calculation response: {insights_response}")
+            # Only regions that got new metrics (or have never had insights) are recalculated
+            print("Calculating climate insights...")
+            insights_response = calculate_climate_insights_for_dirty_regions()
+            print(f"Climate insights calculation response: {insights_response}")
+
+            compaction_response = compact_climate_insights_history()
+            print(f"Climate insights history compaction response: {compaction_response}")
+
+            # New years get partitions of their own ahead of time (when the metrics table is partitioned)
+            partitions_response = add_upcoming_climate_metrics_partitions()
+            print(f"Climate metrics partitions response: {partitions_response}")
 
             time.sleep(interval)
 
     thread = threading.Thread(target=task, daemon=True)
     thread.start()
 
+def should_run_background_jobs():
+    # Whether this process runs the background task (see CLIMATE_BACKGROUND_JOBS). Left at 'auto', only a process that
+    # serves requests does: the WSGI and ASGI applications set it to 'true' before Django starts, and runserver runs it
+    # in the process that serves (the child when autoreloading). Management commands never start it.
+    if settings.CLIMATE_BACKGROUND_JOBS != 'auto':
+        return settings.CLIMATE_BACKGROUND_JOBS == 'true'
+
+    if sys.argv[1:2] == ['runserver']:
+        return os.environ.get('RUN_MAIN') == 'true' or '--noreload' in sys.argv
+
+    return False
+
 class ClimateApiConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "climate_api"
 
     def ready(self):
-        # Start the background task only if this is the main Django process
-        if not any(arg in ["makemigrations", "migrate", "shell", "test"] for arg in sys.argv):
-            run_periodically(86400)
+        from climate_api.spatial import get_region_spatial_index
+
+        if should_run_background_jobs():
+            run_periodically(settings.CLIMATE_UPDATE_INTERVAL)
+
+            # Build the nearest-region index up front rather than on the first lookup
+            threading.Thread(target=get_region_spatial_index, daemon=True).start()
@@ -0,0 +1,174 @@
+import csv
+import io
+import time
+from itertools import islice
+from climate_api.models import ClimateMetrics
+from django.conf import settings
+from django.db.models import FloatField
+from django.db.models.functions import Cast
+
+# Bulk export of the whole climate_metrics table for offline modelling. Rows are read through a server-side cursor (on
+# PostgreSQL) in fixed-size batches, and each batch is written out before the next is read, so memory is bounded by
+# the batch size however big the table gets.
+#
+# Formats: 'csv', 'arrow' (Arrow IPC stream, one record batch per batch) and 'parquet' (one row group per batch). The
+# last two need pyarrow (in requirements.txt), which is only imported when they're asked for, so CSV exports still
+# work without it.
+
+CLIMATE_METRICS_EXPORT_COLUMNS = ['wine_region_id', 'metric_date', 'temperature_mean', 'relative_humidity_mean', 'precipitation_sum']
+
+CLIMATE_METRICS_EXPORT_FORMATS = {
+    # format: (content type, file extension)
+    'csv': ('text/csv', 'csv'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def iter_climate_metrics_batches(batch_size=None):
+    # Lists of up to batch_size rows, in CLIMATE_METRICS_EXPORT_COLUMNS order. The decimal columns are cast to floats in
+    # the database, which saves building a Decimal for every value.
+    batch_size = batch_size or settings.CLIMATE_EXPORT_BATCH_SIZE
+    rows = (
+        ClimateMetrics.objects
+        .order_by('wine_region_id', 'metric_date')
+        .values_list(
+            'wine_region_id',
+            'metric_date',
+            Cast('temperature_mean', FloatField()),
+            'relative_humidity_mean',
+            Cast('precipitation_sum', FloatField()),
+        )
+        .iterator(chunk_size=batch_size)
+    )
+
+    while batch := list(islice(rows, batch_size)):
+        yield batch
+
+
+def get_export_format_error(export_format):
+    # Why export_format can't be used, or None if it can. Checked before an export starts, since export_climate_metrics
+    # is a generator and wouldn't run until the first chunk is asked for.
+    if export_format not in CLIMATE_METRICS_EXPORT_FORMATS:
+        return f"Unknown export format '{export_format}', expected one of: {', '.join(CLIMATE_METRICS_EXPORT_FORMATS)}"
+
+    if export_format != 'csv':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            return f"The {export_format} export format needs pyarrow installed (pip install pyarrow)"
+
+    return None
+
+
+def export_climate_metrics(export_format, batch_size=None, stats=None):
+    # Yields the export as chunks of bytes, one or so per batch. If given, stats is filled in with 'rows' and 'seconds'
+    # as the export goes.
+    error = get_export_format_error(export_format)
+    if error:
+        raise ValueError(error)
+
+    stats = stats if stats is not None else {}
+    stats.update(rows=0, seconds=0.0)
+    start = time.perf_counter()
+
+    def counted(batches):
+        for batch in batches:
+            stats['rows'] += len(batch)
+            yield batch
+
+    batches = counted(iter_climate_metrics_batches(batch_size))
+    if export_format == 'csv':
+        chunks = write_csv(batches)
+    else:
+        chunks = write_arrow(batches, export_format)
+
+    for chunk in chunks:
+        yield chunk
+        stats['seconds'] = time.perf_counter() - start
+
+
+def write_csv(batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CLIMATE_METRICS_EXPORT_COLUMNS)
+
+    for batch in batches:
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def get_arrow_schema():
+    import pyarrow as pa
+
+    return pa.schema([
+        ('wine_region_id', pa.int64()),
+        ('metric_date', pa.date32()),
+        ('temperature_mean', pa.float64()),
+        ('relative_humidity_mean', pa.int32()),
+        ('precipitation_sum', pa.float64()),
+    ])
+
+
+class ExportSink:
+    # A write-only file for the pyarrow writers that hands back what's been written so far with drain(). It keeps
+    # counting the position across drains, since Parquet records byte offsets in its footer.
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def writable(self):
+        return True
+
+    def drain(self):
+        chunk = b''.join(self.chunks)
+        self.chunks = []
+        return chunk
+
+
+def write_arrow(batches, export_format):
+    # Arrow IPC stream or Parquet, drained after every batch
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = get_arrow_schema()
+    sink = ExportSink()
+    output = pa.PythonFile(sink, mode='w')
+    if export_format == 'parquet':
+        writer = pq.ParquetWriter(output, schema)
+    else:
+        writer = pa.ipc.new_stream(output, schema)
+
+    for batch in batches:
+        columns = list(zip(*batch))
+        record_batch = pa.record_batch(
+            [pa.array(column, type=field.type) for column, field in zip(columns, schema)], schema=schema
+        )
+        if export_format == 'parquet':
+            writer.write_batch(record_batch, row_group_size=len(batch))
+        else:
+            writer.write_batch(record_batch)
+        yield sink.drain()
+
+    writer.close()
+    yield sink.drain()
@@ -0,0 +1,728 @@
+import math
+import numpy as np
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import groupby
+from climate_api.models import ClimateHistogramBin, ClimateMetrics, ClimateMonthlyRollup, ClimateRunningTotal, WineRegion
+from django.conf import settings
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Window
+from django.db.models.functions import Cast, ExtractMonth, ExtractYear, Round
+
+
+@dataclass(frozen=True)
+class InsightThresholds:
+    # Ideal daily temperature (degrees C) and humidity (%) ranges, both inclusive
+    temp_min: float = 25
+    temp_max: float = 32
+    humidity_min: float = 40
+    humidity_max: float = 70
+
+    # Percentage of a month's days that must be in the ideal range for the month to count as "optimal" - totally
+    # arbitrarily picked right now and would be a business decision normally
+    temp_percentage_threshold: float = 15
+    humidity_percentage_threshold: float = 30
+
+    winter_months: tuple = (6, 7, 8)  # June, July, August
+
+
+DEFAULT_THRESHOLDS = InsightThresholds()
+
+
+def get_insight_windows(today=None):
+    # The trailing date ranges that insights are reported over, as (start_date, end_date), both inclusive
+    end_date = today or datetime.today().date()
+    return {
+        'last_10_years': (end_date - timedelta(days=365 * 10), end_date),
+        'last_30_years': (end_date - timedelta(days=365 * 30), end_date),
+    }
+
+
+def summarize_climate_metrics(region_ids=None, thresholds=DEFAULT_THRESHOLDS, today=None, engine=None):
+    # Every count and sum the insights need, per region. region_ids limits this to those regions (default: all of them).
+    #
+    # Returns {region_id: summary}, where each summary is {
+    #     'months': {month: {'total_days', 'temp_days', 'humidity_days'}},                    <- all records
+    #     'last_10_years': {'total_days', 'temp_days', 'humidity_days', 'winter_precipitation'},
+    #     'last_30_years': {'total_days', 'optimal_days'},
+    # }
+    # Regions without any metrics are left out - see empty_summary().
+    #
+    # engine picks how the figures are worked out (default: settings.CLIMATE_INSIGHTS_ENGINE). All give the same results.
+    # - 'rollup': read from the monthly rollups and running totals, without touching the daily rows
+    # - 'orm': aggregated from the daily rows in the database
+    # - 'array': daily rows are loaded into NumPy arrays and aggregated in memory
+    engine = engine or settings.CLIMATE_INSIGHTS_ENGINE
+
+    # Rollups and running totals are only counted against the default thresholds
+    if engine == 'rollup' and thresholds != DEFAULT_THRESHOLDS:
+        engine = 'orm'
+
+    if engine == 'rollup':
+        return summarize_climate_metrics_from_rollups(region_ids, today)
+    if engine == 'orm':
+        return summarize_climate_metrics_in_database(region_ids, thresholds, today)
+    if engine == 'array':
+        return {region_id: arrays.summarize(thresholds, today) for region_id, arrays in iter_climate_arrays(region_ids)}
+
+    raise ValueError(f"Unknown insights engine: {engine}")
+
+
+def summarize_climate_metrics_in_database(region_ids=None, thresholds=DEFAULT_THRESHOLDS, today=None):
+    # A single scan of the metrics table: rows are grouped by region and month, and each figure is a conditional
+    # aggregate over the group rather than a separate query
+    windows = get_insight_windows(today)
+
+    in_temp_range = Q(temperature_mean__gte=thresholds.temp_min, temperature_mean__lte=thresholds.temp_max)
+    in_humidity_range = Q(relative_humidity_mean__gte=thresholds.humidity_min, relative_humidity_mean__lte=thresholds.humidity_max)
+    in_last_10_years = Q(metric_date__range=windows['last_10_years'])
+    in_last_30_years = Q(metric_date__range=windows['last_30_years'])
+
+    base_queryset = ClimateMetrics.objects.all()
+    if region_ids is not None:
+        base_queryset = base_queryset.filter(wine_region_id__in=region_ids)
+
+    monthly_totals = (
+        base_queryset
+        .annotate(month=ExtractMonth('metric_date'))
+        .values('wine_region_id', 'month')
+        .annotate(
+            total_days=Count('id'),
+            temp_days=Count('id', filter=in_temp_range),
+            humidity_days=Count('id', filter=in_humidity_range),
+            last_10_years_total_days=Count('id', filter=in_last_10_years),
+            last_10_years_temp_days=Count('id', filter=in_last_10_years & in_temp_range),
+            last_10_years_humidity_days=Count('id', filter=in_last_10_years & in_humidity_range),
+            last_10_years_winter_precipitation=Sum(
+                'precipitation_sum', filter=in_last_10_years & Q(metric_date__month__in=thresholds.winter_months)
+            ),
+            last_30_years_total_days=Count('id', filter=in_last_30_years),
+            last_30_years_optimal_days=Count('id', filter=in_last_30_years & in_temp_range & in_humidity_range),
+        )
+        .order_by('wine_region_id', 'month')
+    )
+
+    return summarize_monthly_totals(monthly_totals)
+
+
+def summarize_climate_metrics_from_rollups(region_ids=None, today=None):
+    # The same summary as summarize_climate_metrics_in_database without reading any daily rows: the months over all
+    # records come from at most 12 rollups per region per year of history, and the 10 and 30 year windows from the
+    # running totals at either end of each window.
+    windows = get_insight_windows(today)
+
+    rollups = ClimateMonthlyRollup.objects.all()
+    if region_ids is not None:
+        rollups = rollups.filter(wine_region_id__in=region_ids)
+
+    summaries = {}
+
+    # Months over all records
+    monthly_totals = (
+        rollups
+        .values('wine_region_id', 'month')
+        .annotate(total_days=Sum('total_days'), temp_days=Sum('temp_days'), humidity_days=Sum('humidity_days'))
+        .order_by('wine_region_id', 'month')
+    )
+    for row in monthly_totals:
+        summaries.setdefault(row['wine_region_id'], empty_summary())['months'][row['month']] = {
+            'total_days': row['total_days'],
+            'temp_days': row['temp_days'],
+            'humidity_days': row['humidity_days'],
+        }
+
+    # Windows
+    for region_id, totals in get_climate_window_totals(*windows['last_10_years'], region_ids=region_ids).items():
+        summaries.setdefault(region_id, empty_summary())['last_10_years'] = {
+            'total_days': totals['total_days'],
+            'temp_days': totals['temp_days'],
+            'humidity_days': totals['humidity_days'],
+            'winter_precipitation': totals['winter_precipitation'],
+        }
+
+    for region_id, totals in get_climate_window_totals(*windows['last_30_years'], region_ids=region_ids).items():
+        summaries.setdefault(region_id, empty_summary())['last_30_years'] = {
+            'total_days': totals['total_days'],
+            'optimal_days': totals['optimal_days'],
+        }
+
+    return summaries
+
+
+def refresh_monthly_rollups(region_id, start_date, end_date):
+    # Recount the rollups for every month touching start_date to end_date from the region's daily metrics. Called as
+    # metrics are ingested, so the cost is a month or so of rows for a daily top-up.
+    first_day = start_date.replace(day=1)
+    last_day = (end_date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+    in_temp_range = Q(temperature_mean__gte=DEFAULT_THRESHOLDS.temp_min, temperature_mean__lte=DEFAULT_THRESHOLDS.temp_max)
+    in_humidity_range = Q(relative_humidity_mean__gte=DEFAULT_THRESHOLDS.humidity_min, relative_humidity_mean__lte=DEFAULT_THRESHOLDS.humidity_max)
+
+    monthly_totals = (
+        ClimateMetrics.objects
+        .filter(wine_region_id=region_id, metric_date__range=[first_day, last_day])
+        .annotate(year=ExtractYear('metric_date'), month=ExtractMonth('metric_date'))
+        .values('year', 'month')
+        .annotate(
+            total_days=Count('id'),
+            temp_days=Count('id', filter=in_temp_range),
+            humidity_days=Count('id', filter=in_humidity_range),
+            optimal_days=Count('id', filter=in_temp_range & in_humidity_range),
+            precipitation_total=Sum('precipitation_sum'),
+        )
+        .order_by()
+    )
+
+    ClimateMonthlyRollup.objects.bulk_create(
+        [
+            ClimateMonthlyRollup(
+                wine_region_id=region_id,
+                year=row['year'],
+                month=row['month'],
+                total_days=row['total_days'],
+                temp_days=row['temp_days'],
+                humidity_days=row['humidity_days'],
+                optimal_days=row['optimal_days'],
+                precipitation_sum=row['precipitation_total'],
+            )
+            for row in monthly_totals
+        ],
+        update_conflicts=True,
+        unique_fields=['wine_region', 'year', 'month'],
+        update_fields=['total_days', 'temp_days', 'humidity_days', 'optimal_days', 'precipitation_sum'],
+    )
+
+
+RUNNING_TOTAL_FIELDS = ['total_days', 'temp_days', 'humidity_days', 'optimal_days', 'precipitation_sum', 'winter_precipitation_sum']
+
+
+def refresh_running_totals(region_id, start_date):
+    # Recompute the region's running totals from start_date onwards, carrying on from the last one before it. Called as
+    # metrics are ingested: a daily top-up only appends a row or two, while filling a gap in older history rewrites
+    # every running total after it.
+    in_temp_range = Q(temperature_mean__gte=DEFAULT_THRESHOLDS.temp_min, temperature_mean__lte=DEFAULT_THRESHOLDS.temp_max)
+    in_humidity_range = Q(relative_humidity_mean__gte=DEFAULT_THRESHOLDS.humidity_min, relative_humidity_mean__lte=DEFAULT_THRESHOLDS.humidity_max)
+    in_winter = Q(metric_date__month__in=DEFAULT_THRESHOLDS.winter_months)
+
+    previous = (
+        ClimateRunningTotal.objects
+        .filter(wine_region_id=region_id, metric_date__lt=start_date)
+        .order_by('-metric_date')
+        .first()
+    ) or empty_running_total()
+
+    def running(aggregate):
+        return Window(aggregate, order_by=F('metric_date').asc())
+
+    running_totals = (
+        ClimateMetrics.objects
+        .filter(wine_region_id=region_id, metric_date__gte=start_date)
+        .annotate(
+            running_total_days=running(Count('id')),
+            running_temp_days=running(Count('id', filter=in_temp_range)),
+            running_humidity_days=running(Count('id', filter=in_humidity_range)),
+            running_optimal_days=running(Count('id', filter=in_temp_range & in_humidity_range)),
+            running_precipitation=running(Sum('precipitation_sum')),
+            running_winter_precipitation=running(Sum('precipitation_sum', filter=in_winter)),
+        )
+        .values_list(
+            'metric_date', 'running_total_days', 'running_temp_days', 'running_humidity_days',
+            'running_optimal_days', 'running_precipitation', 'running_winter_precipitation',
+        )
+        .order_by()
+    )
+
+    ClimateRunningTotal.objects.bulk_create(
+        [
+            ClimateRunningTotal(
+                wine_region_id=region_id,
+                metric_date=metric_date,
+                total_days=previous.total_days + total_days,
+                temp_days=previous.temp_days + temp_days,
+                humidity_days=previous.humidity_days + humidity_days,
+                optimal_days=previous.optimal_days + optimal_days,
+                precipitation_sum=previous.precipitation_sum + precipitation,
+                winter_precipitation_sum=previous.winter_precipitation_sum + (winter_precipitation or 0),
+            )
+            for metric_date, total_days, temp_days, humidity_days, optimal_days, precipitation, winter_precipitation in running_totals
+        ],
+        batch_size=5000,
+        update_conflicts=True,
+        unique_fields=['wine_region', 'metric_date'],
+        update_fields=RUNNING_TOTAL_FIELDS,
+    )
+
+
+def empty_running_total():
+    # The running totals before a region's first day
+    return ClimateRunningTotal(precipitation_sum=Decimal(0), winter_precipitation_sum=Decimal(0))
+
+
+def get_climate_window_totals(start_date, end_date, region_ids=None):
+    # Totals of each region's metrics from start_date to end_date (both inclusive), against the default thresholds, as
+    # {region_id: {'total_days', 'temp_days', 'humidity_days', 'optimal_days', 'precipitation', 'winter_precipitation'}}.
+    # Two queries however long the window and however many regions: one finds the running totals at either end of
+    # each region's window, the other loads them. Regions without metrics up to end_date are left out.
+    def last_running_total_id(**date_filter):
+        return Subquery(
+            ClimateRunningTotal.objects
+            .filter(wine_region=OuterRef('pk'), **date_filter)
+            .order_by('-metric_date')
+            .values('id')[:1]
+        )
+
+    regions = WineRegion.objects.all()
+    if region_ids is not None:
+        regions = regions.filter(id__in=region_ids)
+
+    boundaries = list(
+        regions
+        .annotate(
+            end_id=last_running_total_id(metric_date__lte=end_date),
+            before_start_id=last_running_total_id(metric_date__lt=start_date),
+        )
+        .filter(end_id__isnull=False)
+        .values_list('id', 'end_id', 'before_start_id')
+    )
+
+    running_totals_by_id = ClimateRunningTotal.objects.in_bulk(
+        [running_total_id for _, end_id, before_start_id in boundaries for running_total_id in (end_id, before_start_id) if running_total_id]
+    )
+    no_days = empty_running_total()
+
+    window_totals = {}
+    for region_id, end_id, before_start_id in boundaries:
+        end = running_totals_by_id[end_id]
+        before_start = running_totals_by_id[before_start_id] if before_start_id else no_days
+
+        window_totals[region_id] = {
+            'total_days': end.total_days - before_start.total_days,
+            'temp_days': end.temp_days - before_start.temp_days,
+            'humidity_days': end.humidity_days - before_start.humidity_days,
+            'optimal_days': end.optimal_days - before_start.optimal_days,
+            'precipitation': end.precipitation_sum - before_start.precipitation_sum,
+            'winter_precipitation': end.winter_precipitation_sum - before_start.winter_precipitation_sum,
+        }
+
+    return window_totals
+
+
+def calculate_climate_window_insights(region_id, start_date, end_date):
+    # Insights for a region over any date range, e.g. the last 5 years or a single season, against the default thresholds
+    totals = get_climate_window_totals(start_date, end_date, region_ids=[region_id]).get(region_id)
+    total_days = totals['total_days'] if totals else 0
+
+    def percentage_of_days(field):
+        return round((totals[field] / total_days) * 100, 2) if total_days else 0
+
+    return {
+        "region_id": region_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_days": total_days,
+        "percentage_days_in_optimal_temp_range": percentage_of_days('temp_days'),
+        "percentage_days_in_optimal_humidity_range": percentage_of_days('humidity_days'),
+        "optimal_conditions_percentage": percentage_of_days('optimal_days'),
+        "precipitation_total": totals['precipitation'] if totals else 0,
+        "winter_precipitation_total": totals['winter_precipitation'] if totals else 0,
+    }
+
+
+def summarize_climate_window(region_ids, start_date=None, end_date=None, thresholds=DEFAULT_THRESHOLDS):
+    # Per-month totals of each region's metrics from start_date to end_date (both inclusive, and either can be left
+    # open), against any thresholds, as {region_id: {month: {'total_days', 'temp_days', 'humidity_days', 'optimal_days',
+    # 'precipitation'}}}. One query however many regions. Windows made of whole months against the default thresholds
+    # are read from the monthly rollups, anything else from the daily rows. Regions without metrics in the window are
+    # left out.
+    whole_months = (start_date is None or start_date.day == 1) and (end_date is None or (end_date + timedelta(days=1)).day == 1)
+
+    if whole_months and thresholds == DEFAULT_THRESHOLDS:
+        rows = ClimateMonthlyRollup.objects.filter(wine_region_id__in=region_ids)
+        if start_date is not None:
+            rows = rows.filter(Q(year__gt=start_date.year) | Q(year=start_date.year, month__gte=start_date.month))
+        if end_date is not None:
+            rows = rows.filter(Q(year__lt=end_date.year) | Q(year=end_date.year, month__lte=end_date.month))
+
+        monthly_totals = (
+            rows
+            .values('wine_region_id', 'month')
+            .annotate(
+                total_days=Sum('total_days'),
+                temp_days=Sum('temp_days'),
+                humidity_days=Sum('humidity_days'),
+                optimal_days=Sum('optimal_days'),
+                precipitation=Sum('precipitation_sum'),
+            )
+        )
+    else:
+        in_temp_range = Q(temperature_mean__gte=thresholds.temp_min, temperature_mean__lte=thresholds.temp_max)
+        in_humidity_range = Q(relative_humidity_mean__gte=thresholds.humidity_min, relative_humidity_mean__lte=thresholds.humidity_max)
+
+        rows = ClimateMetrics.objects.filter(wine_region_id__in=region_ids)
+        if start_date is not None:
+            rows = rows.filter(metric_date__gte=start_date)
+        if end_date is not None:
+            rows = rows.filter(metric_date__lte=end_date)
+
+        monthly_totals = (
+            rows
+            .annotate(month=ExtractMonth('metric_date'))
+            .values('wine_region_id', 'month')
+            .annotate(
+                total_days=Count('id'),
+                temp_days=Count('id', filter=in_temp_range),
+                humidity_days=Count('id', filter=in_humidity_range),
+                optimal_days=Count('id', filter=in_temp_range & in_humidity_range),
+                precipitation=Sum('precipitation_sum'),
+            )
+        )
+
+    window_totals = {}
+    for row in monthly_totals.order_by('wine_region_id', 'month'):
+        window_totals.setdefault(row['wine_region_id'], {})[row['month']] = {
+            'total_days': row['total_days'],
+            'temp_days': row['temp_days'],
+            'humidity_days': row['humidity_days'],
+            'optimal_days': row['optimal_days'],
+            'precipitation': row['precipitation'] or Decimal(0),
+        }
+
+    return window_totals
+
+
+def build_climate_window_insights(region_id, month_totals, thresholds=DEFAULT_THRESHOLDS):
+    # Insights for one region from its summarize_climate_window() totals
+    total_days = sum(totals['total_days'] for totals in month_totals.values())
+    optimal_months = find_optimal_months(month_totals, thresholds)
+
+    def percentage_of_days(field):
+        return round((sum(totals[field] for totals in month_totals.values()) / total_days) * 100, 2) if total_days else 0
+
+    return {
+        "region_id": region_id,
+        "total_days": total_days,
+        "optimal_time_of_year_start_month": optimal_months[0] if optimal_months else None,
+        "optimal_time_of_year_end_month": optimal_months[-1] if optimal_months else None,
+        "percentage_days_in_optimal_temp_range": percentage_of_days('temp_days'),
+        "percentage_days_in_optimal_humidity_range": percentage_of_days('humidity_days'),
+        "optimal_conditions_percentage": percentage_of_days('optimal_days'),
+        "precipitation_total": sum((totals['precipitation'] for totals in month_totals.values()), Decimal(0)),
+        "winter_precipitation_total": sum(
+            (totals['precipitation'] for month, totals in month_totals.items() if month in thresholds.winter_months), Decimal(0)
+        ),
+    }
+
+
+def calculate_batch_climate_insights(region_ids, start_date=None, end_date=None, thresholds=DEFAULT_THRESHOLDS):
+    # Window insights for many regions at once, in the order asked for (repeats dropped), in two queries: one to check
+    # which regions exist and one for all of their totals
+    region_ids = list(dict.fromkeys(region_ids))
+    known_region_ids = set(WineRegion.objects.filter(id__in=region_ids).values_list('id', flat=True))
+    window_totals = summarize_climate_window(known_region_ids, start_date, end_date, thresholds)
+
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "results": [
+            build_climate_window_insights(region_id, window_totals.get(region_id, {}), thresholds)
+            for region_id in region_ids if region_id in known_region_ids
+        ],
+        "missing_region_ids": [region_id for region_id in region_ids if region_id not in known_region_ids],
+    }
+
+
+def summarize_climate_metrics_for_region(region_id, thresholds=DEFAULT_THRESHOLDS, today=None, engine=None):
+    return summarize_climate_metrics([region_id], thresholds, today, engine).get(region_id, empty_summary())
+
+
+def empty_summary():
+    return {
+        'months': {},
+        'last_10_years': {'total_days': 0, 'temp_days': 0, 'humidity_days': 0, 'winter_precipitation': 0},
+        'last_30_years': {'total_days': 0, 'optimal_days': 0},
+    }
+
+
+def summarize_monthly_totals(monthly_totals):
+    # Roll per-(region, month) rows, as produced by summarize_climate_metrics, up into a summary per region
+    summaries = {}
+
+    for row in monthly_totals:
+        summary = summaries.setdefault(row['wine_region_id'], empty_summary())
+
+        summary['months'][row['month']] = {
+            'total_days': row['total_days'],
+            'temp_days': row['temp_days'],
+            'humidity_days': row['humidity_days'],
+        }
+
+        last_10_years = summary['last_10_years']
+        last_10_years['total_days'] += row['last_10_years_total_days']
+        last_10_years['temp_days'] += row['last_10_years_temp_days']
+        last_10_years['humidity_days'] += row['last_10_years_humidity_days']
+        if row['last_10_years_winter_precipitation'] is not None:
+            last_10_years['winter_precipitation'] += row['last_10_years_winter_precipitation']
+
+        summary['last_30_years']['total_days'] += row['last_30_years_total_days']
+        summary['last_30_years']['optimal_days'] += row['last_30_years_optimal_days']
+
+    return summaries
+
+
+class ClimateArrays:
+    # One region's metrics held as typed columns. Once loaded, any number of threshold variants can be summarized
+    # against them without going back to the database, e.g. for threshold sweeps and what-if scenarios.
+
+    def __init__(self, metric_dates, temperature, humidity, precipitation_hundredths):
+        self.metric_dates = np.asarray(metric_dates, dtype='datetime64[D]')
+        self.months = self.metric_dates.astype('datetime64[M]').astype(np.int64) % 12 + 1
+        self.temperature = np.asarray(temperature, dtype=np.float64)
+        self.humidity = np.asarray(humidity, dtype=np.float64)  # missing readings are NaN, which never match a range
+        self.precipitation_hundredths = np.asarray(precipitation_hundredths, dtype=np.int64)  # integers keep sums exact
+
+    def summarize(self, thresholds=DEFAULT_THRESHOLDS, today=None):
+        # Same summary as summarize_climate_metrics_in_database, worked out with vectorized masks
+        windows = get_insight_windows(today)
+
+        in_temp_range = (self.temperature >= thresholds.temp_min) & (self.temperature <= thresholds.temp_max)
+        in_humidity_range = (self.humidity >= thresholds.humidity_min) & (self.humidity <= thresholds.humidity_max)
+        in_last_10_years = self.in_window(*windows['last_10_years'])
+        in_last_30_years = self.in_window(*windows['last_30_years'])
+        in_winter = np.isin(self.months, thresholds.winter_months)
+
+        total_days_by_month = np.bincount(self.months, minlength=13)
+        temp_days_by_month = np.bincount(self.months[in_temp_range], minlength=13)
+        humidity_days_by_month = np.bincount(self.months[in_humidity_range], minlength=13)
+
+        winter_days_last_10_years = in_last_10_years & in_winter
+        if winter_days_last_10_years.any():
+            winter_precipitation = Decimal(int(self.precipitation_hundredths[winter_days_last_10_years].sum())).scaleb(-2)
+        else:
+            winter_precipitation = 0
+
+        return {
+            'months': {
+                month: {
+                    'total_days': int(total_days_by_month[month]),
+                    'temp_days': int(temp_days_by_month[month]),
+                    'humidity_days': int(humidity_days_by_month[month]),
+                }
+                for month in range(1, 13) if total_days_by_month[month]
+            },
+            'last_10_years': {
+                'total_days': int(in_last_10_years.sum()),
+                'temp_days': int((in_last_10_years & in_temp_range).sum()),
+                'humidity_days': int((in_last_10_years & in_humidity_range).sum()),
+                'winter_precipitation': winter_precipitation,
+            },
+            'last_30_years': {
+                'total_days': int(in_last_30_years.sum()),
+                'optimal_days': int((in_last_30_years & in_temp_range & in_humidity_range).sum()),
+            },
+        }
+
+    def in_window(self, start_date, end_date):
+        return (self.metric_dates >= np.datetime64(start_date, 'D')) & (self.metric_dates <= np.datetime64(end_date, 'D'))
+
+
+def load_climate_arrays(region_ids=None):
+    # A ClimateArrays per region, as {region_id: ClimateArrays}, for summarizing the same regions many times over
+    return dict(iter_climate_arrays(region_ids))
+
+
+def iter_climate_arrays(region_ids=None):
+    # Load metrics column by column (no model instances) and yield (region_id, ClimateArrays) one region at a time, so
+    # only the regions asked for are read and only one of them is held in memory at once
+    base_queryset = ClimateMetrics.objects.all()
+    if region_ids is not None:
+        base_queryset = base_queryset.filter(wine_region_id__in=region_ids)
+
+    rows = (
+        base_queryset
+        .order_by('wine_region_id', 'metric_date')
+        .values_list('wine_region_id', 'metric_date', 'temperature_mean', 'relative_humidity_mean', 'precipitation_sum')
+        .iterator(chunk_size=10000)
+    )
+
+    for region_id, region_rows in groupby(rows, key=lambda row: row[0]):
+        metric_dates, temperature, humidity, precipitation_hundredths = [], [], [], []
+        for _, metric_date, temperature_mean, relative_humidity_mean, precipitation_sum in region_rows:
+            metric_dates.append(metric_date)
+            temperature.append(temperature_mean)
+            humidity.append(np.nan if relative_humidity_mean is None else relative_humidity_mean)
+            precipitation_hundredths.append(int(precipitation_sum * 100))
+
+        yield region_id, ClimateArrays(metric_dates, temperature, humidity, precipitation_hundredths)
+
+
+def find_optimal_months(month_counts, thresholds=DEFAULT_THRESHOLDS):
+    # Months where both temperature and humidity pass the threshold for being "optimal", from
+    # {month: {'total_days', 'temp_days', 'humidity_days'}}. Will assume that the optimal time of year may contain
+    # months that aren't optimal, i.e. optimal months don't have to be contiguous
+    optimal_months = []
+    for month in range(1, 13):
+        counts = month_counts.get(month)
+        if not counts or not counts['total_days']:
+            continue
+
+        temp_percentage = (counts['temp_days'] / counts['total_days']) * 100
+        humidity_percentage = (counts['humidity_days'] / counts['total_days']) * 100
+        if temp_percentage > thresholds.temp_percentage_threshold and humidity_percentage > thresholds.humidity_percentage_threshold:
+            optimal_months.append(month)
+
+    return optimal_months
+
+
+def build_climate_insights(region_id, summary, thresholds=DEFAULT_THRESHOLDS):
+    # Turn a summary into the insights stored for a region
+
+
+
+    # OPTIMAL TIME OF YEAR
+
+    optimal_months = find_optimal_months(summary['months'], thresholds)
+
+
+
+    # PERFORMANCE LAST 10 YEARS
+
+    last_10_years = summary['last_10_years']
+
+    if last_10_years['total_days'] > 0:
+        past_10_years_percentage_days_in_optimal_temp_range = (last_10_years['temp_days'] / last_10_years['total_days']) * 100
+        past_10_years_percentage_days_in_optimal_humidity_range = (last_10_years['humidity_days'] / last_10_years['total_days']) * 100
+    else:
+        past_10_years_percentage_days_in_optimal_temp_range = 0
+        past_10_years_percentage_days_in_optimal_humidity_range = 0
+
+
+
+    # OPTIMAL CONDITIONS PERCENTAGE LAST 30 YEARS
+
+    last_30_years = summary['last_30_years']
+    percentage = (last_30_years['optimal_days'] / last_30_years['total_days']) * 100 if last_30_years['total_days'] else 0
+
+    return {
+        "region_id": region_id,
+        "optimal_time_of_year_start_month": optimal_months[0] if optimal_months else None,
+        "optimal_time_of_year_end_month": optimal_months[-1] if optimal_months else None,
+        "past_10_years_winter_precipitation_total": last_10_years['winter_precipitation'],
+        "past_10_years_percentage_days_in_optimal_temp_range": past_10_years_percentage_days_in_optimal_temp_range,
+        "past_10_years_percentage_days_in_optimal_humidity_range": past_10_years_percentage_days_in_optimal_humidity_range,
+        "past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range": round(percentage, 2),
+    }
+
+
+def refresh_climate_histogram(region_id, start_date, end_date):
+    # Rebuild the region's histogram bins for every calendar month touching start_date to end_date. Bins span all years,
+    # so each month is recounted from all of its daily metrics (a daily top-up rereads one month's worth of history).
+    if (end_date - start_date).days >= 365:
+        months = list(range(1, 13))
+    else:
+        months = sorted({(start_date + timedelta(days=offset)).month for offset in range((end_date - start_date).days + 1)})
+
+    bins = (
+        ClimateMetrics.objects
+        .filter(wine_region_id=region_id, metric_date__month__in=months)
+        .annotate(
+            month=ExtractMonth('metric_date'),
+            temperature_bin=Cast(Round(F('temperature_mean') * 10), IntegerField()),
+        )
+        .values('month', 'temperature_bin', 'relative_humidity_mean')
+        .annotate(day_count=Count('id'), precipitation_total=Sum('precipitation_sum'))
+        .order_by()
+    )
+
+    ClimateHistogramBin.objects.filter(wine_region_id=region_id, month__in=months).delete()
+    ClimateHistogramBin.objects.bulk_create([
+        ClimateHistogramBin(
+            wine_region_id=region_id,
+            month=row['month'],
+            temperature_bin=row['temperature_bin'],
+            relative_humidity_bin=row['relative_humidity_mean'],
+            day_count=row['day_count'],
+            precipitation_sum=row['precipitation_total'],
+        )
+        for row in bins
+    ])
+
+
+def refresh_climate_aggregates_for_removed_days(region_id, start_date, end_date):
+    # Bring the region's rollups, running totals and histogram back in line with its daily metrics once the days from
+    # start_date to end_date have been taken out of them. The refreshes above only add and update rows, so the
+    # rollups and running totals for those days are deleted first, then whatever's left of them is recounted.
+    ClimateMonthlyRollup.objects.filter(
+        Q(year__gt=start_date.year) | Q(year=start_date.year, month__gte=start_date.month),
+        Q(year__lt=end_date.year) | Q(year=end_date.year, month__lte=end_date.month),
+        wine_region_id=region_id,
+    ).delete()
+    refresh_monthly_rollups(region_id, start_date, end_date)
+
+    ClimateRunningTotal.objects.filter(wine_region_id=region_id, metric_date__range=[start_date, end_date]).delete()
+    refresh_running_totals(region_id, start_date)
+
+    refresh_climate_histogram(region_id, start_date, end_date)
+
+
+def calculate_what_if_insights(region_id, thresholds=DEFAULT_THRESHOLDS):
+    # Insights over all records for any thresholds, answered from the region's histogram bins in a single query rather
+    # than the daily metrics. Bins don't record the year, so there are no 10 and 30 year windows here.
+    # Bins are whole tenths of a degree and whole percentages, so a threshold between two bins is rounded inwards: the
+    # lowest bin at or above the minimum and the highest at or below the maximum. Decimal keeps e.g. 22.05 from becoming
+    # 220.50000000000003 on the way.
+    temp_min_bin = math.ceil(Decimal(str(thresholds.temp_min)) * 10)
+    temp_max_bin = math.floor(Decimal(str(thresholds.temp_max)) * 10)
+    humidity_min_bin = math.ceil(Decimal(str(thresholds.humidity_min)))
+    humidity_max_bin = math.floor(Decimal(str(thresholds.humidity_max)))
+
+    in_temp_range = Q(temperature_bin__gte=temp_min_bin, temperature_bin__lte=temp_max_bin)
+    in_humidity_range = Q(relative_humidity_bin__gte=humidity_min_bin, relative_humidity_bin__lte=humidity_max_bin)
+
+    monthly_totals = (
+        ClimateHistogramBin.objects
+        .filter(wine_region_id=region_id)
+        .values('month')
+        .annotate(
+            total_days=Sum('day_count'),
+            temp_days=Sum('day_count', filter=in_temp_range),
+            humidity_days=Sum('day_count', filter=in_humidity_range),
+            optimal_days=Sum('day_count', filter=in_temp_range & in_humidity_range),
+            precipitation_total=Sum('precipitation_sum'),
+        )
+        .order_by('month')
+    )
+
+    month_counts = {
+        row['month']: {
+            'total_days': row['total_days'],
+            'temp_days': row['temp_days'] or 0,
+            'humidity_days': row['humidity_days'] or 0,
+            'optimal_days': row['optimal_days'] or 0,
+            'precipitation_total': row['precipitation_total'],
+        }
+        for row in monthly_totals
+    }
+
+    optimal_months = find_optimal_months(month_counts, thresholds)
+    total_days = sum(counts['total_days'] for counts in month_counts.values())
+    optimal_days = sum(counts['optimal_days'] for counts in month_counts.values())
+    winter_precipitation = sum(
+        counts['precipitation_total'] for month, counts in month_counts.items() if month in thresholds.winter_months
+    )
+
+    return {
+        "region_id": region_id,
+        "months": [
+            {
+                "month": month,
+                "total_days": counts['total_days'],
+                "percentage_days_in_optimal_temp_range": round((counts['temp_days'] / counts['total_days']) * 100, 2),
+                "percentage_days_in_optimal_humidity_range": round((counts['humidity_days'] / counts['total_days']) * 100, 2),
+            }
+            for month, counts in month_counts.items()
+        ],
+        "optimal_time_of_year_start_month": optimal_months[0] if optimal_months else None,
+        "optimal_time_of_year_end_month": optimal_months[-1] if optimal_months else None,
+        "winter_precipitation_total": winter_precipitation,
+        "optimal_conditions_percentage": round((optimal_days / total_days) * 100, 2) if total_days else 0,
+    }
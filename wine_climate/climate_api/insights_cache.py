@@ -0,0 +1,85 @@
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+
+# Rendered insights responses are cached under the version of the insights they were rendered from, as read from the
+# database - the created_at of the latest current insights and the number of regions, the same version the ETags are
+# built from. e.g. "climate_insights:all:20:1729240000.123456". Recalculated insights have a new version, so the next
+# request renders and caches them under a new key, in every process and whichever cache backend is used, and the old
+# entries are left to expire.
+
+# Counters for this process
+_cache_stats = {'hits': 0, 'misses': 0, 'fills': 0, 'fill_seconds': 0.0}
+_cache_stats_lock = threading.Lock()
+
+
+def get_climate_insights_cache():
+    return caches[settings.CLIMATE_INSIGHTS_CACHE]
+
+
+def get_climate_insights_cache_key(name, version):
+    created_at, num_regions = version
+    created_at = f'{created_at.timestamp():.6f}' if created_at is not None else 'none'
+    return f'climate_insights:{name}:{num_regions}:{created_at}'
+
+
+def get_cached_climate_insights(name, version, render):
+    # The cached response body for name (e.g. "all" or "region:3") at version, a (created_at, number of regions) pair
+    # read from the current insights, or render() it and cache it on a miss
+    cache = get_climate_insights_cache()
+    key = get_climate_insights_cache_key(name, version)
+
+    body = cache.get(key)
+    if body is not None:
+        record_climate_insights_cache_stat('hits')
+        return body
+
+    record_climate_insights_cache_stat('misses')
+    fill_start = time.perf_counter()
+    body = render()
+    cache.set(key, body, timeout=settings.CLIMATE_INSIGHTS_CACHE_TIMEOUT)
+    record_climate_insights_cache_stat('fills', time.perf_counter() - fill_start)
+
+    return body
+
+
+async def aget_cached_climate_insights(name, version, render):
+    # get_cached_climate_insights() for async views, where render is a coroutine function. The two share cache entries.
+    cache = get_climate_insights_cache()
+    key = get_climate_insights_cache_key(name, version)
+
+    body = await cache.aget(key)
+    if body is not None:
+        record_climate_insights_cache_stat('hits')
+        return body
+
+    record_climate_insights_cache_stat('misses')
+    fill_start = time.perf_counter()
+    body = await render()
+    await cache.aset(key, body, timeout=settings.CLIMATE_INSIGHTS_CACHE_TIMEOUT)
+    record_climate_insights_cache_stat('fills', time.perf_counter() - fill_start)
+
+    return body
+
+
+def record_climate_insights_cache_stat(stat, fill_seconds=0.0):
+    with _cache_stats_lock:
+        _cache_stats[stat] += 1
+        _cache_stats['fill_seconds'] += fill_seconds
+
+
+def get_climate_insights_cache_stats():
+    with _cache_stats_lock:
+        stats = dict(_cache_stats)
+
+    lookups = stats['hits'] + stats['misses']
+    return {
+        'backend': settings.CACHES[settings.CLIMATE_INSIGHTS_CACHE]['BACKEND'],
+        'hits': stats['hits'],
+        'misses': stats['misses'],
+        'hit_rate': round(stats['hits'] / lookups, 4) if lookups else None,
+        'fills': stats['fills'],
+        'fill_seconds_total': round(stats['fill_seconds'], 6),
+        'fill_seconds_average': round(stats['fill_seconds'] / stats['fills'], 6) if stats['fills'] else None,
+    }
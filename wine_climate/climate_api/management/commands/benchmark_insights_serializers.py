@@ -0,0 +1,72 @@
+import time
+import orjson
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from climate_api.models import CurrentClimateInsights, WineRegion
+from climate_api.serializers import CurrentClimateInsightsSerializer, serialize_climate_insights
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rendering insights through the DRF serializer with the values_list() fast path, on synthetic regions "
+        "that are rolled back afterwards"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 100, 10000], help="Numbers of rows to render")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per measurement (the fastest is reported)")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for size in options['sizes']:
+                queryset = self.create_insights(size)
+                self.benchmark(size, queryset, options['repeat'])
+                CurrentClimateInsights.objects.filter(wine_region__name__startswith='Benchmark region ').delete()
+                WineRegion.objects.filter(name__startswith='Benchmark region ').delete()
+
+            transaction.set_rollback(True)
+
+    def create_insights(self, size):
+        regions = WineRegion.objects.bulk_create(
+            [WineRegion(name=f'Benchmark region {i}', latitude=-34.5 + i / 10000, longitude=138.5) for i in range(size)]
+        )
+        CurrentClimateInsights.objects.bulk_create([
+            CurrentClimateInsights(
+                wine_region=region,
+                optimal_time_of_year_start_month=1 + i % 12,
+                optimal_time_of_year_end_month=12 - i % 12,
+                past_10_years_winter_precipitation_total=1000 + i / 100,
+                past_10_years_percentage_days_in_optimal_temp_range=i % 100,
+                past_10_years_percentage_days_in_optimal_humidity_range=(i * 7) % 100,
+                optimal_conditions_percentage_last_30_years=(i * 3) % 100 / 10,
+                created_at=timezone.now(),
+            )
+            for i, region in enumerate(regions)
+        ], batch_size=5000)
+
+        return CurrentClimateInsights.objects.filter(wine_region__name__startswith='Benchmark region ').order_by('wine_region')
+
+    def benchmark(self, size, queryset, repeat):
+        # Each run starts from a fresh queryset (.all()) so nothing is served from an earlier run's result cache
+        paths = {
+            'drf': lambda: JSONRenderer().render(CurrentClimateInsightsSerializer(queryset.all(), many=True).data),
+            'drf + select_related': lambda: JSONRenderer().render(
+                CurrentClimateInsightsSerializer(queryset.select_related('wine_region'), many=True).data
+            ),
+            'values_list + orjson': lambda: orjson.dumps(serialize_climate_insights(queryset.all())),
+        }
+
+        bodies = {}
+        for name, render in paths.items():
+            seconds = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                bodies[name] = render()
+                seconds.append(time.perf_counter() - start)
+
+            self.stdout.write(f"{size:>6} rows  {name:<22} {min(seconds) * 1000:>10.2f}ms")
+
+        if len(set(bodies.values())) != 1:
+            self.stderr.write(self.style.ERROR(f"{size} rows: the rendered bodies differ"))
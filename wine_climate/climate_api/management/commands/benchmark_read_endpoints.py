@@ -0,0 +1,127 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test running servers: each client keeps a connection open and sends GETs one after another for the "
+        "duration, and requests per second and latency percentiles are reported for each URL and number of clients. "
+        "Start the servers first, e.g. gunicorn (WSGI) and uvicorn (ASGI) - see the README."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url', action='append', required=True,
+            help="URL to load, e.g. http://127.0.0.1:8000/api/climate-insights/ (repeat to compare several)",
+        )
+        parser.add_argument('--clients', type=int, nargs='+', default=[50, 200, 1000], help="Numbers of concurrent clients")
+        parser.add_argument('--duration', type=float, default=10, help="Seconds to run each measurement for")
+        parser.add_argument('--timeout', type=float, default=30, help="Seconds before a request counts as failed")
+
+    def handle(self, *args, **options):
+        targets = []
+        for url in options['url']:
+            parts = urlsplit(url)
+            if parts.scheme != 'http' or not parts.hostname:
+                raise CommandError(f"Only plain http:// URLs can be benchmarked, got {url}")
+            path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            targets.append((url, parts.hostname, parts.port or 80, path))
+
+        self.stdout.write(f"{'url':<50} {'clients':>7} {'requests':>9} {'errors':>7} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+        for url, host, port, path in targets:
+            for clients in options['clients']:
+                result = asyncio.run(run_load(host, port, path, clients, options['duration'], options['timeout']))
+                self.stdout.write(
+                    f"{url:<50} {clients:>7} {result['requests']:>9} {result['errors']:>7} {result['requests_per_second']:>9.1f} "
+                    f"{format_ms(result['p50'])} {format_ms(result['p99'])}"
+                )
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:>9.1f}" if seconds is not None else f"{'-':>9}"
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+async def run_load(host, port, path, clients, duration, timeout):
+    latencies = []
+    errors = [0]
+    deadline = time.perf_counter() + duration
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: application/json\r\n\r\n".encode()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, request, deadline, timeout, latencies, errors) for _ in range(clients)))
+    seconds = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_second': len(latencies) / seconds,
+        'p50': percentile(latencies, 0.50),
+        'p99': percentile(latencies, 0.99),
+    }
+
+
+async def run_client(host, port, request, deadline, timeout, latencies, errors):
+    # One client: a keep-alive connection, reopened whenever the server closes it (the time to reconnect counts
+    # towards the request that needed it)
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        request_start = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+
+            writer.write(request)
+            status_code, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+            if 200 <= status_code < 400:
+                latencies.append(time.perf_counter() - request_start)
+            else:
+                errors[0] += 1
+
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+            errors[0] += 1
+            keep_alive = False
+            # Don't spin on a server that's refusing connections
+            await asyncio.sleep(0.01)
+
+        if not keep_alive and writer is not None:
+            writer.close()
+            reader = writer = None
+
+    if writer is not None:
+        writer.close()
+
+
+async def read_response(reader):
+    # (status code, whether the connection can be reused) after reading a whole HTTP/1.1 response
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *header_lines = head.decode('latin-1').split('\r\n')
+    status_code = int(status_line.split(' ', 2)[1])
+
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip().lower()
+
+    if headers.get('transfer-encoding') == 'chunked':
+        while True:
+            size = int((await reader.readuntil(b'\r\n')).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+    elif status_code not in (204, 304):
+        await reader.read()
+        return status_code, False
+
+    return status_code, headers.get('connection') != 'close'
@@ -0,0 +1,85 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+from climate_api.spatial import RegionSpatialIndex, haversine_km
+
+
+class Command(BaseCommand):
+    help = (
+        "Time nearest-region and radius lookups on the spatial index over synthetic regions spread evenly over the "
+        "globe (nothing is written to the database), and check the answers against a brute-force haversine scan"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--regions', type=int, default=100000, help="Number of synthetic regions")
+        parser.add_argument('--queries', type=int, default=1000, help="Number of lookups of each kind")
+        parser.add_argument('--k', type=int, default=5, help="Regions returned by each nearest lookup")
+        parser.add_argument('--radius-km', type=float, default=50, help="Radius of each radius lookup")
+        parser.add_argument('--check', type=int, default=100, help="Number of lookups checked against brute force")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['regions'] < 1 or options['queries'] < 1 or options['k'] < 1:
+            raise CommandError("--regions, --queries and --k must be at least 1")
+
+        random = np.random.default_rng(options['seed'])
+        latitudes, longitudes = random_points(random, options['regions'])
+        query_latitudes, query_longitudes = random_points(random, options['queries'])
+        region_ids = np.arange(1, options['regions'] + 1)
+
+        start = time.perf_counter()
+        spatial_index = RegionSpatialIndex(region_ids, latitudes, longitudes)
+        self.stdout.write(f"Built the index over {options['regions']} regions in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        lookups = {
+            f"nearest {options['k']}": lambda latitude, longitude: spatial_index.nearest(latitude, longitude, options['k']),
+            f"within {options['radius_km']:g}km": lambda latitude, longitude: spatial_index.within(latitude, longitude, options['radius_km']),
+        }
+        brute_force = {
+            f"nearest {options['k']}": lambda distances: np.argsort(distances, kind='stable')[:options['k']],
+            f"within {options['radius_km']:g}km": lambda distances: np.flatnonzero(distances <= options['radius_km']),
+        }
+
+        for name, lookup in lookups.items():
+            seconds = []
+            num_results = 0
+            for latitude, longitude in zip(query_latitudes, query_longitudes):
+                lookup_start = time.perf_counter()
+                results = lookup(latitude, longitude)
+                seconds.append(time.perf_counter() - lookup_start)
+                num_results += len(results)
+
+            seconds = np.array(seconds) * 1e6
+            self.stdout.write(
+                f"{name:<14} mean {seconds.mean():>8.1f}us  p50 {np.percentile(seconds, 50):>8.1f}us  "
+                f"p99 {np.percentile(seconds, 99):>8.1f}us  ({num_results / options['queries']:.1f} regions per lookup)"
+            )
+
+            # Brute force: the haversine distance to every region
+            mismatches = 0
+            brute_force_seconds = []
+            for latitude, longitude in list(zip(query_latitudes, query_longitudes))[:options['check']]:
+                brute_force_start = time.perf_counter()
+                distances = haversine_km(latitude, longitude, latitudes, longitudes)
+                expected = brute_force[name](distances)
+                brute_force_seconds.append(time.perf_counter() - brute_force_start)
+
+                results = lookup(latitude, longitude)
+                if sorted(region_ids[expected].tolist()) != sorted(region_id for region_id, _ in results) or not np.allclose(
+                    np.sort(distances[expected]), [distance_km for _, distance_km in results], atol=1e-6
+                ):
+                    mismatches += 1
+
+            if brute_force_seconds:
+                style = self.style.SUCCESS if not mismatches else self.style.ERROR
+                self.stdout.write(style(
+                    f"{'':<14} {len(brute_force_seconds) - mismatches}/{len(brute_force_seconds)} match a brute-force scan, "
+                    f"which takes {np.mean(brute_force_seconds) * 1e6:.1f}us per lookup"
+                ))
+
+
+def random_points(random, size):
+    # Evenly spread over the sphere, rather than bunched up at the poles
+    latitudes = np.degrees(np.arcsin(random.uniform(-1, 1, size)))
+    longitudes = random.uniform(-180, 180, size)
+    return latitudes, longitudes
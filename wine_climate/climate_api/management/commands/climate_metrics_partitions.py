@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from climate_api.partitions import (
+    create_climate_metrics_year_partition,
+    detach_climate_metrics_year_partition,
+    get_year_partition_name,
+    is_climate_metrics_partitioned,
+    list_climate_metrics_partitions,
+    partition_climate_metrics_by_year,
+    unpartition_climate_metrics,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "List the ClimateMetrics table's yearly partitions (PostgreSQL only), switch the table to or from being "
+        "partitioned by year, or add and detach years"
+    )
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--partition', action='store_true', help="Partition the table by year, copying every row")
+        action.add_argument('--unpartition', action='store_true', help="Turn the table back into a single one, copying every row")
+        action.add_argument('--create', type=int, nargs='+', metavar='YEAR', help="Give these years partitions of their own")
+        action.add_argument(
+            '--detach', type=int, nargs='+', metavar='YEAR',
+            help="Take these years' partitions out of the table, keeping each as a table of its own",
+        )
+        parser.add_argument('--drop', action='store_true', help="With --detach, drop the detached tables")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("Partitioning needs PostgreSQL")
+        if options['drop'] and not options['detach']:
+            raise CommandError("--drop only goes with --detach")
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            partitioned = is_climate_metrics_partitioned(cursor)
+            if (options['create'] or options['detach'] or options['unpartition']) and not partitioned:
+                raise CommandError("The climate metrics table isn't partitioned (see --partition)")
+
+            if options['partition']:
+                if partitioned:
+                    raise CommandError("The climate metrics table is already partitioned")
+                partition_climate_metrics_by_year(cursor)
+                self.stdout.write(self.style.SUCCESS("Partitioned the climate metrics table by year"))
+
+            elif options['unpartition']:
+                unpartition_climate_metrics(cursor)
+                self.stdout.write(self.style.SUCCESS("Turned the climate metrics table back into a single table"))
+
+            elif options['create']:
+                for year in options['create']:
+                    created = create_climate_metrics_year_partition(cursor, year)
+                    self.stdout.write(f"{get_year_partition_name(year)}: {'created' if created else 'already exists'}")
+
+            elif options['detach']:
+                for year in options['detach']:
+                    detached = detach_climate_metrics_year_partition(cursor, year, drop=options['drop'])
+                    outcome = ('dropped' if options['drop'] else 'detached') if detached else 'not a partition'
+                    self.stdout.write(f"{get_year_partition_name(year)}: {outcome}")
+
+        # Listed once the changes above are committed
+        with connection.cursor() as cursor:
+            if not is_climate_metrics_partitioned(cursor):
+                if not options['unpartition']:
+                    self.stdout.write("The climate metrics table isn't partitioned")
+                return
+
+            self.stdout.write(f"{'partition':<40} {'rows':>12} {'size':>12}  bounds")
+            for name, bounds, num_rows, num_bytes in list_climate_metrics_partitions(cursor):
+                self.stdout.write(f"{name:<40} {num_rows:>12} {num_bytes / 1024 / 1024:>10.1f}MB  {bounds}")
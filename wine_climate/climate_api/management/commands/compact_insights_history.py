@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+from climate_api.services import compact_climate_insights_history
+
+
+class Command(BaseCommand):
+    help = "Delete climate insights history rows that fall outside the retention policy (see CLIMATE_INSIGHTS_KEEP_* settings)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report what would be deleted")
+
+    def handle(self, *args, **options):
+        response = compact_climate_insights_history(dry_run=options['dry_run'])
+        if not response['success']:
+            raise CommandError(f"Failed to compact climate insights history: {response['error']}")
+
+        bytes_reclaimed = 'unknown' if response['bytes_reclaimed'] is None else f"{response['bytes_reclaimed'] / 1024:.1f} KiB"
+        self.stdout.write(self.style.SUCCESS(
+            f"{'Would delete' if response['dry_run'] else 'Deleted'} {response['num_rows_deleted']} rows "
+            f"({response['num_rows_kept']} kept), reclaiming about {bytes_reclaimed} in {response['seconds']}s"
+        ))
@@ -0,0 +1,44 @@
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from climate_api.export import CLIMATE_METRICS_EXPORT_FORMATS, export_climate_metrics, get_export_format_error
+
+
+class Command(BaseCommand):
+    help = "Export every region's daily climate metrics as CSV, an Arrow IPC stream or Parquet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--format', choices=list(CLIMATE_METRICS_EXPORT_FORMATS), default='csv', help="Output format")
+        parser.add_argument('--output', default='-', help="File to write to, or - for stdout (the default)")
+        parser.add_argument(
+            '--batch-size', type=int, default=settings.CLIMATE_EXPORT_BATCH_SIZE,
+            help="Rows read and written at a time (default: CLIMATE_EXPORT_BATCH_SIZE)",
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        error = get_export_format_error(options['format'])
+        if error:
+            raise CommandError(error)
+
+        # The summary goes to stderr so it doesn't end up in an export written to stdout
+        stats = {}
+        chunks = export_climate_metrics(options['format'], batch_size=options['batch_size'], stats=stats)
+        if options['output'] == '-':
+            self.write_chunks(chunks, sys.stdout.buffer)
+        else:
+            with open(options['output'], 'wb') as output:
+                self.write_chunks(chunks, output)
+
+        rows_per_second = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {stats['rows']} climate metrics as {options['format']} in {stats['seconds']:.2f}s "
+            f"({rows_per_second:.0f} rows/s)"
+        ))
+
+    def write_chunks(self, chunks, output):
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
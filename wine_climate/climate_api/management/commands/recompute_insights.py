@@ -0,0 +1,29 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from climate_api.services import recompute_climate_insights
+
+
+class Command(BaseCommand):
+    help = "Recalculate climate insights for every wine region, optionally across several worker processes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help="Number of worker processes to spread the regions across (default: number of CPUs, 1 runs in-process)",
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError("--workers must be at least 1")
+
+        response = recompute_climate_insights(options['workers'])
+        if not response['success']:
+            raise CommandError(f"Failed to recompute climate insights: {response['error']}")
+
+        for region_name, seconds in sorted(response['region_seconds'].items(), key=lambda item: item[1], reverse=True):
+            self.stdout.write(f"{region_name}: {seconds * 1000:.1f}ms")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recomputed climate insights for {response['num_regions']} regions in {response['seconds']}s "
+            f"with {options['workers']} worker(s)"
+        ))
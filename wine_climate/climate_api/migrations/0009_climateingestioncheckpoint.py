@@ -0,0 +1,36 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_checkpoints_for_existing_metrics(apps, schema_editor):
+    # Regions that already have metrics are treated as backfilled up to their latest stored day
+    ClimateMetrics = apps.get_model('climate_api', 'ClimateMetrics')
+    ClimateIngestionCheckpoint = apps.get_model('climate_api', 'ClimateIngestionCheckpoint')
+
+    latest_dates = ClimateMetrics.objects.values('wine_region_id').annotate(last_metric_date=models.Max('metric_date'))
+    ClimateIngestionCheckpoint.objects.bulk_create([
+        ClimateIngestionCheckpoint(wine_region_id=row['wine_region_id'], last_metric_date=row['last_metric_date'])
+        for row in latest_dates
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0008_remove_climatemetrics_unique_wine_region_date_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateIngestionCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_metric_date', models.DateField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('wine_region', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='climate_api.wineregion')),
+            ],
+        ),
+        migrations.RunPython(create_checkpoints_for_existing_metrics, migrations.RunPython.noop),
+    ]
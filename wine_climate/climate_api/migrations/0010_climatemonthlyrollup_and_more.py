@@ -0,0 +1,75 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:29
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def populate_monthly_rollups(apps, schema_editor):
+    # Roll up the metrics that are already stored, using the default insight thresholds (25-32 degrees, 40-70% humidity)
+    ClimateMetrics = apps.get_model('climate_api', 'ClimateMetrics')
+    ClimateMonthlyRollup = apps.get_model('climate_api', 'ClimateMonthlyRollup')
+
+    in_temp_range = models.Q(temperature_mean__gte=25, temperature_mean__lte=32)
+    in_humidity_range = models.Q(relative_humidity_mean__gte=40, relative_humidity_mean__lte=70)
+
+    monthly_totals = (
+        ClimateMetrics.objects
+        .annotate(year=ExtractYear('metric_date'), month=ExtractMonth('metric_date'))
+        .values('wine_region_id', 'year', 'month')
+        .annotate(
+            total_days=models.Count('id'),
+            temp_days=models.Count('id', filter=in_temp_range),
+            humidity_days=models.Count('id', filter=in_humidity_range),
+            optimal_days=models.Count('id', filter=in_temp_range & in_humidity_range),
+            precipitation_total=models.Sum('precipitation_sum'),
+        )
+        .order_by()
+    )
+
+    ClimateMonthlyRollup.objects.bulk_create(
+        [
+            ClimateMonthlyRollup(
+                wine_region_id=row['wine_region_id'],
+                year=row['year'],
+                month=row['month'],
+                total_days=row['total_days'],
+                temp_days=row['temp_days'],
+                humidity_days=row['humidity_days'],
+                optimal_days=row['optimal_days'],
+                precipitation_sum=row['precipitation_total'],
+            )
+            for row in monthly_totals
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0009_climateingestioncheckpoint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateMonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField()),
+                ('month', models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('total_days', models.IntegerField(default=0)),
+                ('temp_days', models.IntegerField(default=0)),
+                ('humidity_days', models.IntegerField(default=0)),
+                ('optimal_days', models.IntegerField(default=0)),
+                ('precipitation_sum', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('wine_region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_api.wineregion')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='climatemonthlyrollup',
+            constraint=models.UniqueConstraint(fields=('wine_region', 'year', 'month'), name='unique_wine_region_year_month'),
+        ),
+        migrations.RunPython(populate_monthly_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:30
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models.functions import Cast, ExtractMonth, Round
+
+
+def populate_histogram_bins(apps, schema_editor):
+    ClimateMetrics = apps.get_model('climate_api', 'ClimateMetrics')
+    ClimateHistogramBin = apps.get_model('climate_api', 'ClimateHistogramBin')
+
+    bins = (
+        ClimateMetrics.objects
+        .annotate(
+            month=ExtractMonth('metric_date'),
+            temperature_bin=Cast(Round(models.F('temperature_mean') * 10), models.IntegerField()),
+        )
+        .values('wine_region_id', 'month', 'temperature_bin', 'relative_humidity_mean')
+        .annotate(day_count=models.Count('id'), precipitation_total=models.Sum('precipitation_sum'))
+        .order_by()
+    )
+
+    ClimateHistogramBin.objects.bulk_create(
+        [
+            ClimateHistogramBin(
+                wine_region_id=row['wine_region_id'],
+                month=row['month'],
+                temperature_bin=row['temperature_bin'],
+                relative_humidity_bin=row['relative_humidity_mean'],
+                day_count=row['day_count'],
+                precipitation_sum=row['precipitation_total'],
+            )
+            for row in bins
+        ],
+        batch_size=5000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0010_climatemonthlyrollup_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateHistogramBin',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('temperature_bin', models.IntegerField()),
+                ('relative_humidity_bin', models.IntegerField(null=True)),
+                ('day_count', models.IntegerField(default=0)),
+                ('precipitation_sum', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('wine_region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_api.wineregion')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['wine_region', 'month'], name='climate_api_wine_re_38449d_idx')],
+            },
+        ),
+        migrations.RunPython(populate_histogram_bins, migrations.RunPython.noop),
+    ]
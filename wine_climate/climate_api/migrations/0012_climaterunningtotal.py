@@ -0,0 +1,82 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_running_totals(apps, schema_editor):
+    # Running totals for the metrics that are already stored, using the default insight thresholds (25-32 degrees,
+    # 40-70% humidity, winter is June to August)
+    ClimateMetrics = apps.get_model('climate_api', 'ClimateMetrics')
+    ClimateRunningTotal = apps.get_model('climate_api', 'ClimateRunningTotal')
+
+    in_temp_range = models.Q(temperature_mean__gte=25, temperature_mean__lte=32)
+    in_humidity_range = models.Q(relative_humidity_mean__gte=40, relative_humidity_mean__lte=70)
+    in_winter = models.Q(metric_date__month__in=[6, 7, 8])
+
+    def running(aggregate):
+        return models.Window(aggregate, partition_by=models.F('wine_region_id'), order_by=models.F('metric_date').asc())
+
+    running_totals = (
+        ClimateMetrics.objects
+        .annotate(
+            running_total_days=running(models.Count('id')),
+            running_temp_days=running(models.Count('id', filter=in_temp_range)),
+            running_humidity_days=running(models.Count('id', filter=in_humidity_range)),
+            running_optimal_days=running(models.Count('id', filter=in_temp_range & in_humidity_range)),
+            running_precipitation=running(models.Sum('precipitation_sum')),
+            running_winter_precipitation=running(models.Sum('precipitation_sum', filter=in_winter)),
+        )
+        .values_list(
+            'wine_region_id', 'metric_date', 'running_total_days', 'running_temp_days', 'running_humidity_days',
+            'running_optimal_days', 'running_precipitation', 'running_winter_precipitation',
+        )
+        .order_by()
+    )
+
+    batch = []
+    for region_id, metric_date, total_days, temp_days, humidity_days, optimal_days, precipitation, winter_precipitation in running_totals.iterator(chunk_size=10000):
+        batch.append(ClimateRunningTotal(
+            wine_region_id=region_id,
+            metric_date=metric_date,
+            total_days=total_days,
+            temp_days=temp_days,
+            humidity_days=humidity_days,
+            optimal_days=optimal_days,
+            precipitation_sum=precipitation,
+            winter_precipitation_sum=winter_precipitation or 0,
+        ))
+        if len(batch) >= 5000:
+            ClimateRunningTotal.objects.bulk_create(batch)
+            batch = []
+
+    ClimateRunningTotal.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0011_climatehistogrambin'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClimateRunningTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('metric_date', models.DateField()),
+                ('total_days', models.IntegerField(default=0)),
+                ('temp_days', models.IntegerField(default=0)),
+                ('humidity_days', models.IntegerField(default=0)),
+                ('optimal_days', models.IntegerField(default=0)),
+                ('precipitation_sum', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('winter_precipitation_sum', models.DecimalField(decimal_places=2, default=0.0, max_digits=12)),
+                ('wine_region', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='climate_api.wineregion')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='climaterunningtotal',
+            constraint=models.UniqueConstraint(fields=('wine_region', 'metric_date'), name='unique_wine_region_running_total_date'),
+        ),
+        migrations.RunPython(populate_running_totals, migrations.RunPython.noop),
+    ]
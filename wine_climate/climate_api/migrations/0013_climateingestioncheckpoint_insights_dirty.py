@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0012_climaterunningtotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='climateingestioncheckpoint',
+            name='insights_dirty_from',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='climateingestioncheckpoint',
+            name='insights_dirty_to',
+            field=models.DateField(blank=True, null=True),
+        ),
+    ]
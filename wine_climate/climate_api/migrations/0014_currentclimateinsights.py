@@ -0,0 +1,56 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:38
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+INSIGHTS_FIELDS = [
+    'optimal_time_of_year_start_month',
+    'optimal_time_of_year_end_month',
+    'past_10_years_winter_precipitation_total',
+    'past_10_years_percentage_days_in_optimal_temp_range',
+    'past_10_years_percentage_days_in_optimal_humidity_range',
+    'optimal_conditions_percentage_last_30_years',
+    'created_at',
+]
+
+
+def populate_current_insights(apps, schema_editor):
+    # Copy each region's latest insights out of the history
+    ClimateInsights = apps.get_model('climate_api', 'ClimateInsights')
+    CurrentClimateInsights = apps.get_model('climate_api', 'CurrentClimateInsights')
+
+    latest_ids = ClimateInsights.objects.values('wine_region_id').annotate(latest_id=models.Max('id')).values_list('latest_id', flat=True)
+
+    CurrentClimateInsights.objects.bulk_create([
+        CurrentClimateInsights(wine_region_id=insights.wine_region_id, **{field: getattr(insights, field) for field in INSIGHTS_FIELDS})
+        for insights in ClimateInsights.objects.filter(id__in=latest_ids)
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0013_climateingestioncheckpoint_insights_dirty'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CurrentClimateInsights',
+            fields=[
+                ('optimal_time_of_year_start_month', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('optimal_time_of_year_end_month', models.IntegerField(blank=True, null=True, validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(12)])),
+                ('past_10_years_winter_precipitation_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=10)),
+                ('past_10_years_percentage_days_in_optimal_temp_range', models.DecimalField(decimal_places=2, default=0.0, max_digits=10, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)])),
+                ('past_10_years_percentage_days_in_optimal_humidity_range', models.DecimalField(decimal_places=2, default=0.0, max_digits=10, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)])),
+                ('optimal_conditions_percentage_last_30_years', models.DecimalField(decimal_places=2, default=0.0, max_digits=10, validators=[django.core.validators.MinValueValidator(0.0), django.core.validators.MaxValueValidator(1.0)])),
+                ('wine_region', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='climate_api.wineregion')),
+                ('created_at', models.DateTimeField()),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.RunPython(populate_current_insights, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0014_currentclimateinsights'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='currentclimateinsights',
+            name='created_at',
+            field=models.DateTimeField(db_index=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0015_currentclimateinsights_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='currentclimateinsights',
+            index=models.Index(fields=['-optimal_conditions_percentage_last_30_years', 'wine_region'], name='climate_api_optimal_f7d4dd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='currentclimateinsights',
+            index=models.Index(fields=['-past_10_years_winter_precipitation_total', 'wine_region'], name='climate_api_past_10_9c6840_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='currentclimateinsights',
+            index=models.Index(fields=['-past_10_years_percentage_days_in_optimal_temp_range', 'wine_region'], name='climate_api_past_10_f6825c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='currentclimateinsights',
+            index=models.Index(fields=['-past_10_years_percentage_days_in_optimal_humidity_range', 'wine_region'], name='climate_api_past_10_df9eb1_idx'),
+        ),
+    ]
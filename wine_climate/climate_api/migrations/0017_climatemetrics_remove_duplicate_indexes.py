@@ -0,0 +1,23 @@
+# Generated by Django 4.2.19 on 2026-10-18 08:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0016_currentclimateinsights_ranking_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='climatemetrics',
+            name='climate_api_wine_re_50d6a4_idx',
+        ),
+        migrations.AlterField(
+            model_name='climatemetrics',
+            name='wine_region',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='climate_api.wineregion'),
+        ),
+    ]
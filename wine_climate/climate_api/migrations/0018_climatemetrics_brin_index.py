@@ -0,0 +1,43 @@
+# Generated by Django 4.2.19 on 2026-10-18 09:12
+
+from django.db import migrations
+
+# A BRIN index on climate_metrics.metric_date, on PostgreSQL only - SQLite has no BRIN indexes. It keeps the lowest and
+# highest metric_date of each block of pages, so it's tiny and cheap to keep up to date, and date range scans skip the
+# blocks outside their window. The SQL is written out here, so the migration does the same thing whatever the app's
+# code becomes.
+# Partitioning the table by year isn't done by migrations: see the climate_metrics_partitions command, which also has to
+# be used to unpartition a partitioned table before migrating back past this one. This migration was first named
+# 0018_climatemetrics_brin_index_and_partitioning, and replaces that name so databases that applied it under the old
+# name don't run it again.
+
+
+def add_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS climate_api_climatemetrics_metric_date_brin ON climate_api_climatemetrics USING brin (metric_date)'
+    )
+
+
+def remove_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS climate_api_climatemetrics_metric_date_brin')
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('climate_api', '0018_climatemetrics_brin_index_and_partitioning'),
+    ]
+
+    dependencies = [
+        ('climate_api', '0017_climatemetrics_remove_duplicate_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_brin_index, remove_brin_index),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.19 on 2026-10-18 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('climate_api', '0018_climatemetrics_brin_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wineregion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+    ]
@@ -5,12 +5,16 @@ class WineRegion(models.Model):
     name = models.CharField(max_length=255, unique=True)
     latitude = models.DecimalField(max_digits=9, decimal_places=6)
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)  # the nearest-region index is versioned on this (see spatial.py)
 
     def __str__(self):
         return self.name
 
 class ClimateMetrics(models.Model):
-    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE, db_index=True)
+    # Lookups by region are served by the unique constraint's index, which starts with wine_region, so the foreign key
+    # doesn't get an index of its own. On PostgreSQL there's also a BRIN index on metric_date, and the table can be
+    # partitioned by year - see climate_api.partitions.
+    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE, db_index=False)
     metric_date = models.DateField()
     temperature_mean = models.DecimalField(max_digits=5, decimal_places=1)
     relative_humidity_mean = models.IntegerField(
@@ -20,15 +24,12 @@ class ClimateMetrics(models.Model):
     precipitation_sum = models.DecimalField(max_digits=6, decimal_places=2)
 
     class Meta:
-        indexes = [
-            models.Index(fields=['wine_region', 'metric_date']),
-        ]
         constraints = [
             models.UniqueConstraint(fields=['wine_region', 'metric_date'], name='unique_wine_region_metric_date')
         ]
 
-class ClimateInsights(models.Model):
-    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE, db_index=True)
+class ClimateInsightsFields(models.Model):
+    # The calculated insights, shared by the full history in ClimateInsights and the latest set in CurrentClimateInsights
     optimal_time_of_year_start_month = models.IntegerField(
         validators=[MinValueValidator(1), MaxValueValidator(12)], null=True, blank=True
     )
@@ -47,10 +48,97 @@ class ClimateInsights(models.Model):
     optimal_conditions_percentage_last_30_years = models.DecimalField(
         max_digits=10, decimal_places=2, validators=[MinValueValidator(0.00), MaxValueValidator(1.00)], default=0.00
     )
+
+    class Meta:
+        abstract = True
+
+class ClimateInsights(ClimateInsightsFields):
+    # Append-only history of every set of insights calculated for a region, for looking at trends
+    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['wine_region']),
             models.Index(fields=['created_at'])
-        ]
\ No newline at end of file
+        ]
+
+class CurrentClimateInsights(ClimateInsightsFields):
+    # The latest insights for each region, keyed by region so the insights endpoint is a primary key lookup however long
+    # the history gets. Upserted in the same transaction as the history row it copies.
+    wine_region = models.OneToOneField(WineRegion, on_delete=models.CASCADE, primary_key=True)
+    created_at = models.DateTimeField(db_index=True)  # when these insights were calculated, i.e. created_at of the history row
+
+    class Meta:
+        # For ranking regions by each metric. Ordered best first with ties by region, and read backwards for the worst.
+        indexes = [
+            models.Index(fields=['-optimal_conditions_percentage_last_30_years', 'wine_region']),
+            models.Index(fields=['-past_10_years_winter_precipitation_total', 'wine_region']),
+            models.Index(fields=['-past_10_years_percentage_days_in_optimal_temp_range', 'wine_region']),
+            models.Index(fields=['-past_10_years_percentage_days_in_optimal_humidity_range', 'wine_region']),
+        ]
+
+class ClimateIngestionCheckpoint(models.Model):
+    # Per-region ingestion watermark: the region's climate metrics are complete up to last_metric_date. Only days
+    # after it are checked for gaps, and backfills commit it alongside each chunk of metrics so an interrupted
+    # backfill picks up from here instead of starting over.
+    wine_region = models.OneToOneField(WineRegion, on_delete=models.CASCADE)
+    last_metric_date = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    # The range of days written since the region's insights were last calculated, or null if there haven't been any.
+    # Only regions with new metrics get their insights recalculated.
+    insights_dirty_from = models.DateField(null=True, blank=True)
+    insights_dirty_to = models.DateField(null=True, blank=True)
+
+class ClimateMonthlyRollup(models.Model):
+    # Totals of a region's daily metrics for one calendar month, counted against the default insight thresholds.
+    # Kept up to date as metrics are ingested, so insights can be recalculated from a few hundred of these rather
+    # than every daily row.
+    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE)
+    year = models.IntegerField()
+    month = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(12)])
+    total_days = models.IntegerField(default=0)
+    temp_days = models.IntegerField(default=0)
+    humidity_days = models.IntegerField(default=0)
+    optimal_days = models.IntegerField(default=0)  # days in both the temperature and the humidity range
+    precipitation_sum = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wine_region', 'year', 'month'], name='unique_wine_region_year_month')
+        ]
+
+class ClimateHistogramBin(models.Model):
+    # How many of a region's days in a calendar month (over all years) had a given temperature and humidity, binned at
+    # the precision they're stored in (0.1 degrees, 1%). Ideal ranges can then be counted for any thresholds without
+    # touching the daily metrics, and the number of bins stops growing once the observed range is covered.
+    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE)
+    month = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(12)])
+    temperature_bin = models.IntegerField()  # tenths of a degree C, e.g. 25.3 degrees is 253
+    relative_humidity_bin = models.IntegerField(null=True)  # null for days without a humidity reading
+    day_count = models.IntegerField(default=0)
+    precipitation_sum = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['wine_region', 'month']),
+        ]
+
+class ClimateRunningTotal(models.Model):
+    # Running totals of a region's daily metrics from its first day up to and including metric_date, counted against the
+    # default insight thresholds. The totals for any date range are the row at its end minus the row just before its
+    # start, so a window of any length costs two index lookups instead of a scan of its days.
+    wine_region = models.ForeignKey(WineRegion, on_delete=models.CASCADE)
+    metric_date = models.DateField()
+    total_days = models.IntegerField(default=0)
+    temp_days = models.IntegerField(default=0)
+    humidity_days = models.IntegerField(default=0)
+    optimal_days = models.IntegerField(default=0)  # days in both the temperature and the humidity range
+    precipitation_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    winter_precipitation_sum = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['wine_region', 'metric_date'], name='unique_wine_region_running_total_date')
+        ]
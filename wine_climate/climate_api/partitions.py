@@ -0,0 +1,187 @@
+from datetime import date
+from django.db import connection, transaction
+from climate_api.insights import refresh_climate_aggregates_for_removed_days
+from climate_api.services import mark_climate_insights_dirty
+
+# Optional partitioning of the climate_metrics table by year, on PostgreSQL only. Each calendar year gets a partition
+# of its own (climate_api_climatemetrics_y2024, ...), and days outside them go to a default partition. Queries with a
+# metric_date range, e.g. the 10 and 30 year windows, only read the partitions for those years. A year that's no
+# longer needed can be detached without rewriting or vacuuming the rest of the table.
+#
+# The table is only ever switched over on request, with `manage.py climate_metrics_partitions --partition` (and back
+# with --unpartition). The rows are copied into a new table, which holds a lock on the metrics until it's done.
+#
+# These take a cursor, and name the table directly rather than through the model, since most of them rewrite the table
+# underneath it.
+
+CLIMATE_METRICS_TABLE = 'climate_api_climatemetrics'
+CLIMATE_METRICS_DEFAULT_PARTITION = f'{CLIMATE_METRICS_TABLE}_default'
+CLIMATE_METRICS_ID_SEQUENCE = f'{CLIMATE_METRICS_TABLE}_id_seq'
+
+
+def get_year_partition_name(year):
+    return f'{CLIMATE_METRICS_TABLE}_y{year}'
+
+
+def is_climate_metrics_partitioned(cursor):
+    cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [CLIMATE_METRICS_TABLE])
+    return cursor.fetchone()[0]
+
+
+def partition_climate_metrics_by_year(cursor):
+    rebuild_climate_metrics_table(cursor, by_year=True)
+
+
+def unpartition_climate_metrics(cursor):
+    rebuild_climate_metrics_table(cursor, by_year=False)
+
+
+def rebuild_climate_metrics_table(cursor, by_year):
+    # Copy the metrics into a new table, partitioned by year or not, and swap it in with the same constraints and
+    # indexes. Partitioned tables can't have identity columns (before PostgreSQL 17), so ids come from a sequence.
+    # Rows are copied in date order, which keeps each year's days together for the BRIN index.
+    new_table = f'{CLIMATE_METRICS_TABLE}_new'
+
+    cursor.execute(
+        'SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass '
+        "AND contype != 'n' ORDER BY contype = 'f', conname",
+        [CLIMATE_METRICS_TABLE],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        'SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = %s::regclass '
+        'AND indexrelid NOT IN (SELECT conindid FROM pg_constraint WHERE conrelid = %s::regclass)',
+        [CLIMATE_METRICS_TABLE, CLIMATE_METRICS_TABLE],
+    )
+    index_definitions = [definition.replace(' ON ONLY ', ' ON ') for definition, in cursor.fetchall()]
+
+    # A sequence left from an earlier switch is kept for the new table, rather than dropped along with the old one
+    cursor.execute("SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'id'", [CLIMATE_METRICS_TABLE])
+    if not cursor.fetchone()[0]:
+        cursor.execute(f'ALTER SEQUENCE IF EXISTS {CLIMATE_METRICS_ID_SEQUENCE} OWNED BY NONE')
+
+    cursor.execute(
+        f'CREATE TABLE {new_table} (LIKE {CLIMATE_METRICS_TABLE} INCLUDING DEFAULTS)'
+        + (' PARTITION BY RANGE (metric_date)' if by_year else '')
+    )
+
+    if by_year:
+        cursor.execute(f'SELECT EXTRACT(YEAR FROM min(metric_date))::int, EXTRACT(YEAR FROM max(metric_date))::int FROM {CLIMATE_METRICS_TABLE}')
+        first_year, last_year = cursor.fetchone()
+        current_year = date.today().year
+
+        for year in range(first_year or current_year, max(last_year or current_year, current_year + 1) + 1):
+            cursor.execute(
+                f'CREATE TABLE {get_year_partition_name(year)} PARTITION OF {new_table} FOR VALUES FROM (%s) TO (%s)',
+                [date(year, 1, 1), date(year + 1, 1, 1)],
+            )
+        cursor.execute(f'CREATE TABLE {CLIMATE_METRICS_DEFAULT_PARTITION} PARTITION OF {new_table} DEFAULT')
+
+    cursor.execute(f'INSERT INTO {new_table} SELECT * FROM {CLIMATE_METRICS_TABLE} ORDER BY metric_date, wine_region_id')
+    cursor.execute(f'DROP TABLE {CLIMATE_METRICS_TABLE}')
+    cursor.execute(f'ALTER TABLE {new_table} RENAME TO {CLIMATE_METRICS_TABLE}')
+
+    cursor.execute(f'CREATE SEQUENCE IF NOT EXISTS {CLIMATE_METRICS_ID_SEQUENCE}')
+    cursor.execute(f'ALTER SEQUENCE {CLIMATE_METRICS_ID_SEQUENCE} OWNED BY {CLIMATE_METRICS_TABLE}.id')
+    cursor.execute(f"ALTER TABLE {CLIMATE_METRICS_TABLE} ALTER COLUMN id SET DEFAULT nextval('{CLIMATE_METRICS_ID_SEQUENCE}')")
+    cursor.execute(f"SELECT setval('{CLIMATE_METRICS_ID_SEQUENCE}', coalesce(max(id), 0) + 1, false) FROM {CLIMATE_METRICS_TABLE}")
+
+    # Unique constraints on a partitioned table have to include the partition key, so the primary key becomes
+    # (id, metric_date). ids are still unique, since they all come from the one sequence.
+    for name, constraint_type, definition in constraints:
+        if constraint_type == 'p':
+            definition = 'PRIMARY KEY (id, metric_date)' if by_year else 'PRIMARY KEY (id)'
+        cursor.execute(f'ALTER TABLE {CLIMATE_METRICS_TABLE} ADD CONSTRAINT {connection.ops.quote_name(name)} {definition}')
+
+    for definition in index_definitions:
+        cursor.execute(definition)
+
+    cursor.execute(f'ANALYZE {CLIMATE_METRICS_TABLE}')
+
+
+def create_climate_metrics_year_partition(cursor, year):
+    # Give a year its own partition, moving any of its days out of the default partition first. Returns False if it
+    # already has one.
+    partition = get_year_partition_name(year)
+    cursor.execute('SELECT to_regclass(%s) IS NOT NULL', [partition])
+    if cursor.fetchone()[0]:
+        return False
+
+    start_date, end_date = date(year, 1, 1), date(year + 1, 1, 1)
+    cursor.execute(f'CREATE TABLE {partition} (LIKE {CLIMATE_METRICS_TABLE} INCLUDING DEFAULTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {CLIMATE_METRICS_DEFAULT_PARTITION} WHERE metric_date >= %s AND metric_date < %s RETURNING *) '
+        f'INSERT INTO {partition} SELECT * FROM moved ORDER BY metric_date, wine_region_id',
+        [start_date, end_date],
+    )
+    cursor.execute(f'ALTER TABLE {CLIMATE_METRICS_TABLE} ATTACH PARTITION {partition} FOR VALUES FROM (%s) TO (%s)', [start_date, end_date])
+
+    return True
+
+
+def detach_climate_metrics_year_partition(cursor, year, drop=False):
+    # Take a year's days out of the metrics table. Only the catalog changes, however many rows the year has. The
+    # detached table is kept (for archiving, say) unless drop is set. The monthly rollups, running totals and histogram
+    # of every region with days in the year are then recounted without them, and their insights marked for
+    # recalculation. Returns False if the year has no partition.
+    partition = get_year_partition_name(year)
+    cursor.execute(
+        'SELECT EXISTS (SELECT 1 FROM pg_inherits WHERE inhparent = %s::regclass AND inhrelid = to_regclass(%s))',
+        [CLIMATE_METRICS_TABLE, partition],
+    )
+    if not cursor.fetchone()[0]:
+        return False
+
+    cursor.execute(f'SELECT DISTINCT wine_region_id FROM {partition}')
+    region_ids = [region_id for region_id, in cursor.fetchall()]
+
+    cursor.execute(f'ALTER TABLE {CLIMATE_METRICS_TABLE} DETACH PARTITION {partition}')
+    if drop:
+        cursor.execute(f'DROP TABLE {partition}')
+
+    start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+    for region_id in region_ids:
+        refresh_climate_aggregates_for_removed_days(region_id, start_date, end_date)
+        mark_climate_insights_dirty(region_id, start_date, end_date)
+
+    return True
+
+
+def list_climate_metrics_partitions(cursor):
+    # [(partition, bounds, estimated rows, bytes)] for each partition
+    cursor.execute(
+        'SELECT partition.relname, pg_get_expr(partition.relpartbound, partition.oid), '
+        'greatest(partition.reltuples, 0)::bigint, pg_total_relation_size(partition.oid) '
+        'FROM pg_inherits JOIN pg_class partition ON partition.oid = pg_inherits.inhrelid '
+        'WHERE pg_inherits.inhparent = %s::regclass ORDER BY partition.relname',
+        [CLIMATE_METRICS_TABLE],
+    )
+    return cursor.fetchall()
+
+
+def add_upcoming_climate_metrics_partitions(years_ahead=1):
+    # For the periodic task: make sure this year and the next years_ahead have partitions, so new metrics don't pile up
+    # in the default partition. Does nothing unless the table is partitioned.
+    try:
+        years_added = []
+        if connection.vendor == 'postgresql':
+            with transaction.atomic(), connection.cursor() as cursor:
+                if is_climate_metrics_partitioned(cursor):
+                    current_year = date.today().year
+                    years_added = [
+                        year for year in range(current_year, current_year + years_ahead + 1)
+                        if create_climate_metrics_year_partition(cursor, year)
+                    ]
+
+        return {
+            'success': True,
+            'years_added': years_added,
+            'error': None
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'years_added': [],
+            'error': str(e)
+        }
@@ -1,5 +1,7 @@
+from decimal import Decimal
 from rest_framework import serializers
-from .models import WineRegion, ClimateInsights
+from .insights import DEFAULT_THRESHOLDS, InsightThresholds
+from .models import WineRegion, ClimateInsights, CurrentClimateInsights
 
 class WineRegionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -11,18 +13,6 @@ class WineRegionSerializer(serializers.ModelSerializer):
             'longitude'
         )
 
-class ClimateInsightsSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ClimateInsights
-        fields = (
-            'wine_region',
-            'optimal_time_of_year_start_month',
-            'optimal_time_of_year_end_month',
-            'performance_score_last_10_years',
-            'optimal_conditions_percentage_last_30_years',
-            'created_at'
-        )
-
 class ClimateInsightsSerializer(serializers.ModelSerializer):
     class Meta:
         model = ClimateInsights
@@ -46,4 +36,189 @@ class ClimateInsightsSerializer(serializers.ModelSerializer):
                 "percentage_days_in_optimal_humidity_range": data["past_10_years_percentage_days_in_optimal_humidity_range"],
             },
             "optimal_conditions_percentage_last_30_years": data["optimal_conditions_percentage_last_30_years"],
-        }
\ No newline at end of file
+        }
+
+
+class CurrentClimateInsightsSerializer(ClimateInsightsSerializer):
+    class Meta(ClimateInsightsSerializer.Meta):
+        model = CurrentClimateInsights
+
+
+
+# Fast paths for the list endpoints. These build the same output as the serializers above straight from values_list()
+# rows - one query with the region name joined in, and no serializer fields or model instances per row.
+
+def format_decimal(value, decimal_places):
+    # A decimal the way DRF's DecimalField renders it (a string with a fixed number of decimal places)
+    if value is None:
+        return None
+    return '{:f}'.format(Decimal(value).quantize(Decimal(1).scaleb(-decimal_places)))
+
+
+WINE_REGION_VALUES_FIELDS = ('id', 'name', 'latitude', 'longitude')
+
+CLIMATE_INSIGHTS_VALUES_FIELDS = (
+    'wine_region_id',
+    'wine_region__name',
+    'optimal_time_of_year_start_month',
+    'optimal_time_of_year_end_month',
+    'past_10_years_winter_precipitation_total',
+    'past_10_years_percentage_days_in_optimal_temp_range',
+    'past_10_years_percentage_days_in_optimal_humidity_range',
+    'optimal_conditions_percentage_last_30_years',
+)
+
+
+def wine_region_row_to_dict(row):
+    region_id, name, latitude, longitude = row
+    return {
+        "id": region_id,
+        "name": name,
+        "latitude": format_decimal(latitude, 6),
+        "longitude": format_decimal(longitude, 6),
+    }
+
+
+def climate_insights_row_to_dict(row):
+    # A CLIMATE_INSIGHTS_VALUES_FIELDS row the way ClimateInsightsSerializer renders it
+    (
+        region_id,
+        region_name,
+        start_month,
+        end_month,
+        winter_precipitation_total,
+        percentage_days_in_optimal_temp_range,
+        percentage_days_in_optimal_humidity_range,
+        optimal_conditions_percentage_last_30_years,
+    ) = row
+
+    return {
+        "wine_region": {
+            "id": region_id,
+            "name": region_name,
+        },
+        "optimal_time_of_year": {
+            "start_month": start_month,
+            "end_month": end_month,
+        },
+        "performance_past_10_years": {
+            "winter_precipitation_total": format_decimal(winter_precipitation_total, 2),
+            "percentage_days_in_optimal_temp_range": format_decimal(percentage_days_in_optimal_temp_range, 2),
+            "percentage_days_in_optimal_humidity_range": format_decimal(percentage_days_in_optimal_humidity_range, 2),
+        },
+        "optimal_conditions_percentage_last_30_years": format_decimal(optimal_conditions_percentage_last_30_years, 2),
+    }
+
+
+def serialize_wine_regions(queryset):
+    return [wine_region_row_to_dict(row) for row in queryset.values_list(*WINE_REGION_VALUES_FIELDS)]
+
+
+async def aserialize_wine_regions(queryset):
+    return [wine_region_row_to_dict(row) async for row in queryset.values_list(*WINE_REGION_VALUES_FIELDS)]
+
+
+def serialize_climate_insights(queryset):
+    # Same output as ClimateInsightsSerializer(queryset, many=True).data, for a queryset of ClimateInsights or
+    # CurrentClimateInsights
+    return [climate_insights_row_to_dict(row) for row in queryset.values_list(*CLIMATE_INSIGHTS_VALUES_FIELDS)]
+
+
+async def aserialize_climate_insights(queryset):
+    # serialize_climate_insights() for async views, reading the rows with async iteration
+    return [climate_insights_row_to_dict(row) async for row in queryset.values_list(*CLIMATE_INSIGHTS_VALUES_FIELDS)]
+
+
+class InsightThresholdsSerializer(serializers.Serializer):
+    # Custom thresholds for what-if insights. Anything left out falls back to the default thresholds.
+    temp_min = serializers.FloatField(required=False, default=DEFAULT_THRESHOLDS.temp_min)
+    temp_max = serializers.FloatField(required=False, default=DEFAULT_THRESHOLDS.temp_max)
+    humidity_min = serializers.FloatField(required=False, default=DEFAULT_THRESHOLDS.humidity_min)
+    humidity_max = serializers.FloatField(required=False, default=DEFAULT_THRESHOLDS.humidity_max)
+    temp_percentage_threshold = serializers.FloatField(required=False, default=DEFAULT_THRESHOLDS.temp_percentage_threshold, min_value=0, max_value=100)
+    humidity_percentage_threshold = serializers.FloatField(required=False, default=DEFAULT_THRESHOLDS.humidity_percentage_threshold, min_value=0, max_value=100)
+    winter_months = serializers.ListField(
+        child=serializers.IntegerField(min_value=1, max_value=12), required=False, default=list(DEFAULT_THRESHOLDS.winter_months)
+    )
+
+    def validate(self, data):
+        if data['temp_min'] > data['temp_max']:
+            raise serializers.ValidationError("temp_min can't be greater than temp_max.")
+        if data['humidity_min'] > data['humidity_max']:
+            raise serializers.ValidationError("humidity_min can't be greater than humidity_max.")
+
+        return data
+
+    def to_thresholds(self):
+        return InsightThresholds(**{**self.validated_data, 'winter_months': tuple(self.validated_data['winter_months'])})
+
+
+class ClimateWindowSerializer(serializers.Serializer):
+    # Date range for window insights, both ends inclusive
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+
+    def validate(self, data):
+        if data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date can't be after end_date.")
+
+        return data
+
+
+class ClimateInsightsBatchSerializer(serializers.Serializer):
+    # Body of a batch insights request. Leaving out start_date and/or end_date leaves that end of the window open.
+    region_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), min_length=1, max_length=1000)
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    thresholds = InsightThresholdsSerializer(required=False)
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date can't be after end_date.")
+
+        return data
+
+    def to_thresholds(self):
+        thresholds = self.validated_data.get('thresholds')
+        if thresholds is None:
+            return DEFAULT_THRESHOLDS
+
+        return InsightThresholds(**{**thresholds, 'winter_months': tuple(thresholds['winter_months'])})
+
+
+CLIMATE_INSIGHTS_RANKING_METRICS = [
+    'optimal_conditions_percentage_last_30_years',
+    'past_10_years_winter_precipitation_total',
+    'past_10_years_percentage_days_in_optimal_temp_range',
+    'past_10_years_percentage_days_in_optimal_humidity_range',
+]
+
+
+class ClimateInsightsRankingSerializer(serializers.Serializer):
+    # Query parameters for ranking regions by an insights metric: the `limit` best ('top') or worst ('bottom') regions
+    metric = serializers.ChoiceField(choices=CLIMATE_INSIGHTS_RANKING_METRICS)
+    order = serializers.ChoiceField(choices=['top', 'bottom'], required=False, default='top')
+    limit = serializers.IntegerField(required=False, default=10, min_value=1, max_value=1000)
+
+
+class NearestWineRegionsSerializer(serializers.Serializer):
+    # Query parameters for finding the regions nearest to a point
+    latitude = serializers.FloatField(min_value=-90, max_value=90)
+    longitude = serializers.FloatField(min_value=-180, max_value=180)
+    k = serializers.IntegerField(required=False, default=5, min_value=1, max_value=1000)
+    radius_km = serializers.FloatField(required=False, min_value=0)
+
+
+class ClimateMetricsSeriesSerializer(serializers.Serializer):
+    # Query parameters for reading a region's metrics
+    resolution = serializers.ChoiceField(choices=['day', 'week', 'month', 'year'], required=False, default='day')
+    start_date = serializers.DateField(required=False)
+    end_date = serializers.DateField(required=False)
+    after = serializers.DateField(required=False)  # metric_date of the last row on the previous page
+    limit = serializers.IntegerField(required=False, default=10000, min_value=1, max_value=100000)
+
+    def validate(self, data):
+        if data.get('start_date') and data.get('end_date') and data['start_date'] > data['end_date']:
+            raise serializers.ValidationError("start_date can't be after end_date.")
+
+        return data
@@ -1,95 +1,494 @@
+import csv
+import io
+import ijson
+import multiprocessing
+import threading
+import time
 import requests
+import urllib3
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from climate_api.models import WineRegion, ClimateMetrics, ClimateInsights
-from django.db.models import Max, Sum
-from django.db import transaction
+from decimal import Decimal
+from itertools import groupby
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from climate_api.insights import (
+    build_climate_insights,
+    build_climate_window_insights,
+    empty_summary,
+    refresh_climate_histogram,
+    refresh_monthly_rollups,
+    refresh_running_totals,
+    summarize_climate_metrics,
+    summarize_climate_metrics_for_region,
+    summarize_climate_window,
+)
+from climate_api.models import (
+    WineRegion,
+    ClimateMetrics,
+    ClimateInsights,
+    ClimateInsightsFields,
+    ClimateIngestionCheckpoint,
+    CurrentClimateInsights,
+)
+from django.conf import settings
+from django.db.models import Avg, DecimalField, F, Q, Sum, Value, Window
+from django.db import connection, connections, transaction
 from django.db.models import Count
-from django.db.models.functions import ExtractMonth
+from django.db.models.functions import Coalesce, Greatest, Lag, Lead, Least, TruncMonth, TruncWeek, TruncYear
+from django.utils import timezone
+
+_climate_api_session = None
+_climate_api_session_lock = threading.Lock()
+
+
+def get_climate_api_session():
+    # One keep-alive session shared by every fetch (and every fetch thread) so connections to the API get reused.
+    # Connection errors, 429s and 5xx responses are retried with exponential backoff by the adapter.
+    global _climate_api_session
+
+    with _climate_api_session_lock:
+        if _climate_api_session is None:
+            retry = Retry(
+                total=settings.CLIMATE_FETCH_RETRIES,
+                backoff_factor=settings.CLIMATE_FETCH_BACKOFF,
+                status_forcelist=(429, 500, 502, 503, 504),
+                allowed_methods=('GET',),
+            )
+            adapter = HTTPAdapter(pool_maxsize=settings.CLIMATE_FETCH_CONCURRENCY, max_retries=retry)
+
+            session = requests.Session()
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _climate_api_session = session
+
+    return _climate_api_session
+
+
+def request_climate_data(latitudes, longitudes, start_date, end_date):
+    # Request several locations at once (the API takes comma-separated coordinate lists) and return a list with one
+    # result per location, in the same order. The body is parsed as it streams in rather than with response.json(),
+    # so only the daily arrays are ever held in memory - never the raw body or the decoded document around them.
+    params = {
+        'latitude': ','.join(str(latitude) for latitude in latitudes),
+        'longitude': ','.join(str(longitude) for longitude in longitudes),
+        'start_date': start_date,
+        'end_date': end_date,
+        'models': 'CMCC_CM2_VHR4',
+        'daily': 'temperature_2m_mean,relative_humidity_2m_mean,precipitation_sum',
+    }
+
+    response = get_climate_api_session().get(settings.CLIMATE_API_URL, params=params, timeout=settings.CLIMATE_FETCH_TIMEOUT, stream=True)
+    with response:
+        response.raise_for_status()  # This will raise an error for 4xx or 5xx responses
+        response.raw.decode_content = True
 
-def fetch_climate_data_for_region(latitude, longitude, start_date, end_date):
+        # A single location comes back as a plain object rather than a list of one
+        prefix = 'daily' if len(latitudes) == 1 else 'item.daily'
+
+        climate_data = []
+        try:
+            for key, values in ijson.kvitems(response.raw, prefix):
+                # Each location's daily block lists every variable once, so a repeated key means the next location has started
+                if not climate_data or key in climate_data[-1]['daily']:
+                    climate_data.append({'daily': {}})
+                climate_data[-1]['daily'][key] = values
+
+        # Reading response.raw directly skips requests' own error handling, so a connection that drops or times out
+        # part-way through the body raises urllib3's errors rather than a RequestException
+        except urllib3.exceptions.HTTPError as e:
+            raise requests.ConnectionError(e, response=response) from e
+
+    return climate_data
 
-    url = f"https://climate-api.open-meteo.com/v1/climate?latitude={latitude}&longitude={longitude}&start_date={start_date}&end_date={end_date}&models=CMCC_CM2_VHR4&daily=temperature_2m_mean,relative_humidity_2m_mean,precipitation_sum"
 
+def fetch_climate_data_for_region(latitude, longitude, start_date, end_date):
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # This will raise an error for 4xx or 5xx responses
-        return response.json()
-    except requests.RequestException as e:
+        climate_data = request_climate_data([latitude], [longitude], start_date, end_date)
+        return climate_data[0] if climate_data else None
+    except (requests.RequestException, ijson.JSONError) as e:
         print(f"Error fetching climate data: {e}")
         return None
-    
 
-def update_climate_data_for_all_regions():
+
+def fetch_climate_data_for_region_batch(regions, start_date, end_date):
+    # Fetch several regions in one request. Returns a list of climate data in the same order as regions,
+    # with None for every region in the batch if the request failed.
     try:
-        # Check db to see which dates we have records for. Get whatever is missing in the last 30 years from today.
+        climate_data = request_climate_data(
+            [region.latitude for region in regions], [region.longitude for region in regions], start_date, end_date
+        )
+    except (requests.RequestException, ijson.JSONError) as e:
+        print(f"Error fetching climate data for {len(regions)} regions: {e}")
+        return [None] * len(regions)
+
+    if len(climate_data) != len(regions):
+        print(f"Error fetching climate data: expected {len(regions)} locations, got {len(climate_data)}")
+        return [None] * len(regions)
+
+    return climate_data
+
+
+def fetch_climate_data_for_regions(regions, start_date, end_date, concurrency=None, batch_size=None):
+    # Group regions into multi-location requests and run the batches in parallel, so a run takes as long as the
+    # slowest batch rather than the sum of every region. Returns {region_id: climate_data}, where climate_data is
+    # None if that region's fetch failed.
+    concurrency = concurrency or settings.CLIMATE_FETCH_CONCURRENCY
+    batch_size = batch_size or settings.CLIMATE_FETCH_BATCH_SIZE
+    batches = [regions[i:i + batch_size] for i in range(0, len(regions), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            (batch, executor.submit(fetch_climate_data_for_region_batch, batch, start_date, end_date))
+            for batch in batches
+        ]
+
+    climate_data_by_region = {}
+    for batch, future in futures:
+        for region, climate_data in zip(batch, future.result()):
+            climate_data_by_region[region.id] = climate_data
+
+    return climate_data_by_region
+
+
+# Columns written by the bulk ingestion path, in the order rows are passed in
+CLIMATE_METRICS_COLUMNS = ('wine_region_id', 'metric_date', 'temperature_mean', 'relative_humidity_mean', 'precipitation_sum')
+
+
+def bulk_insert_climate_metrics(rows):
+    # rows is an iterable of tuples in CLIMATE_METRICS_COLUMNS order. Any (region, date) that is already stored
+    # is skipped via the unique_wine_region_metric_date constraint instead of raising.
+    rows = list(rows)
+    if not rows:
+        return 0
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            # COPY is only exposed by psycopg2 cursors, other drivers go through bulk_create
+            if hasattr(cursor, 'copy_expert'):
+                return _copy_climate_metrics(cursor, rows)
+
+    # bulk_create doesn't say how many rows ignore_conflicts skipped, so count what's stored for these regions and
+    # dates before and after
+    num_rows_before = count_stored_climate_metrics(rows)
+    ClimateMetrics.objects.bulk_create(
+        [ClimateMetrics(**dict(zip(CLIMATE_METRICS_COLUMNS, row))) for row in rows],
+        batch_size=settings.CLIMATE_METRICS_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+    return count_stored_climate_metrics(rows) - num_rows_before
+
+
+def count_stored_climate_metrics(rows):
+    # Rows stored for the regions and range of dates that rows cover (served by the (wine_region, metric_date) index)
+    return ClimateMetrics.objects.filter(
+        wine_region_id__in={row[0] for row in rows},
+        metric_date__range=(min(row[1] for row in rows), max(row[1] for row in rows)),
+    ).count()
+
+
+def _copy_climate_metrics(cursor, rows):
+    # COPY can't skip conflicting rows itself, so stream everything into a temporary staging table and
+    # move it across with a single INSERT ... ON CONFLICT DO NOTHING
+    table = connection.ops.quote_name(ClimateMetrics._meta.db_table)
+    columns = ', '.join(CLIMATE_METRICS_COLUMNS)
+
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)  # None is written as an empty field, which COPY reads as NULL
+    buffer.seek(0)
+
+    with transaction.atomic():
+        cursor.execute(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS climate_metrics_staging ("
+            "wine_region_id bigint, metric_date date, temperature_mean numeric(5, 1), "
+            "relative_humidity_mean integer, precipitation_sum numeric(6, 2)"
+            ") ON COMMIT DROP"
+        )
+        cursor.execute("TRUNCATE climate_metrics_staging")
+        cursor.copy_expert(f"COPY climate_metrics_staging ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) SELECT {columns} FROM climate_metrics_staging "
+            f"ON CONFLICT ON CONSTRAINT unique_wine_region_metric_date DO NOTHING"
+        )
+        return cursor.rowcount
+
+
+def climate_data_to_rows(region, climate_data):
+    # Flatten the API's per-variable daily arrays into rows for bulk_insert_climate_metrics
+    dates = climate_data.get('daily', {}).get('time', [])
+    temperature = climate_data.get('daily', {}).get('temperature_2m_mean', [])
+    humidity = climate_data.get('daily', {}).get('relative_humidity_2m_mean', [])
+    precipitation = climate_data.get('daily', {}).get('precipitation_sum', [])
+
+    # Ensure all lists have the same length (they should, but just in case)
+    if not len(dates) == len(temperature) == len(humidity) == len(precipitation):
+        raise Exception(f"Data length mismatch for {region.name}.")
+
+    return list(zip([region.id] * len(dates), dates, temperature, humidity, precipitation))
+
+
+def split_into_year_windows(start_date, end_date):
+    # Calendar-year windows covering start_date to end_date, so window boundaries stay put from one run to the next
+    windows = []
+    window_start = start_date
+    while window_start <= end_date:
+        window_end = min(window_start.replace(month=12, day=31), end_date)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+
+    return windows
+
+
+def find_missing_climate_metrics_ranges(start_date, end_date):
+    # Find the days each region is missing between start_date and end_date, as {region_id: [(first_day, last_day), ...]}.
+    # Each region's checkpoint is its watermark: everything up to it is known to be complete, so only the days after
+    # it are looked at and a daily run touches a handful of rows per region rather than its whole history. Gaps are
+    # found in the database by comparing each stored day with the one before and after it, and only the rows either
+    # side of a gap come back.
+    checkpoints = dict(ClimateIngestionCheckpoint.objects.values_list('wine_region_id', 'last_metric_date'))
+    scan_start_dates = {
+        region_id: max(start_date, checkpoints[region_id] + timedelta(days=1)) if checkpoints.get(region_id) else start_date
+        for region_id in WineRegion.objects.values_list('id', flat=True)
+    }
+
+    # Regions sharing a watermark (usually all of them) share one range condition on (wine_region, metric_date), so the
+    # scan is an index range per group rather than every row joined to its region's checkpoint
+    region_ids_by_scan_start_date = {}
+    for region_id, scan_start_date in scan_start_dates.items():
+        if scan_start_date <= end_date:
+            region_ids_by_scan_start_date.setdefault(scan_start_date, []).append(region_id)
+
+    after_watermarks = Q(pk__in=[])
+    for scan_start_date, region_ids in region_ids_by_scan_start_date.items():
+        after_watermarks |= Q(wine_region_id__in=region_ids, metric_date__range=[scan_start_date, end_date])
+
+    gap_boundaries = (
+        ClimateMetrics.objects
+        .filter(after_watermarks)
+        .annotate(
+            previous_date=Window(Lag('metric_date'), partition_by=[F('wine_region_id')], order_by=F('metric_date').asc()),
+            next_date=Window(Lead('metric_date'), partition_by=[F('wine_region_id')], order_by=F('metric_date').asc()),
+        )
+        .filter(Q(previous_date__isnull=True) | Q(next_date__isnull=True) | Q(metric_date__gt=F('previous_date') + timedelta(days=1)))
+        .order_by('wine_region_id', 'metric_date')
+        .values_list('wine_region_id', 'metric_date', 'previous_date', 'next_date')
+    )
+
+    missing_ranges = {region_id: [] for region_id in scan_start_dates}
+    regions_with_data = set()
+    for region_id, metric_date, previous_date, next_date in gap_boundaries:
+        regions_with_data.add(region_id)
+
+        gap_start = previous_date + timedelta(days=1) if previous_date else scan_start_dates[region_id]
+        if gap_start < metric_date:
+            missing_ranges[region_id].append((gap_start, metric_date - timedelta(days=1)))
+        if next_date is None and metric_date < end_date:
+            missing_ranges[region_id].append((metric_date + timedelta(days=1), end_date))
+
+    # Regions with nothing stored after their watermark are missing the whole range
+    for region_id, scan_start_date in scan_start_dates.items():
+        if region_id not in regions_with_data and scan_start_date <= end_date:
+            missing_ranges[region_id].append((scan_start_date, end_date))
+
+    return missing_ranges
+
+
+def plan_climate_data_chunks(missing_ranges):
+    # Split each region's missing ranges into year-sized chunks, oldest first
+    return {
+        region_id: [window for range_start, range_end in ranges for window in split_into_year_windows(range_start, range_end)]
+        for region_id, ranges in missing_ranges.items()
+    }
+
+
+def fetch_climate_data_for_chunks(chunk_by_region, regions):
+    # Fetch one chunk per region. Regions that need the same dates are batched into the same requests, which in the
+    # usual daily run is all of them. Returns {region_id: climate_data}.
+    regions_by_chunk = {}
+    for region in regions:
+        regions_by_chunk.setdefault(chunk_by_region[region.id], []).append(region)
+
+    climate_data_by_region = {}
+    for (chunk_start, chunk_end), chunk_regions in regions_by_chunk.items():
+        climate_data_by_region.update(
+            fetch_climate_data_for_regions(chunk_regions, chunk_start.strftime('%Y-%m-%d'), chunk_end.strftime('%Y-%m-%d'))
+        )
 
-        # Firstly, figure out start_date and end_date
-        last_record = ClimateMetrics.objects.filter().aggregate(Max('metric_date'))
-        last_fetched_date = last_record['metric_date__max']
+    return climate_data_by_region
 
-        if not last_fetched_date:
-            start_date = datetime.now() - timedelta(days=30*365)  # 30 years ago
-        else:
-            if last_fetched_date == datetime.now().date():
-                # we're up to date already
-                return {
-                    'success': True,
-                    'num_days_fetched': 0,
-                    'error': None
-                }
-            else:
-                start_date = last_fetched_date + timedelta(days=1)
-            
-        end_date = datetime.now()
 
-        # Ensure they're dates (not datetimes) to avoid weird errors
-        if isinstance(start_date, datetime):
-            start_date = start_date.date()
-        if isinstance(end_date, datetime):
-            end_date = end_date.date()        
+def save_climate_data_chunk(region, climate_data, chunk):
+    # Store one fetched chunk, bring the monthly rollups, histogram bins and running totals it touches up to date and move
+    # the region's watermark up to the last day the API returned for it. Returns the number of rows written and the
+    # seconds spent writing them (not counting the rollups and the rest).
+    if not climate_data:
+        raise Exception(f"Failed to fetch or save data for {region.name}")
+
+    chunk_start, chunk_end = chunk
+    rows = climate_data_to_rows(region, climate_data)
+
+    # Days we already have are skipped by the unique constraint rather than checked up front
+    insert_start = time.perf_counter()
+    num_rows_written = bulk_insert_climate_metrics(rows)
+    insert_seconds = time.perf_counter() - insert_start
+
+    # A response that stops short of chunk_end leaves the rest of the chunk after the watermark, for the next run to fetch
+    if rows:
+        last_metric_date = datetime.strptime(str(max(row[1] for row in rows)), '%Y-%m-%d').date()
+        ClimateIngestionCheckpoint.objects.update_or_create(wine_region=region, defaults={'last_metric_date': last_metric_date})
+
+    # Nothing to recount if every day was already stored
+    if num_rows_written:
+        refresh_monthly_rollups(region.id, chunk_start, chunk_end)
+        refresh_climate_histogram(region.id, chunk_start, chunk_end)
+        refresh_running_totals(region.id, chunk_start)
+        mark_climate_insights_dirty(region.id, chunk_start, chunk_end)
+
+    return num_rows_written, insert_seconds
+
+
+def mark_climate_insights_dirty(region_id, start_date, end_date):
+    # Widen the region's range of days written since its insights were last calculated to take in start_date to end_date
+    ClimateIngestionCheckpoint.objects.filter(wine_region_id=region_id).update(
+        insights_dirty_from=Least(Coalesce('insights_dirty_from', Value(start_date)), Value(start_date)),
+        insights_dirty_to=Greatest(Coalesce('insights_dirty_to', Value(end_date)), Value(end_date)),
+    )
+
+
+def advance_climate_ingestion_watermarks(region_ids, last_metric_date):
+    # Mark regions as complete up to last_metric_date, once every gap they had before it has been filled
+    ClimateIngestionCheckpoint.objects.bulk_create(
+        [ClimateIngestionCheckpoint(wine_region_id=region_id, last_metric_date=last_metric_date) for region_id in region_ids],
+        update_conflicts=True,
+        unique_fields=['wine_region'],
+        update_fields=['last_metric_date', 'updated_at'],
+    )
+
+
+def backfill_climate_data(chunks_by_region):
+    # Fetch and commit the planned chunks one round at a time, each (region, chunk) in its own transaction together with
+    # the region's watermark. If a run dies part-way, the next one carries on from each region's watermark rather than
+    # starting over, and memory use is bounded by one chunk per region no matter how much history is missing.
+    wine_regions = {region.id: region for region in WineRegion.objects.filter(id__in=chunks_by_region.keys())}
+    pending_chunks = {region_id: list(chunks) for region_id, chunks in chunks_by_region.items() if chunks}
+    failed_regions = []
+    num_rows_written = 0
+    write_seconds = 0.0
+
+    while pending_chunks:
+        chunk_by_region = {region_id: chunks.pop(0) for region_id, chunks in pending_chunks.items()}
+        regions = [wine_regions[region_id] for region_id in chunk_by_region]
+        climate_data_by_region = fetch_climate_data_for_chunks(chunk_by_region, regions)
+
+        for region in regions:
+            try:
+                with transaction.atomic():
+                    num_chunk_rows, insert_seconds = save_climate_data_chunk(region, climate_data_by_region[region.id], chunk_by_region[region.id])
+                num_rows_written += num_chunk_rows
+                write_seconds += insert_seconds
+
+            except Exception as e:
+                # Later chunks would leave a gap behind the watermark, so leave this region for the next run
+                print(f"Error backfilling climate data for {region.name}: {e}")
+                failed_regions.append(region.name)
+                del pending_chunks[region.id]
+
+        print(f"Backfilled climate data up to {max(chunk_end for chunk_start, chunk_end in chunk_by_region.values())}")
+        pending_chunks = {region_id: chunks for region_id, chunks in pending_chunks.items() if chunks}
+
+    return num_rows_written, write_seconds, failed_regions
+
+
+def count_days_in_chunks(chunks_by_region):
+    # Most days fetched for any one region
+    return max(
+        (sum((chunk_end - chunk_start).days + 1 for chunk_start, chunk_end in chunks) for chunks in chunks_by_region.values()),
+        default=0
+    )
+
+
+def backfill_climate_data_for_all_regions(start_date=None, end_date=None):
+    try:
+        end_date = end_date or datetime.now().date()
+        start_date = start_date or end_date - timedelta(days=30*365)  # 30 years ago
 
         if start_date > end_date:
             raise ValueError("Start date is later than end date.")
-        
-        num_days = (end_date - start_date).days
 
-        start_date_str = start_date.strftime('%Y-%m-%d')
-        end_date_str = end_date.strftime('%Y-%m-%d')
+        chunks_by_region = plan_climate_data_chunks(find_missing_climate_metrics_ranges(start_date, end_date))
+        num_rows_written, write_seconds, failed_regions = backfill_climate_data(chunks_by_region)
+
+        # Regions that were fetched have their watermarks moved by the chunks they saved
+        advance_climate_ingestion_watermarks([region_id for region_id, chunks in chunks_by_region.items() if not chunks], end_date)
+
+        rows_per_second = num_rows_written / write_seconds if write_seconds else 0
+        print(f"Wrote {num_rows_written} climate metrics rows in {write_seconds:.2f}s ({rows_per_second:.0f} rows/s)")
+
+        return {
+            'success': not failed_regions,
+            'num_days_fetched': count_days_in_chunks(chunks_by_region),
+            'num_rows_written': num_rows_written,
+            'rows_per_second': round(rows_per_second),
+            'error': f"Failed to backfill {', '.join(failed_regions)}. Run again to resume." if failed_regions else None
+        }
+
+    except Exception as e:
+        return {
+            'success': False,
+            'records_added': 0,
+            'error': str(e)
+        }
+
 
-        # Get data for those dates for all wine regions. Roll back if anything fails.
-        wine_regions = WineRegion.objects.all()
+def update_climate_data_for_all_regions():
+    try:
+        # Check db to see which days each region is missing in the last 30 years from today, and fetch exactly those
+        end_date = datetime.now().date()
+        start_date = end_date - timedelta(days=30*365)  # 30 years ago
+
+        chunks_by_region = plan_climate_data_chunks(find_missing_climate_metrics_ranges(start_date, end_date))
+        num_days = count_days_in_chunks(chunks_by_region)
+
+        if not num_days:
+            # we're up to date already
+            advance_climate_ingestion_watermarks(chunks_by_region.keys(), end_date)
+            return {
+                'success': True,
+                'num_days_fetched': 0,
+                'error': None
+            }
+
+        # New regions, regions that have fallen well behind and interrupted backfills need more than one chunk. Those
+        # are committed chunk by chunk so progress survives a failure.
+        if any(len(chunks) > 1 for chunks in chunks_by_region.values()):
+            return backfill_climate_data_for_all_regions(start_date, end_date)
+
+        # Otherwise it's the usual daily top-up. Get the missing days for all wine regions. Roll back if anything fails.
+        chunk_by_region = {region_id: chunks[0] for region_id, chunks in chunks_by_region.items() if chunks}
+        wine_regions = list(WineRegion.objects.filter(id__in=chunk_by_region.keys()))
+        climate_data_by_region = fetch_climate_data_for_chunks(chunk_by_region, wine_regions)
+        num_rows_written = 0
+        write_seconds = 0.0
 
         with transaction.atomic(): 
             for region in wine_regions:
-                climate_data = fetch_climate_data_for_region(region.latitude, region.longitude, start_date_str, end_date_str)
-
-                if climate_data:
-                    dates = climate_data.get('daily', {}).get('time', [])
-                    temperature = climate_data.get('daily', {}).get('temperature_2m_mean', [])
-                    humidity = climate_data.get('daily', {}).get('relative_humidity_2m_mean', [])
-                    precipitation = climate_data.get('daily', {}).get('precipitation_sum', [])
-
-                    # Ensure all lists have the same length (they should, but just in case)
-                    if len(dates) == len(temperature) == len(humidity) == len(precipitation):
-                        existing_dates = set(ClimateMetrics.objects.filter(wine_region=region).values_list('metric_date', flat=True))
-                        for i in range(len(dates)):
-                            if dates[i] not in existing_dates:
-                                ClimateMetrics.objects.create(
-                                    wine_region=region,
-                                    metric_date=dates[i],
-                                    temperature_mean=temperature[i],
-                                    relative_humidity_mean=humidity[i],
-                                    precipitation_sum=precipitation[i]
-                                )
-                        print(f"Added climate data for {region.name}")
-                    else:
-                        raise Exception(f"Data length mismatch for {region.name}.")
-                else:
-                    raise Exception(f"Failed to fetch or save data for {region.name}")
+                num_chunk_rows, insert_seconds = save_climate_data_chunk(region, climate_data_by_region[region.id], chunk_by_region[region.id])
+                num_rows_written += num_chunk_rows
+                write_seconds += insert_seconds
+
+                print(f"Added climate data for {region.name}")
+
+            # Regions that were fetched have their watermarks moved by the chunks they saved
+            advance_climate_ingestion_watermarks([region_id for region_id, chunks in chunks_by_region.items() if not chunks], end_date)
+
+        rows_per_second = num_rows_written / write_seconds if write_seconds else 0
+        print(f"Wrote {num_rows_written} climate metrics rows in {write_seconds:.2f}s ({rows_per_second:.0f} rows/s)")
 
         return {
             'success': True,
             'num_days_fetched': num_days,
+            'num_rows_written': num_rows_written,
+            'rows_per_second': round(rows_per_second),
             'error': None
         }
 
@@ -100,58 +499,37 @@ def update_climate_data_for_all_regions():
             'error': str(e)
         }
 
+# The figures below are for a single region, worked out from its per-month totals in summarize_climate_window. The
+# date range only applies when both ends are given.
 
-from django.db.models import Count, Sum
-from django.db.models.functions import ExtractMonth
+def summarize_climate_window_for_region(region_id, start_date=None, end_date=None):
+    if not (start_date and end_date):
+        start_date = end_date = None
 
-def calculate_percentage_of_days_in_ideal_temp_range_by_month_for_region(region_id, start_date=None, end_date=None):
-    try:
-        temp_min = 25
-        temp_max = 32
-
-        # Base queryset with optional date filtering
-        base_queryset = ClimateMetrics.objects.filter(wine_region_id=region_id)
-        if start_date and end_date:
-            base_queryset = base_queryset.filter(metric_date__range=[start_date, end_date])
-
-        # Query to get the number of days in range for each month
-        days_in_range_query = (
-            base_queryset
-            .filter(temperature_mean__gte=temp_min, temperature_mean__lte=temp_max)
-            .annotate(month=ExtractMonth('metric_date'))
-            .values('month')
-            .annotate(days_in_range=Count('id'))
-            .order_by('month')
-        )
+    return summarize_climate_window([region_id], start_date, end_date).get(region_id, {})
 
-        # Query to get the total number of days for each month
-        total_days_query = (
-            base_queryset
-            .annotate(month=ExtractMonth('metric_date'))
-            .values('month')
-            .annotate(total_days=Count('id'))
-            .order_by('month')
-        )
 
-        # Convert to dictionaries for easier lookup
-        days_in_range_dict = {item['month']: item['days_in_range'] for item in days_in_range_query}
-        total_days_dict = {item['month']: item['total_days'] for item in total_days_query}
+def percentage_of_days_in_range_by_month(month_totals, field):
+    result = []
+    for month in range(1, 13):
+        days_in_range = month_totals[month][field] if month in month_totals else 0
+        total_days = month_totals[month]['total_days'] if month in month_totals else 0
+        percentage = (days_in_range / total_days) * 100 if total_days else 0
+
+        result.append({
+            'month': month,
+            'days_in_range': days_in_range,
+            'total_days': total_days,
+            'percentage_in_range': percentage
+        })
 
-        # Create a result for all months (1-12)
-        result = []
-        for month in range(1, 13):
-            days_in_range = days_in_range_dict.get(month, 0)
-            total_days = total_days_dict.get(month, 0)
-            percentage = (days_in_range / total_days) * 100 if total_days else 0
+    return result
 
-            result.append({
-                'month': month,
-                'days_in_range': days_in_range,
-                'total_days': total_days,
-                'percentage_in_range': percentage
-            })
 
-        return result
+def calculate_percentage_of_days_in_ideal_temp_range_by_month_for_region(region_id, start_date=None, end_date=None):
+    try:
+        month_totals = summarize_climate_window_for_region(region_id, start_date, end_date)
+        return percentage_of_days_in_range_by_month(month_totals, 'temp_days')
 
     except Exception as e:
         return f'Error calculating temperatures for region id {region_id}: {e}'
@@ -159,52 +537,8 @@ def calculate_percentage_of_days_in_ideal_temp_range_by_month_for_region(region_
 
 def calculate_percentage_of_days_in_ideal_humidity_range_by_month_for_region(region_id, start_date=None, end_date=None):
     try:
-        humidity_min = 40
-        humidity_max = 70
-
-        # Base queryset with optional date filtering
-        base_queryset = ClimateMetrics.objects.filter(wine_region_id=region_id)
-        if start_date and end_date:
-            base_queryset = base_queryset.filter(metric_date__range=[start_date, end_date])
-
-        # Query to get the number of days in range for each month
-        days_in_range_query = (
-            base_queryset
-            .filter(relative_humidity_mean__gte=humidity_min, relative_humidity_mean__lte=humidity_max)
-            .annotate(month=ExtractMonth('metric_date'))
-            .values('month')
-            .annotate(days_in_range=Count('id'))
-            .order_by('month')
-        )
-
-        # Query to get the total number of days for each month
-        total_days_query = (
-            base_queryset
-            .annotate(month=ExtractMonth('metric_date'))
-            .values('month')
-            .annotate(total_days=Count('id'))
-            .order_by('month')
-        )
-
-        # Convert to dictionaries for easier lookup
-        days_in_range_dict = {item['month']: item['days_in_range'] for item in days_in_range_query}
-        total_days_dict = {item['month']: item['total_days'] for item in total_days_query}
-
-        # Create a result for all months (1-12)
-        result = []
-        for month in range(1, 13):
-            days_in_range = days_in_range_dict.get(month, 0)
-            total_days = total_days_dict.get(month, 0)
-            percentage = (days_in_range / total_days) * 100 if total_days else 0
-
-            result.append({
-                'month': month,
-                'days_in_range': days_in_range,
-                'total_days': total_days,
-                'percentage_in_range': percentage
-            })
-
-        return result
+        month_totals = summarize_climate_window_for_region(region_id, start_date, end_date)
+        return percentage_of_days_in_range_by_month(month_totals, 'humidity_days')
 
     except Exception as e:
         return f'Error calculating humidity for region id {region_id}: {e}'
@@ -212,17 +546,10 @@ def calculate_percentage_of_days_in_ideal_humidity_range_by_month_for_region(reg
 
 def calculate_total_precipitation_for_winter_for_region(region_id, start_date=None, end_date=None):
     try:
-        winter_months = [6, 7, 8]  # June, July, August
-
-        # Base queryset with optional date filtering
-        base_queryset = ClimateMetrics.objects.filter(wine_region_id=region_id, metric_date__month__in=winter_months)
-        if start_date and end_date:
-            base_queryset = base_queryset.filter(metric_date__range=[start_date, end_date])
+        month_totals = summarize_climate_window_for_region(region_id, start_date, end_date)
+        winter_insights = build_climate_window_insights(region_id, month_totals)
 
-        # Aggregate total precipitation
-        total_precipitation = base_queryset.aggregate(total_rainfall=Sum('precipitation_sum'))['total_rainfall'] or 0
-
-        return total_precipitation
+        return winter_insights['winter_precipitation_total'] or 0
 
     except Exception as e:
         return f'Error calculating total precipitation for region id {region_id}: {e}'
@@ -230,49 +557,8 @@ def calculate_total_precipitation_for_winter_for_region(region_id, start_date=No
 
 def calculate_percentage_of_days_in_ideal_humidity_and_temperature_range_for_region(region_id, start_date=None, end_date=None):
     try:
-        temp_min = 25
-        temp_max = 32
-        humidity_min = 40
-        humidity_max = 70
-
-        # Base queryset with optional date filtering
-        base_queryset = ClimateMetrics.objects.filter(wine_region_id=region_id)
-        if start_date and end_date:
-            base_queryset = base_queryset.filter(metric_date__range=[start_date, end_date])
-
-        # Query to get the number of days where both temperature and humidity are in the ideal range
-        valid_days_query = (
-            base_queryset
-            .filter(temperature_mean__gte=temp_min, temperature_mean__lte=temp_max)
-            .filter(relative_humidity_mean__gte=humidity_min, relative_humidity_mean__lte=humidity_max)
-            .annotate(month=ExtractMonth('metric_date'))
-            .values('month')
-            .annotate(valid_days=Count('id'))  # Count only days where both conditions are met
-            .order_by('month')
-        )
-
-        # Query to get the total number of days for the given date range
-        total_days_query = (
-            base_queryset
-            .annotate(month=ExtractMonth('metric_date'))
-            .values('month')
-            .annotate(total_days=Count('id'))
-            .order_by('month')
-        )
-
-        # Convert to dictionaries for easier lookup
-        valid_days_dict = {item['month']: item['valid_days'] for item in valid_days_query}
-        total_days_dict = {item['month']: item['total_days'] for item in total_days_query}
-
-        # Sum of all valid days and total days over the entire period
-        total_valid_days = sum(valid_days_dict.values())
-        total_total_days = sum(total_days_dict.values())
-
-        # Calculate the percentage of days in the ideal range
-        percentage = (total_valid_days / total_total_days) * 100 if total_total_days else 0
-
-        # return percentage
-        return round(percentage, 2)  # Round the percentage to two decimal places
+        month_totals = summarize_climate_window_for_region(region_id, start_date, end_date)
+        return build_climate_window_insights(region_id, month_totals)['optimal_conditions_percentage']
 
     except Exception as e:
         return f'Error calculating ideal humidity and temperature range for region id {region_id}: {e}'
@@ -281,119 +567,378 @@ def calculate_percentage_of_days_in_ideal_humidity_and_temperature_range_for_reg
 
 def calculate_climate_insights_for_region(region_id):
     try:
-        # Set what the the threshold is for percentage of days in ideal temp/humidity range to be considered "optimal" - totally arbitrarily picked right now and would be a business decision normally
-        ideal_temp_percentage_threshold = 15
-        ideal_humidity_percentage_threshold = 30
+        # Everything is gathered in one pass over the region's metrics - see climate_api.insights
+        summary = summarize_climate_metrics_for_region(region_id)
+        return build_climate_insights(region_id, summary)
+    
+    except Exception as e:
+        return (f'Error calculating climate insights for region id {region_id}: {e}')
 
 
+def climate_insights_to_model(region, insights):
+    return ClimateInsights(
+        wine_region = region,
+        optimal_time_of_year_start_month = insights["optimal_time_of_year_start_month"],
+        optimal_time_of_year_end_month = insights["optimal_time_of_year_end_month"],
+        past_10_years_winter_precipitation_total = insights["past_10_years_winter_precipitation_total"],
+        past_10_years_percentage_days_in_optimal_temp_range = insights["past_10_years_percentage_days_in_optimal_temp_range"],
+        past_10_years_percentage_days_in_optimal_humidity_range = insights["past_10_years_percentage_days_in_optimal_humidity_range"],
+        optimal_conditions_percentage_last_30_years = insights["past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range"]
+    )
+
+
+def save_climate_insights(climate_insights):
+    # Add a list of ClimateInsights to the history and make them their regions' current insights. Call inside a
+    # transaction so the two tables can't disagree.
+    if not climate_insights:
+        return
+
+    ClimateInsights.objects.bulk_create(climate_insights)
+
+    insights_fields = [field.name for field in ClimateInsightsFields._meta.fields]
+    CurrentClimateInsights.objects.bulk_create(
+        [
+            CurrentClimateInsights(
+                wine_region_id=insights.wine_region_id,
+                created_at=insights.created_at,
+                **{field: getattr(insights, field) for field in insights_fields},
+            )
+            for insights in climate_insights
+        ],
+        update_conflicts=True,
+        unique_fields=['wine_region'],
+        update_fields=[*insights_fields, 'created_at'],
+    )
 
-        # OPTIMAL TIME OF YEAR
 
-        # Get metrics for all records in the database (i.e. no date limit)
-        temp_result_all_time = calculate_percentage_of_days_in_ideal_temp_range_by_month_for_region(region_id)
-        humidity_result_all_time = calculate_percentage_of_days_in_ideal_humidity_range_by_month_for_region(region_id)
+def calculate_climate_insights_for_all_regions():
+    try:
+        regions = WineRegion.objects.all()
 
-        optimal_time_of_year_temperature_all_time = [x for x in temp_result_all_time if x["percentage_in_range"] > ideal_temp_percentage_threshold]
-        optimal_time_of_year_humidity_all_time = [x for x in humidity_result_all_time if x["percentage_in_range"] > ideal_humidity_percentage_threshold]
-        optimal_time_of_year_month_arr_all_time = []
+        # One pass over the metrics for every region at once, rather than a set of queries per region
+        summaries = summarize_climate_metrics()
+        climate_insights = [
+            climate_insights_to_model(region, build_climate_insights(region.id, summaries.get(region.id, empty_summary())))
+            for region in regions
+        ]
 
-        # Extract out the months where both temperature and humidity pass the threshold for being "optimal"
-        for i in optimal_time_of_year_temperature_all_time:
-            for j in optimal_time_of_year_humidity_all_time:
-                if j["month"] == i["month"]:
-                    optimal_time_of_year_month_arr_all_time.append(j["month"])
+        with transaction.atomic(): 
+            save_climate_insights(climate_insights)
 
-        optimal_time_of_year_month_arr_all_time.sort()
+        print("Calculated climate insights for all regions")
 
-        # Will assume that the optimal time of year may contain months that aren't optimal, i.e. optimal months don't have to be contiguous
+    except Exception as e:
+        return (f'Error calculating climate insights for all regions: {str(e)}')
 
-        if optimal_time_of_year_month_arr_all_time:
-            optimal_time_of_year_start_month = optimal_time_of_year_month_arr_all_time[0]
-            optimal_time_of_year_end_month = optimal_time_of_year_month_arr_all_time[-1]
-        else:
-            # Handle the case where no months pass the threshold
-            optimal_time_of_year_start_month = None
-            optimal_time_of_year_end_month = None
 
+def climate_insights_values(climate_insights):
+    # The insights in a ClimateInsights or CurrentClimateInsights, rounded the way the database will store them, for
+    # comparing freshly calculated insights against the current ones
+    values = []
+    for field in ClimateInsightsFields._meta.fields:
+        value = field.to_python(getattr(climate_insights, field.attname))
+        if isinstance(field, DecimalField) and value is not None:
+            value = value.quantize(Decimal(1).scaleb(-field.decimal_places))
+        values.append(value)
 
+    return tuple(values)
 
 
-        # PERFORMANCE LAST 10 YEARS
+def calculate_climate_insights_for_dirty_regions():
+    # Recalculate insights only for regions with metrics written since their insights were last calculated, plus any
+    # region that has never had insights. A new ClimateInsights row is only added when something has actually changed.
+    try:
+        dirty_checkpoints = {
+            checkpoint.wine_region_id: checkpoint
+            for checkpoint in ClimateIngestionCheckpoint.objects.filter(insights_dirty_from__isnull=False)
+        }
+        regions = WineRegion.objects.filter(Q(id__in=dirty_checkpoints.keys()) | Q(currentclimateinsights__isnull=True))
+        regions = {region.id: region for region in regions}
+
+        if not regions:
+            return {
+                'success': True,
+                'num_regions_recalculated': 0,
+                'num_insights_written': 0,
+                'error': None
+            }
+
+        for region_id, checkpoint in dirty_checkpoints.items():
+            print(f"Metrics for {regions[region_id].name} changed between {checkpoint.insights_dirty_from} and {checkpoint.insights_dirty_to}")
+
+        current_insights = CurrentClimateInsights.objects.in_bulk(regions.keys())
+
+        summaries = summarize_climate_metrics(region_ids=list(regions.keys()))
+        climate_insights = [
+            climate_insights_to_model(region, build_climate_insights(region.id, summaries.get(region.id, empty_summary())))
+            for region in regions.values()
+        ]
+        changed_insights = [
+            insights for insights in climate_insights
+            if insights.wine_region_id not in current_insights
+            or climate_insights_values(insights) != climate_insights_values(current_insights[insights.wine_region_id])
+        ]
+
+        with transaction.atomic():
+            save_climate_insights(changed_insights)
+
+            # Leave a region dirty if more metrics were written for it while its insights were being calculated
+            for region_id, checkpoint in dirty_checkpoints.items():
+                ClimateIngestionCheckpoint.objects.filter(
+                    id=checkpoint.id, insights_dirty_from=checkpoint.insights_dirty_from, insights_dirty_to=checkpoint.insights_dirty_to
+                ).update(insights_dirty_from=None, insights_dirty_to=None)
+
+        print(f"Recalculated climate insights for {len(regions)} regions, {len(changed_insights)} changed")
 
-        # Get start and end dates for last 10 years
-        end_date = datetime.today().date()
-        start_date = end_date - timedelta(days=365 * 10)
+        return {
+            'success': True,
+            'num_regions_recalculated': len(regions),
+            'num_insights_written': len(changed_insights),
+            'error': None
+        }
 
-        # calculate total winter PRECIPITATION for this region in the last 10 years 
-        past_10_years_winter_precipitation_total = calculate_total_precipitation_for_winter_for_region(region_id, start_date=start_date, end_date=end_date)
+    except Exception as e:
+        return {
+            'success': False,
+            'num_regions_recalculated': 0,
+            'num_insights_written': 0,
+            'error': str(e)
+        }
 
-        # calculate percentage of days in optimal TEMPERATURE range for this region in last 10 years
-        temp_result_last_10_yrs = calculate_percentage_of_days_in_ideal_temp_range_by_month_for_region(region_id, start_date=start_date, end_date=end_date)
-        total_days_in_temp_range_over_10_years = sum(item['days_in_range'] for item in temp_result_last_10_yrs)
-        total_days_in_10_years_temp = sum(item['total_days'] for item in temp_result_last_10_yrs)
 
-        if total_days_in_10_years_temp > 0:
-            past_10_years_percentage_days_in_optimal_temp_range = (total_days_in_temp_range_over_10_years / total_days_in_10_years_temp) * 100
-        else:
-            past_10_years_percentage_days_in_optimal_temp_range = 0
+def calculate_timed_climate_insights_for_region(region_id):
+    # Runs in a recompute worker process. Returns (region_id, insights, seconds), where insights is an error string if
+    # the calculation failed.
+    start = time.perf_counter()
+    insights = calculate_climate_insights_for_region(region_id)
+    return region_id, insights, time.perf_counter() - start
 
-        # calculate percentage of days in optimal HUMIDITY range for this region in last 10 years
-        humidity_result_last_10_yrs = calculate_percentage_of_days_in_ideal_humidity_range_by_month_for_region(region_id, start_date=start_date, end_date=end_date)
-        total_days_in_humidity_range_over_10_years = sum(item['days_in_range'] for item in humidity_result_last_10_yrs)
-        total_days_in_10_years_humidity = sum(item['total_days'] for item in humidity_result_last_10_yrs)
 
-        if total_days_in_10_years_humidity > 0:
-            past_10_years_percentage_days_in_optimal_humidity_range = (total_days_in_humidity_range_over_10_years / total_days_in_10_years_humidity) * 100
+def recompute_climate_insights(workers=1):
+    # Recalculate insights for every region, spread across a pool of worker processes with one region per task. Workers
+    # only read - the results come back here and are written in a single transaction, so either every region gets new
+    # insights or none do.
+    try:
+        regions = WineRegion.objects.in_bulk()
+        dirty_checkpoints = list(ClimateIngestionCheckpoint.objects.filter(insights_dirty_from__isnull=False))
+        start = time.perf_counter()
+
+        if workers > 1:
+            # Workers are forked so they start with Django already set up. Close this process's connections first so no
+            # worker inherits an open one - each opens its own on its first query.
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as executor:
+                results = list(executor.map(calculate_timed_climate_insights_for_region, regions.keys()))
         else:
-            past_10_years_percentage_days_in_optimal_humidity_range = 0
+            results = [calculate_timed_climate_insights_for_region(region_id) for region_id in regions.keys()]
 
+        failures = [insights for region_id, insights, seconds in results if isinstance(insights, str)]
+        if failures:
+            raise Exception("; ".join(failures))
 
+        with transaction.atomic():
+            save_climate_insights(
+                [climate_insights_to_model(regions[region_id], insights) for region_id, insights, seconds in results]
+            )
 
+            # As in calculate_climate_insights_for_dirty_regions, a region stays dirty if more metrics were written for
+            # it after the recalculation started
+            for checkpoint in dirty_checkpoints:
+                ClimateIngestionCheckpoint.objects.filter(
+                    id=checkpoint.id, insights_dirty_from=checkpoint.insights_dirty_from, insights_dirty_to=checkpoint.insights_dirty_to
+                ).update(insights_dirty_from=None, insights_dirty_to=None)
 
-        # OPTIMAL CONDITIONS PERCENTAGE LAST 30 YEARS
-            
-        # Get start and end dates for last 30 years
-        end_date = datetime.today().date()
-        start_date = end_date - timedelta(days=365 * 30)
-
-        past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range = calculate_percentage_of_days_in_ideal_humidity_and_temperature_range_for_region(region_id, start_date=start_date, end_date=end_date)
-        
-            
-        result = {
-            "region_id": region_id,
-            "optimal_time_of_year_start_month": optimal_time_of_year_start_month,
-            "optimal_time_of_year_end_month": optimal_time_of_year_end_month,
-            "past_10_years_winter_precipitation_total": past_10_years_winter_precipitation_total,
-            "past_10_years_percentage_days_in_optimal_temp_range": past_10_years_percentage_days_in_optimal_temp_range,
-            "past_10_years_percentage_days_in_optimal_humidity_range": past_10_years_percentage_days_in_optimal_humidity_range,
-            "past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range": past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range,
+        return {
+            'success': True,
+            'num_regions': len(results),
+            'seconds': round(time.perf_counter() - start, 3),
+            'region_seconds': {regions[region_id].name: round(seconds, 3) for region_id, insights, seconds in results},
+            'error': None
         }
 
-        return result
-    
     except Exception as e:
-        return (f'Error calculating climate insights for region id {region_id}: {e}')
+        return {
+            'success': False,
+            'num_regions': 0,
+            'error': str(e)
+        }
 
 
-def calculate_climate_insights_for_all_regions():
+def find_compactable_climate_insights(rows, now=None):
+    # Pick out the insights history rows that the retention policy drops, from one region's rows as
+    # (id, created_at, insights values) oldest first. Rows are read once, in order, so they can be streamed from the
+    # database rather than held in memory. Returns the ids to delete.
+    now = now or timezone.now()
+    keep_daily_from = now - timedelta(days=settings.CLIMATE_INSIGHTS_KEEP_DAILY_DAYS)
+    keep_weekly_from = now - timedelta(days=settings.CLIMATE_INSIGHTS_KEEP_WEEKLY_DAYS)
+
+    def period_of(row_id, created_at):
+        if created_at >= keep_daily_from:
+            return ('day', row_id)
+        if created_at >= keep_weekly_from:
+            return ('week',) + tuple(created_at.isocalendar())[:2]
+        return ('month', created_at.year, created_at.month)
+
+    # Keep recent rows, then the last row of each week, then the last row of each month. Oldest first, each period's
+    # rows come one after another, so a period's last row is the one before the period changes. Of the rows kept, runs
+    # of identical insights are collapsed into their first row, i.e. when those values were first calculated.
+    delete_ids = []
+    previous_values = None
+    period = last_row = None
+    for row_id, created_at, values in rows:
+        row_period = period_of(row_id, created_at)
+        if last_row and row_period != period:
+            if last_row[1] == previous_values:
+                delete_ids.append(last_row[0])
+            else:
+                previous_values = last_row[1]
+        elif last_row:
+            delete_ids.append(last_row[0])
+
+        period, last_row = row_period, (row_id, values)
+
+    if last_row and last_row[1] == previous_values:
+        delete_ids.append(last_row[0])
+
+    return delete_ids
+
+
+def get_table_size(model):
+    # Bytes taken up by a model's table and its indexes, if the database can tell us
+    if connection.vendor != 'postgresql':
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_total_relation_size(%s)", [model._meta.db_table])
+        return cursor.fetchone()[0]
+
+
+def compact_climate_insights_history(dry_run=False, now=None):
+    # Apply the retention policy to the insights history. Rows are deleted by primary key in small batches, each in its
+    # own short transaction, so readers are never blocked and writers only ever wait on one batch. On PostgreSQL the
+    # table is then vacuumed (a plain VACUUM, not FULL, so it takes no lock that blocks reads or writes), which makes
+    # the space the deleted rows took up available again.
     try:
-        regions = WineRegion.objects.all()
+        start = time.perf_counter()
+        insights_fields = [field.name for field in ClimateInsightsFields._meta.fields]
+        table_bytes_before = get_table_size(ClimateInsights)
+        num_rows_before = ClimateInsights.objects.count()
+
+        # One pass over the history, streamed in chunks and a region at a time, so only the ids to delete are held
+        rows = (
+            ClimateInsights.objects
+            .order_by('wine_region_id', 'created_at', 'id')
+            .values_list('wine_region_id', 'id', 'created_at', *insights_fields)
+            .iterator(chunk_size=settings.CLIMATE_INSIGHTS_COMPACTION_BATCH_SIZE)
+        )
+        delete_ids = []
+        for region_id, region_rows in groupby(rows, key=lambda row: row[0]):
+            delete_ids += find_compactable_climate_insights(((row[1], row[2], row[3:]) for row in region_rows), now)
+
+        if not dry_run:
+            batch_size = settings.CLIMATE_INSIGHTS_COMPACTION_BATCH_SIZE
+            for batch_start in range(0, len(delete_ids), batch_size):
+                with transaction.atomic():
+                    ClimateInsights.objects.filter(id__in=delete_ids[batch_start:batch_start + batch_size]).delete()
+
+            if delete_ids and connection.vendor == 'postgresql' and not connection.in_atomic_block:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"VACUUM (ANALYZE) {connection.ops.quote_name(ClimateInsights._meta.db_table)}")
+
+        # Space isn't handed back to the operating system without a VACUUM FULL, so count what the deleted rows took up
+        # (on average, including their index entries) rather than how much the table shrank
+        if table_bytes_before is not None and num_rows_before:
+            bytes_reclaimed = round(table_bytes_before / num_rows_before * len(delete_ids))
+        else:
+            bytes_reclaimed = None
 
-        with transaction.atomic(): 
-            for region in regions:
-                insights = calculate_climate_insights_for_region(region.id)
-                ClimateInsights.objects.create(
-                    wine_region = region,
-                    optimal_time_of_year_start_month = insights["optimal_time_of_year_start_month"],
-                    optimal_time_of_year_end_month = insights["optimal_time_of_year_end_month"],
-                    past_10_years_winter_precipitation_total = insights["past_10_years_winter_precipitation_total"],
-                    past_10_years_percentage_days_in_optimal_temp_range = insights["past_10_years_percentage_days_in_optimal_temp_range"],
-                    past_10_years_percentage_days_in_optimal_humidity_range = insights["past_10_years_percentage_days_in_optimal_humidity_range"],
-                    optimal_conditions_percentage_last_30_years = insights["past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range"]
-
-                )
+        print(f"Compacted climate insights history: {len(delete_ids)} of {num_rows_before} rows {'to delete' if dry_run else 'deleted'}")
 
-        print("Calculated climate insights for all regions")
+        return {
+            'success': True,
+            'dry_run': dry_run,
+            'num_rows_deleted': len(delete_ids),
+            'num_rows_kept': num_rows_before - len(delete_ids),
+            'bytes_reclaimed': bytes_reclaimed,
+            'table_bytes_before': table_bytes_before,
+            'table_bytes_after': table_bytes_before if dry_run else get_table_size(ClimateInsights),
+            'seconds': round(time.perf_counter() - start, 3),
+            'error': None
+        }
 
     except Exception as e:
-        return (f'Error calculating climate insights for all regions: {str(e)}')
\ No newline at end of file
+        return {
+            'success': False,
+            'num_rows_deleted': 0,
+            'error': str(e)
+        }
+
+
+CLIMATE_METRICS_RESOLUTIONS = {
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+
+def get_next_period_start(period_date, resolution):
+    # First day of the week (Monday), month or year after the one period_date falls in
+    if resolution == 'week':
+        return period_date - timedelta(days=period_date.weekday()) + timedelta(days=7)
+    if resolution == 'month':
+        return (period_date.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if resolution == 'year':
+        return period_date.replace(year=period_date.year + 1, month=1, day=1)
+    return period_date + timedelta(days=1)
+
+
+def get_climate_metrics_series(region_id, resolution='day', start_date=None, end_date=None, after=None, limit=None):
+    # One region's metrics oldest first, as dicts. At a resolution of 'week', 'month' or 'year' they're averaged (and
+    # precipitation summed) per period in the database, with each period labelled by the day it starts on - periods at
+    # either end are clipped to start_date and end_date.
+    #
+    # Pages are keyset based: after is the last metric_date the previous page returned, which becomes a range condition
+    # on (wine_region, metric_date) and so an index seek however deep the page. Rows are read through a server-side
+    # cursor where the database has one, so memory doesn't grow with the range.
+    metrics = ClimateMetrics.objects.filter(wine_region_id=region_id)
+    if start_date:
+        metrics = metrics.filter(metric_date__gte=start_date)
+    if end_date:
+        metrics = metrics.filter(metric_date__lte=end_date)
+    if after:
+        metrics = metrics.filter(metric_date__gte=get_next_period_start(after, resolution))
+
+    if resolution == 'day':
+        rows = metrics.order_by('metric_date').values_list(
+            'metric_date', 'temperature_mean', 'relative_humidity_mean', 'precipitation_sum'
+        )
+        for metric_date, temperature_mean, relative_humidity_mean, precipitation_sum in rows[:limit].iterator(chunk_size=2000):
+            yield {
+                'metric_date': metric_date,
+                'temperature_mean': float(temperature_mean),
+                'relative_humidity_mean': relative_humidity_mean,
+                'precipitation_sum': float(precipitation_sum),
+            }
+        return
+
+    periods = (
+        metrics
+        .annotate(period=CLIMATE_METRICS_RESOLUTIONS[resolution]('metric_date'))
+        .values('period')
+        .annotate(
+            days=Count('id'),
+            temperature_mean=Avg('temperature_mean'),
+            relative_humidity_mean=Avg('relative_humidity_mean'),
+            precipitation_sum=Sum('precipitation_sum'),
+        )
+        .order_by('period')
+        .values_list('period', 'days', 'temperature_mean', 'relative_humidity_mean', 'precipitation_sum')
+    )
+    for period, days, temperature_mean, relative_humidity_mean, precipitation_sum in periods[:limit].iterator(chunk_size=2000):
+        yield {
+            'metric_date': period,
+            'days': days,
+            'temperature_mean': round(float(temperature_mean), 1),
+            'relative_humidity_mean': None if relative_humidity_mean is None else round(float(relative_humidity_mean), 1),
+            'precipitation_sum': float(precipitation_sum),
+        }
@@ -0,0 +1,214 @@
+import heapq
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Max
+from climate_api.models import WineRegion
+
+# Nearest-region lookups by latitude/longitude. Regions are placed on the unit sphere as (x, y, z) points and held in a
+# KD-tree. The straight-line (chord) distance between two points on the sphere only grows with the great-circle
+# distance between them, so the nearest points in 3D are the nearest regions on the globe. Distances come back in km,
+# the same as the haversine formula gives.
+#
+# Each process builds the tree at startup, from every region's coordinates, and keeps it until regions change. The
+# regions' version - how many there are and when one was last saved - is read from the database on lookups, at most
+# once every WINE_REGION_INDEX_CHECK_INTERVAL seconds, and adding, changing or removing a region always changes it. So
+# every process rebuilds within that interval of a change, wherever the change was made. save() and bulk_create() set
+# WineRegion.updated_at; pass updated_at=timezone.now() to update() when changing regions with it.
+
+EARTH_RADIUS_KM = 6371.0088
+
+_spatial_index = None
+_spatial_index_version = None
+_spatial_index_checked_at = None
+_spatial_index_lock = threading.Lock()
+
+
+def to_unit_vectors(latitudes, longitudes):
+    latitudes = np.radians(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_latitudes = np.cos(latitudes)
+
+    return np.column_stack((cos_latitudes * np.cos(longitudes), cos_latitudes * np.sin(longitudes), np.sin(latitudes)))
+
+
+def chord_to_km(chord):
+    return 2 * np.arcsin(np.minimum(np.asarray(chord) / 2, 1.0)) * EARTH_RADIUS_KM
+
+
+def km_to_chord(distance_km):
+    return 2 * np.sin(min(distance_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    # Great-circle distances from one point to many, for checking the tree against
+    latitude, longitude = np.radians(latitude), np.radians(longitude)
+    latitudes, longitudes = np.radians(np.asarray(latitudes, dtype=np.float64)), np.radians(np.asarray(longitudes, dtype=np.float64))
+
+    a = np.sin((latitudes - latitude) / 2) ** 2 + np.cos(latitude) * np.cos(latitudes) * np.sin((longitudes - longitude) / 2) ** 2
+    return 2 * np.arcsin(np.sqrt(np.minimum(a, 1.0))) * EARTH_RADIUS_KM
+
+
+class RegionSpatialIndex:
+    # A KD-tree over regions' unit-sphere points. Nodes live in flat arrays and each leaf is a slice of the reordered
+    # points, so a leaf's distances are worked out in one vectorized step.
+
+    def __init__(self, region_ids, latitudes, longitudes, leaf_size=32):
+        points = to_unit_vectors(latitudes, longitudes)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(points))
+
+        # Per node: split dimension (-1 for a leaf), split value, children, and the slice of self.order it covers
+        self.split_dims = []
+        self.split_values = []
+        self.lefts = []
+        self.rights = []
+        self.starts = []
+        self.ends = []
+        if len(points):
+            self.build(points, 0, len(points))
+
+        self.points = points[self.order]
+        self.region_ids = np.asarray(region_ids, dtype=np.int64)[self.order]
+
+    def __len__(self):
+        return len(self.region_ids)
+
+    def build(self, points, start, end):
+        node = len(self.split_dims)
+        self.split_dims.append(-1)
+        self.split_values.append(0.0)
+        self.lefts.append(-1)
+        self.rights.append(-1)
+        self.starts.append(start)
+        self.ends.append(end)
+
+        if end - start <= self.leaf_size:
+            return node
+
+        # Split the widest dimension at its median
+        node_points = points[self.order[start:end]]
+        split_dim = int(np.argmax(node_points.max(axis=0) - node_points.min(axis=0)))
+        middle = (end - start) // 2
+        partition = np.argpartition(node_points[:, split_dim], middle)
+        self.order[start:end] = self.order[start:end][partition]
+
+        self.split_dims[node] = split_dim
+        self.split_values[node] = float(points[self.order[start + middle], split_dim])
+        self.lefts[node] = self.build(points, start, start + middle)
+        self.rights[node] = self.build(points, start + middle, end)
+
+        return node
+
+    def nearest(self, latitude, longitude, k=5):
+        # The k nearest regions as [(region_id, distance_km)], nearest first
+        if not len(self) or k < 1:
+            return []
+
+        query = to_unit_vectors([latitude], [longitude])[0]
+        best = []  # max-heap of (-squared chord, region position) holding the k nearest so far
+        stack = [(0, 0.0)]  # (node, lower bound on the squared chord to anything in it)
+
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+
+            split_dim = self.split_dims[node]
+            if split_dim < 0:
+                start, end = self.starts[node], self.ends[node]
+                squared_chords = ((self.points[start:end] - query) ** 2).sum(axis=1)
+                worst = -best[0][0] if len(best) == k else np.inf
+                for offset in np.flatnonzero(squared_chords < worst):
+                    candidate = (-float(squared_chords[offset]), start + int(offset))
+                    if len(best) < k:
+                        heapq.heappush(best, candidate)
+                    elif candidate > best[0]:
+                        heapq.heapreplace(best, candidate)
+                continue
+
+            # Visit the side of the split the query is on first, and the other side only if it could still be closer
+            difference = query[split_dim] - self.split_values[node]
+            near, far = (self.lefts[node], self.rights[node]) if difference < 0 else (self.rights[node], self.lefts[node])
+            stack.append((far, max(bound, difference * difference)))
+            stack.append((near, bound))
+
+        best.sort(reverse=True)
+        return self.to_results([position for _, position in best], [-squared_chord for squared_chord, _ in best])
+
+    def within(self, latitude, longitude, radius_km, limit=None):
+        # Regions within radius_km as [(region_id, distance_km)], nearest first, at most limit of them
+        if not len(self):
+            return []
+
+        query = to_unit_vectors([latitude], [longitude])[0]
+        max_squared_chord = km_to_chord(radius_km) ** 2
+        positions = []
+        squared_chords = []
+        stack = [0]
+
+        while stack:
+            node = stack.pop()
+            split_dim = self.split_dims[node]
+            if split_dim < 0:
+                start, end = self.starts[node], self.ends[node]
+                node_squared_chords = ((self.points[start:end] - query) ** 2).sum(axis=1)
+                inside = np.flatnonzero(node_squared_chords <= max_squared_chord)
+                positions.extend(start + inside)
+                squared_chords.extend(node_squared_chords[inside])
+                continue
+
+            difference = query[split_dim] - self.split_values[node]
+            if difference < 0 or difference * difference <= max_squared_chord:
+                stack.append(self.lefts[node])
+            if difference >= 0 or difference * difference <= max_squared_chord:
+                stack.append(self.rights[node])
+
+        nearest_first = np.argsort(squared_chords, kind='stable')[:limit]
+        return self.to_results(np.asarray(positions, dtype=np.int64)[nearest_first], np.asarray(squared_chords)[nearest_first])
+
+    def to_results(self, positions, squared_chords):
+        distances_km = chord_to_km(np.sqrt(np.asarray(squared_chords, dtype=np.float64)))
+        return [
+            (int(self.region_ids[position]), float(distance_km))
+            for position, distance_km in zip(positions, distances_km)
+        ]
+
+
+def build_region_spatial_index():
+    regions = list(WineRegion.objects.values_list('id', 'latitude', 'longitude'))
+    return RegionSpatialIndex(
+        [region_id for region_id, _, _ in regions],
+        [float(latitude) for _, latitude, _ in regions],
+        [float(longitude) for _, _, longitude in regions],
+    )
+
+
+def get_region_spatial_index_version():
+    # (number of regions, latest updated_at), from a count and the updated_at index
+    version = WineRegion.objects.aggregate(num_regions=Count('pk'), updated_at=Max('updated_at'))
+    return (version['num_regions'], version['updated_at'])
+
+
+def get_region_spatial_index():
+    # This process's index, rebuilt first if regions have changed since it was built. The version is read before
+    # building, so regions changing part-way through a build leave the index marked stale.
+    global _spatial_index, _spatial_index_version, _spatial_index_checked_at
+
+    checked_at = time.monotonic()
+    if _spatial_index is not None and checked_at - _spatial_index_checked_at < settings.WINE_REGION_INDEX_CHECK_INTERVAL:
+        return _spatial_index
+
+    version = get_region_spatial_index_version()
+    _spatial_index_checked_at = checked_at
+    if _spatial_index is not None and _spatial_index_version == version:
+        return _spatial_index
+
+    with _spatial_index_lock:
+        if _spatial_index is None or _spatial_index_version != version:
+            _spatial_index = build_region_spatial_index()
+            _spatial_index_version = version
+            print(f"Built the wine region spatial index over {len(_spatial_index)} regions")
+
+        return _spatial_index
@@ -1,3 +1,1149 @@
-from django.test import TestCase
+import json
+import threading
+import time
+import numpy as np
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import ExtractMonth
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from climate_api.apps import should_run_background_jobs
+from climate_api.insights_cache import get_climate_insights_cache, get_climate_insights_cache_stats
+from climate_api.insights import (
+    DEFAULT_THRESHOLDS,
+    InsightThresholds,
+    build_climate_insights,
+    calculate_climate_window_insights,
+    calculate_what_if_insights,
+    load_climate_arrays,
+    refresh_climate_aggregates_for_removed_days,
+    refresh_climate_histogram,
+    refresh_monthly_rollups,
+    refresh_running_totals,
+    summarize_climate_metrics,
+)
+from climate_api.serializers import (
+    ClimateInsightsSerializer,
+    CurrentClimateInsightsSerializer,
+    aserialize_climate_insights,
+    serialize_climate_insights,
+)
+from climate_api.spatial import get_region_spatial_index, haversine_km
+from climate_api.models import (
+    ClimateHistogramBin,
+    ClimateIngestionCheckpoint,
+    ClimateInsights,
+    ClimateMetrics,
+    ClimateMonthlyRollup,
+    ClimateRunningTotal,
+    CurrentClimateInsights,
+    WineRegion,
+)
+from climate_api.services import (
+    backfill_climate_data_for_all_regions,
+    bulk_insert_climate_metrics,
+    calculate_climate_insights_for_dirty_regions,
+    compact_climate_insights_history,
+    fetch_climate_data_for_region_batch,
+    fetch_climate_data_for_regions,
+    find_compactable_climate_insights,
+    find_missing_climate_metrics_ranges,
+    recompute_climate_insights,
+    save_climate_data_chunk,
+)
 
-# Create your tests here.
+
+def daily_climate_data(start_date, num_days, temperature=20.0, humidity=50, precipitation=1.0):
+    # A climate API response for one location, with the same values every day
+    return {
+        'daily': {
+            'time': [(start_date + timedelta(days=day)).isoformat() for day in range(num_days)],
+            'temperature_2m_mean': [temperature] * num_days,
+            'relative_humidity_2m_mean': [humidity] * num_days,
+            'precipitation_sum': [precipitation] * num_days,
+        }
+    }
+
+# A fixed "today" for the 10 and 30 year windows
+TODAY = date(2026, 10, 18)
+
+# Values on and either side of the default thresholds (25-32 degrees, 40-70% humidity), and missing humidity readings
+TEMPERATURES = [Decimal('24.9'), Decimal('25.0'), Decimal('28.5'), Decimal('32.0'), Decimal('32.1'), Decimal('12.0')]
+HUMIDITIES = [39, 40, 55, 70, 71, None, 60]
+
+
+def seed_climate_metrics(region, start_date, end_date, warm_months):
+    # A metric for every day from start_date to end_date, cycling through TEMPERATURES and HUMIDITIES. Outside
+    # warm_months temperatures are 10 degrees lower, so only those months can be optimal. The rollups, histogram and
+    # running totals are built the way ingestion builds them.
+    rows = []
+    for day_number in range((end_date - start_date).days + 1):
+        metric_date = start_date + timedelta(days=day_number)
+        temperature = TEMPERATURES[day_number % len(TEMPERATURES)] - (0 if metric_date.month in warm_months else 10)
+        humidity = HUMIDITIES[day_number % len(HUMIDITIES)]
+        rows.append((region.id, metric_date, temperature, humidity, Decimal(day_number % 9) / 4))
+
+    bulk_insert_climate_metrics(rows)
+    refresh_monthly_rollups(region.id, start_date, end_date)
+    refresh_climate_histogram(region.id, start_date, end_date)
+    refresh_running_totals(region.id, start_date)
+
+
+def calculate_per_metric_climate_insights(region_id, today):
+    # The insights as they were originally calculated, one query per metric and window, to check the single-scan
+    # summaries against
+    def percentage_by_month(range_filter, start_date=None, end_date=None):
+        metrics = ClimateMetrics.objects.filter(wine_region_id=region_id)
+        if start_date and end_date:
+            metrics = metrics.filter(metric_date__range=[start_date, end_date])
+
+        days_in_range = dict(
+            metrics.filter(**range_filter).annotate(month=ExtractMonth('metric_date')).values('month')
+            .annotate(days=Count('id')).order_by('month').values_list('month', 'days')
+        )
+        total_days = dict(
+            metrics.annotate(month=ExtractMonth('metric_date')).values('month')
+            .annotate(days=Count('id')).order_by('month').values_list('month', 'days')
+        )
+        return [
+            {
+                'month': month,
+                'days_in_range': days_in_range.get(month, 0),
+                'total_days': total_days.get(month, 0),
+                'percentage_in_range': (days_in_range.get(month, 0) / total_days[month]) * 100 if total_days.get(month) else 0,
+            }
+            for month in range(1, 13)
+        ]
+
+    temp_range = {'temperature_mean__gte': 25, 'temperature_mean__lte': 32}
+    humidity_range = {'relative_humidity_mean__gte': 40, 'relative_humidity_mean__lte': 70}
+
+    # Optimal time of year, over all records
+    warm_enough = {row['month'] for row in percentage_by_month(temp_range) if row['percentage_in_range'] > 15}
+    humid_enough = {row['month'] for row in percentage_by_month(humidity_range) if row['percentage_in_range'] > 30}
+    optimal_months = sorted(warm_enough & humid_enough)
+
+    # Last 10 years
+    start_date = today - timedelta(days=365 * 10)
+    winter_precipitation = ClimateMetrics.objects.filter(
+        wine_region_id=region_id, metric_date__month__in=[6, 7, 8], metric_date__range=[start_date, today]
+    ).aggregate(total=Sum('precipitation_sum'))['total'] or 0
+
+    def percentage_of_days(range_filter):
+        by_month = percentage_by_month(range_filter, start_date, today)
+        total_days = sum(row['total_days'] for row in by_month)
+        return (sum(row['days_in_range'] for row in by_month) / total_days) * 100 if total_days else 0
+
+    # Last 30 years
+    metrics = ClimateMetrics.objects.filter(wine_region_id=region_id, metric_date__range=[today - timedelta(days=365 * 30), today])
+    total_days = metrics.count()
+    optimal_days = metrics.filter(**temp_range, **humidity_range).count()
+
+    return {
+        "region_id": region_id,
+        "optimal_time_of_year_start_month": optimal_months[0] if optimal_months else None,
+        "optimal_time_of_year_end_month": optimal_months[-1] if optimal_months else None,
+        "past_10_years_winter_precipitation_total": winter_precipitation,
+        "past_10_years_percentage_days_in_optimal_temp_range": percentage_of_days(temp_range),
+        "past_10_years_percentage_days_in_optimal_humidity_range": percentage_of_days(humidity_range),
+        "past_30_years_percentage_of_days_in_ideal_humidity_and_temperature_range": round((optimal_days / total_days) * 100, 2) if total_days else 0,
+    }
+
+
+class BulkInsertClimateMetricsTests(TestCase):
+    def setUp(self):
+        self.region = WineRegion.objects.create(name="Test Region", latitude=-35, longitude=138)
+
+    def test_counts_only_rows_actually_written(self):
+        rows = [(self.region.id, date(2024, 1, day), Decimal('20.0'), 50, Decimal('1.00')) for day in range(1, 11)]
+
+        self.assertEqual(bulk_insert_climate_metrics(rows[:6]), 6)
+        self.assertEqual(bulk_insert_climate_metrics(rows), 4)
+        self.assertEqual(bulk_insert_climate_metrics(rows), 0)
+        self.assertEqual(ClimateMetrics.objects.filter(wine_region=self.region).count(), 10)
+
+    def test_chunk_already_stored_does_not_mark_insights_dirty(self):
+        chunk = (date(2024, 1, 1), date(2024, 1, 10))
+        climate_data = daily_climate_data(date(2024, 1, 1), 10)
+
+        num_rows_written, insert_seconds = save_climate_data_chunk(self.region, climate_data, chunk)
+        self.assertEqual(num_rows_written, 10)
+        ClimateIngestionCheckpoint.objects.filter(wine_region=self.region).update(insights_dirty_from=None, insights_dirty_to=None)
+
+        with CaptureQueriesContext(connection) as queries:
+            num_rows_written, insert_seconds = save_climate_data_chunk(self.region, climate_data, chunk)
+        self.assertEqual(num_rows_written, 0)
+        self.assertIsNone(ClimateIngestionCheckpoint.objects.get(wine_region=self.region).insights_dirty_from)
+
+        # Nor are its rollups, histogram bins or running totals recounted
+        aggregate_tables = ('climatemonthlyrollup', 'climatehistogrambin', 'climaterunningtotal')
+        self.assertFalse([query['sql'] for query in queries if any(table in query['sql'] for table in aggregate_tables)])
+
+
+class FindMissingClimateMetricsRangesTests(TestCase):
+    def setUp(self):
+        self.region = WineRegion.objects.create(name="Test Region", latitude=-35, longitude=138)
+
+    def test_short_response_leaves_the_rest_of_the_chunk_missing(self):
+        save_climate_data_chunk(self.region, daily_climate_data(date(2024, 1, 1), 20), (date(2024, 1, 1), date(2024, 1, 31)))
+
+        self.assertEqual(ClimateIngestionCheckpoint.objects.get(wine_region=self.region).last_metric_date, date(2024, 1, 20))
+        missing_ranges = find_missing_climate_metrics_ranges(date(2024, 1, 1), date(2024, 1, 31))
+        self.assertEqual(missing_ranges[self.region.id], [(date(2024, 1, 21), date(2024, 1, 31))])
+
+    def test_only_days_after_the_watermark_are_scanned(self):
+        # A gap before the watermark (January 10th) is taken as complete, the one after it (January 25th) is found
+        bulk_insert_climate_metrics([
+            (self.region.id, date(2024, 1, day), Decimal('20.0'), 50, Decimal('1.00'))
+            for day in range(1, 32) if day not in (10, 25)
+        ])
+        ClimateIngestionCheckpoint.objects.create(wine_region=self.region, last_metric_date=date(2024, 1, 15))
+
+        with CaptureQueriesContext(connection) as queries:
+            missing_ranges = find_missing_climate_metrics_ranges(date(2024, 1, 1), date(2024, 2, 3))
+
+        self.assertEqual(missing_ranges[self.region.id], [(date(2024, 1, 25), date(2024, 1, 25)), (date(2024, 2, 1), date(2024, 2, 3))])
+        # The metrics are filtered by region and date directly, not joined to the checkpoints
+        self.assertNotIn('JOIN', queries.captured_queries[-1]['sql'])
+
+
+class FakeClimateApiHandler(BaseHTTPRequestHandler):
+    # Answers like the climate API: daily arrays for each latitude/longitude pair, as a plain object for one location
+    # and a list for several. Each location's temperature is its latitude, so responses can be matched to regions.
+    # server.delays holds seconds to wait before answering, by latitude, and a request for any latitude in server.truncate
+    # has its body cut off half-way by the connection closing. Requested (start_date, end_date) pairs go in server.requests.
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        latitudes = [float(latitude) for latitude in query['latitude'][0].split(',')]
+        start_date = date.fromisoformat(query['start_date'][0])
+        num_days = (date.fromisoformat(query['end_date'][0]) - start_date).days + 1
+        self.server.requests.append((start_date, date.fromisoformat(query['end_date'][0])))
+
+        time.sleep(max(self.server.delays.get(latitude, 0) for latitude in latitudes))
+
+        locations = [daily_climate_data(start_date, num_days, temperature=latitude) for latitude in latitudes]
+        body = json.dumps(locations[0] if len(locations) == 1 else locations).encode()
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+
+        if self.server.truncate.intersection(latitudes):
+            self.wfile.write(body[:len(body) // 2])
+            self.close_connection = True
+        else:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeClimateApiTestCase(TestCase):
+    # Runs a FakeClimateApiHandler server in a thread, with CLIMATE_API_URL pointing at it
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), FakeClimateApiHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+        cls.climate_api_settings = override_settings(CLIMATE_API_URL=f'http://127.0.0.1:{cls.server.server_port}/v1/climate')
+        cls.climate_api_settings.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.climate_api_settings.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.server.delays = {}
+        self.server.truncate = set()
+        self.server.requests = []
+
+
+class FetchClimateDataForRegionsTests(FakeClimateApiTestCase):
+    def test_takes_as_long_as_the_slowest_region(self):
+        delays = [0.3, 0.6, 0.9, 1.2]
+        regions = [WineRegion(id=region_id, latitude=-30 - region_id, longitude=140) for region_id in range(1, len(delays) + 1)]
+        self.server.delays = {float(region.latitude): delay for region, delay in zip(regions, delays)}
+
+        start = time.perf_counter()
+        climate_data_by_region = fetch_climate_data_for_regions(regions, '2024-01-01', '2024-01-31', concurrency=4, batch_size=1)
+        seconds = time.perf_counter() - start
+
+        self.assertEqual(set(climate_data_by_region), {region.id for region in regions})
+        self.assertNotIn(None, climate_data_by_region.values())
+        self.assertGreaterEqual(seconds, max(delays))
+        self.assertLess(seconds, max(delays) + 0.5, f"took {seconds:.2f}s, the delays add up to {sum(delays):.1f}s")
+
+
+class FetchClimateDataForRegionBatchTests(FakeClimateApiTestCase):
+    def test_splits_a_multi_location_response_between_regions(self):
+        regions = [WineRegion(id=region_id, latitude=-30 - region_id, longitude=140) for region_id in range(1, 4)]
+
+        climate_data = fetch_climate_data_for_region_batch(regions, '2024-01-01', '2024-01-10')
+
+        self.assertEqual(len(climate_data), len(regions))
+        for region, region_climate_data in zip(regions, climate_data):
+            self.assertEqual(region_climate_data['daily']['temperature_2m_mean'], [float(region.latitude)] * 10)
+            self.assertEqual(len(region_climate_data['daily']['time']), 10)
+
+    def test_single_location_response(self):
+        region = WineRegion(id=1, latitude=-31, longitude=140)
+
+        climate_data = fetch_climate_data_for_region_batch([region], '2024-01-01', '2024-01-10')
+
+        self.assertEqual(climate_data[0]['daily']['temperature_2m_mean'], [-31.0] * 10)
+
+    def test_connection_dropped_mid_body_only_fails_that_batch(self):
+        regions = [WineRegion(id=region_id, latitude=-30 - region_id, longitude=140) for region_id in range(1, 5)]
+        self.server.truncate = {float(regions[0].latitude)}
+
+        climate_data_by_region = fetch_climate_data_for_regions(regions, '2020-01-01', '2020-12-31', batch_size=2)
+
+        self.assertIsNone(climate_data_by_region[1])
+        self.assertIsNone(climate_data_by_region[2])
+        self.assertEqual(len(climate_data_by_region[3]['daily']['time']), 366)
+        self.assertEqual(len(climate_data_by_region[4]['daily']['time']), 366)
+
+
+class WhatIfInsightsTests(TestCase):
+    # Thresholds that fall between histogram bins, on either side of zero
+    THRESHOLDS = [
+        InsightThresholds(),
+        InsightThresholds(temp_min=22.05, temp_max=32.05, humidity_min=39.5, humidity_max=70.5),
+        InsightThresholds(temp_min=-0.25, temp_max=-0.05, humidity_min=40.01, humidity_max=40.99),
+        InsightThresholds(temp_min=-10, temp_max=-0.15, humidity_min=0, humidity_max=39.99),
+        InsightThresholds(temp_min=-0.1, temp_max=22.0, humidity_min=40, humidity_max=40),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seeded_region = WineRegion.objects.create(name="Seeded Region", latitude=-35, longitude=138)
+        seed_climate_metrics(cls.seeded_region, date(2020, 1, 1), date(2024, 12, 31), warm_months=(1, 2, 3, 12))
+
+        # Temperatures either side of zero and of the thresholds above
+        cls.cold_region = WineRegion.objects.create(name="Cold Region", latitude=60, longitude=10)
+        temperatures = ['-0.3', '-0.2', '-0.1', '0.0', '0.1', '21.9', '22.0', '22.1', '32.0', '32.1']
+        humidities = [39, 40, 41, None, 70, 71]
+        start_date, end_date = date(2023, 1, 1), date(2024, 12, 31)
+        bulk_insert_climate_metrics([
+            (
+                cls.cold_region.id, start_date + timedelta(days=day_number),
+                Decimal(temperatures[day_number % len(temperatures)]), humidities[day_number % len(humidities)], Decimal('1.00'),
+            )
+            for day_number in range((end_date - start_date).days + 1)
+        ])
+        refresh_climate_histogram(cls.cold_region.id, start_date, end_date)
+
+    def test_month_percentages_match_the_array_engine(self):
+        for region in (self.seeded_region, self.cold_region):
+            for thresholds in self.THRESHOLDS:
+                with self.subTest(region=region.name, thresholds=thresholds):
+                    months = summarize_climate_metrics([region.id], thresholds, engine='array')[region.id]['months']
+                    def percentage(counts, field):
+                        return round((counts[field] / counts['total_days']) * 100, 2)
+
+                    expected = [
+                        {
+                            'month': month,
+                            'total_days': counts['total_days'],
+                            'percentage_days_in_optimal_temp_range': percentage(counts, 'temp_days'),
+                            'percentage_days_in_optimal_humidity_range': percentage(counts, 'humidity_days'),
+                        }
+                        for month, counts in sorted(months.items())
+                    ]
+
+                    self.assertEqual(calculate_what_if_insights(region.id, thresholds)['months'], expected)
+
+
+class BackfillClimateDataTests(FakeClimateApiTestCase):
+    def setUp(self):
+        super().setUp()
+        WineRegion.objects.all().delete()
+        self.region = WineRegion.objects.create(name="Test Region", latitude=-35, longitude=138)
+
+    def test_interrupted_backfill_resumes_after_the_last_committed_chunk(self):
+        # The 2023 chunk fails after its rows are inserted, so it's rolled back along with its watermark
+        def fail_in_2023(region_id, start_date):
+            if start_date.year == 2023:
+                raise Exception("Interrupted")
+            refresh_running_totals(region_id, start_date)
+
+        with mock.patch('climate_api.services.refresh_running_totals', side_effect=fail_in_2023):
+            response = backfill_climate_data_for_all_regions(date(2021, 1, 1), date(2024, 12, 31))
+
+        self.assertFalse(response['success'])
+        self.assertEqual(ClimateIngestionCheckpoint.objects.get(wine_region=self.region).last_metric_date, date(2022, 12, 31))
+        last_day = ClimateMetrics.objects.filter(wine_region=self.region).aggregate(last_day=Max('metric_date'))['last_day']
+        self.assertEqual(last_day, date(2022, 12, 31))
+
+        self.server.requests = []
+        response = backfill_climate_data_for_all_regions(date(2021, 1, 1), date(2024, 12, 31))
+
+        self.assertTrue(response['success'], response['error'])
+        self.assertEqual(self.server.requests, [(date(2023, 1, 1), date(2023, 12, 31)), (date(2024, 1, 1), date(2024, 12, 31))])
+        self.assertEqual(ClimateIngestionCheckpoint.objects.get(wine_region=self.region).last_metric_date, date(2024, 12, 31))
+        self.assertEqual(ClimateMetrics.objects.filter(wine_region=self.region).count(), (date(2025, 1, 1) - date(2021, 1, 1)).days)
+
+
+class ClimateInsightsEquivalenceTests(TestCase):
+    # Metrics for two regions over 31 years, so both windows have days just inside and just outside them
+    @classmethod
+    def setUpTestData(cls):
+        cls.regions = [
+            WineRegion.objects.create(name="Summer Region", latitude=-35, longitude=138),
+            WineRegion.objects.create(name="Winter Region", latitude=-36, longitude=139),
+        ]
+        seed_climate_metrics(cls.regions[0], TODAY - timedelta(days=365 * 31), TODAY, warm_months=(1, 2, 3, 12))
+        seed_climate_metrics(cls.regions[1], TODAY - timedelta(days=365 * 31), TODAY, warm_months=(6, 7, 8))
+        cls.region_without_metrics = WineRegion.objects.create(name="Empty Region", latitude=-37, longitude=140)
+        cls.region_ids = [region.id for region in cls.regions] + [cls.region_without_metrics.id]
+
+    def test_single_scan_matches_per_metric_calculations(self):
+        summaries = summarize_climate_metrics([region.id for region in self.regions], today=TODAY, engine='orm')
+
+        for region in self.regions:
+            expected = calculate_per_metric_climate_insights(region.id, TODAY)
+            insights = build_climate_insights(region.id, summaries[region.id])
+            for field, value in expected.items():
+                self.assertEqual(insights[field], value, f"{field} for {region.name}")
+
+        # The regions are different enough to tell apart
+        self.assertEqual(build_climate_insights(self.regions[0].id, summaries[self.regions[0].id])['optimal_time_of_year_start_month'], 1)
+        self.assertEqual(build_climate_insights(self.regions[1].id, summaries[self.regions[1].id])['optimal_time_of_year_start_month'], 6)
+
+    def test_engines_agree(self):
+        custom_thresholds = InsightThresholds(
+            temp_min=20, temp_max=28.5, humidity_min=55, humidity_max=71, temp_percentage_threshold=5, winter_months=(12, 1, 2)
+        )
+
+        for thresholds in (None, custom_thresholds):
+            kwargs = {'thresholds': thresholds} if thresholds else {}
+            summaries = {
+                engine: summarize_climate_metrics(self.region_ids, today=TODAY, engine=engine, **kwargs)
+                for engine in ('orm', 'array', 'rollup')
+            }
+
+            self.assertEqual(set(summaries['orm']), {region.id for region in self.regions})
+            self.assertEqual(summaries['array'], summaries['orm'], f"array engine with {thresholds}")
+            self.assertEqual(summaries['rollup'], summaries['orm'], f"rollup engine with {thresholds}")
+
+    def test_engines_agree_for_one_region(self):
+        all_regions = summarize_climate_metrics(self.region_ids, today=TODAY, engine='orm')
+
+        for engine in ('orm', 'array', 'rollup'):
+            self.assertEqual(
+                summarize_climate_metrics([self.regions[1].id], today=TODAY, engine=engine),
+                {self.regions[1].id: all_regions[self.regions[1].id]},
+            )
+            self.assertEqual(summarize_climate_metrics([self.region_without_metrics.id], today=TODAY, engine=engine), {})
+
+    def test_arrays_are_only_loaded_for_the_regions_asked_for(self):
+        self.assertEqual(list(load_climate_arrays([self.regions[0].id])), [self.regions[0].id])
+
+        arrays = load_climate_arrays([self.regions[0].id])[self.regions[0].id]
+        self.assertEqual(len(arrays.metric_dates), ClimateMetrics.objects.filter(wine_region=self.regions[0]).count())
+        self.assertEqual(int(np.isnan(arrays.humidity).sum()), ClimateMetrics.objects.filter(
+            wine_region=self.regions[0], relative_humidity_mean__isnull=True
+        ).count())
+
+
+class ClimateWindowInsightsTests(TestCase):
+    # Windows of a region's metrics checked against the array engine's daily values over the same dates
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = WineRegion.objects.create(name="Window Region", latitude=-35, longitude=138)
+        seed_climate_metrics(cls.region, date(2019, 1, 1), date(2024, 12, 31), warm_months=(1, 2, 3, 12))
+        cls.arrays = load_climate_arrays([cls.region.id])[cls.region.id]
+
+    def expected_window_insights(self, start_date, end_date):
+        arrays = self.arrays
+        in_window = arrays.in_window(start_date, end_date)
+        in_temp_range = (arrays.temperature >= DEFAULT_THRESHOLDS.temp_min) & (arrays.temperature <= DEFAULT_THRESHOLDS.temp_max)
+        in_humidity_range = (arrays.humidity >= DEFAULT_THRESHOLDS.humidity_min) & (arrays.humidity <= DEFAULT_THRESHOLDS.humidity_max)
+        in_winter = np.isin(arrays.months, DEFAULT_THRESHOLDS.winter_months)
+        total_days = int(in_window.sum())
+
+        def percentage_of_days(mask):
+            return round((int((in_window & mask).sum()) / total_days) * 100, 2)
+
+        return {
+            "total_days": total_days,
+            "percentage_days_in_optimal_temp_range": percentage_of_days(in_temp_range),
+            "percentage_days_in_optimal_humidity_range": percentage_of_days(in_humidity_range),
+            "optimal_conditions_percentage": percentage_of_days(in_temp_range & in_humidity_range),
+            "precipitation_total": Decimal(int(arrays.precipitation_hundredths[in_window].sum())).scaleb(-2),
+            "winter_precipitation_total": Decimal(int(arrays.precipitation_hundredths[in_window & in_winter].sum())).scaleb(-2),
+        }
+
+    def test_windows_match_array_engine(self):
+        windows = [
+            (date(2019, 1, 1), date(2024, 12, 31)),  # every day
+            (date(2020, 6, 1), date(2020, 8, 31)),  # whole months
+            (date(2020, 2, 15), date(2021, 7, 9)),  # starting and ending mid-month
+            (date(2021, 3, 1), date(2021, 3, 20)),  # ending mid-month
+            (date(2022, 12, 17), date(2023, 1, 31)),  # starting mid-month, across a year
+            (date(2023, 7, 4), date(2023, 7, 4)),  # a single day
+            (date(2018, 11, 3), date(2019, 2, 10)),  # starting before the first day
+        ]
+
+        for start_date, end_date in windows:
+            with self.subTest(start_date=start_date, end_date=end_date):
+                insights = calculate_climate_window_insights(self.region.id, start_date, end_date)
+                expected = self.expected_window_insights(start_date, end_date)
+                for field, value in expected.items():
+                    self.assertEqual(insights[field], value, field)
+
+                response = self.client.get(
+                    f'/api/climate-insights/{self.region.id}/window',
+                    {'start_date': start_date.isoformat(), 'end_date': end_date.isoformat()},
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.data['total_days'], expected['total_days'])
+                self.assertEqual(response.data['optimal_conditions_percentage'], expected['optimal_conditions_percentage'])
+                self.assertEqual(Decimal(str(response.data['precipitation_total'])), expected['precipitation_total'])
+
+    def test_window_without_metrics(self):
+        insights = calculate_climate_window_insights(self.region.id, date(2010, 1, 1), date(2010, 12, 31))
+        self.assertEqual(insights['total_days'], 0)
+        self.assertEqual(insights['optimal_conditions_percentage'], 0)
+
+    def test_invalid_window(self):
+        response = self.client.get(
+            f'/api/climate-insights/{self.region.id}/window', {'start_date': '2021-03-02', 'end_date': '2021-03-01'}
+        )
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.get('/api/climate-insights/999999/window', {'start_date': '2021-03-01', 'end_date': '2021-03-02'})
+        self.assertEqual(response.status_code, 404)
+
+
+class BackgroundJobsTests(TestCase):
+    def test_auto_runs_them_only_in_the_serving_runserver_process(self):
+        cases = [
+            (['manage.py', 'runserver'], {'RUN_MAIN': 'true'}, True),
+            (['manage.py', 'runserver', '--noreload'], {}, True),
+            (['manage.py', 'runserver'], {}, False),
+            (['manage.py', 'migrate'], {}, False),
+            (['manage.py', 'export_climate_metrics', '--output', 'runserver'], {}, False),
+        ]
+        for argv, environ, expected in cases:
+            with self.subTest(argv=argv, environ=environ), mock.patch('sys.argv', argv), mock.patch.dict('os.environ', environ):
+                self.assertEqual(should_run_background_jobs(), expected)
+
+    def test_setting_overrides_auto(self):
+        with mock.patch('sys.argv', ['manage.py', 'runserver', '--noreload']), override_settings(CLIMATE_BACKGROUND_JOBS='false'):
+            self.assertFalse(should_run_background_jobs())
+        with mock.patch('sys.argv', ['gunicorn']), override_settings(CLIMATE_BACKGROUND_JOBS='true'):
+            self.assertTrue(should_run_background_jobs())
+
+
+class RecomputeClimateInsightsTests(TestCase):
+    def test_clears_the_regions_dirty_ranges(self):
+        region = WineRegion.objects.create(name="Test Region", latitude=-35, longitude=138)
+        save_climate_data_chunk(region, daily_climate_data(date(2024, 1, 1), 10), (date(2024, 1, 1), date(2024, 1, 10)))
+        self.assertIsNotNone(ClimateIngestionCheckpoint.objects.get(wine_region=region).insights_dirty_from)
+
+        response = recompute_climate_insights()
+        self.assertTrue(response['success'], response['error'])
+
+        self.assertFalse(ClimateIngestionCheckpoint.objects.filter(insights_dirty_from__isnull=False).exists())
+
+
+class CalculateClimateInsightsForDirtyRegionsTests(TestCase):
+    # Two regions with ten days each, at 20 degrees and 50% humidity outside winter
+    def setUp(self):
+        self.regions = [
+            WineRegion.objects.create(name="Region A", latitude=-35, longitude=138),
+            WineRegion.objects.create(name="Region B", latitude=-36, longitude=139),
+        ]
+        for region in self.regions:
+            save_climate_data_chunk(region, daily_climate_data(date(2024, 1, 1), 10), (date(2024, 1, 1), date(2024, 1, 10)))
+
+    def recalculate(self):
+        with mock.patch('climate_api.services.summarize_climate_metrics', wraps=summarize_climate_metrics) as summarize:
+            response = calculate_climate_insights_for_dirty_regions()
+
+        self.assertTrue(response['success'], response['error'])
+        recalculated_region_ids = set(summarize.call_args.kwargs['region_ids']) if summarize.called else set()
+        self.assertEqual(len(recalculated_region_ids), response['num_regions_recalculated'])
+        return response, recalculated_region_ids
+
+    def test_only_dirty_regions_are_recalculated(self):
+        # Every region starts without insights, so every region is calculated the first time round
+        response, recalculated_region_ids = self.recalculate()
+        self.assertEqual(recalculated_region_ids, set(WineRegion.objects.values_list('id', flat=True)))
+        self.assertEqual(response['num_insights_written'], WineRegion.objects.count())
+        self.assertFalse(ClimateIngestionCheckpoint.objects.filter(insights_dirty_from__isnull=False).exists())
+
+        # Nothing written since
+        response, recalculated_region_ids = self.recalculate()
+        self.assertEqual(recalculated_region_ids, set())
+        self.assertEqual(response['num_insights_written'], 0)
+
+        # Ten warm days for one region
+        save_climate_data_chunk(
+            self.regions[1], daily_climate_data(date(2024, 3, 1), 10, temperature=28.0), (date(2024, 3, 1), date(2024, 3, 10))
+        )
+        num_insights = ClimateInsights.objects.count()
+        previous_insights = CurrentClimateInsights.objects.get(wine_region=self.regions[1])
+
+        response, recalculated_region_ids = self.recalculate()
+        self.assertEqual(recalculated_region_ids, {self.regions[1].id})
+        self.assertEqual(response['num_insights_written'], 1)
+        self.assertEqual(ClimateInsights.objects.count(), num_insights + 1)
+        self.assertEqual(ClimateInsights.objects.latest('created_at').wine_region, self.regions[1])
+        self.assertNotEqual(
+            CurrentClimateInsights.objects.get(wine_region=self.regions[1]).past_10_years_percentage_days_in_optimal_temp_range,
+            previous_insights.past_10_years_percentage_days_in_optimal_temp_range,
+        )
+        self.assertIsNone(ClimateIngestionCheckpoint.objects.get(wine_region=self.regions[1]).insights_dirty_from)
+
+    def test_unchanged_insights_are_not_written_again(self):
+        self.recalculate()
+        num_insights = ClimateInsights.objects.count()
+        current_insights = CurrentClimateInsights.objects.get(wine_region=self.regions[0])
+
+        # More days just like the ones already there leave every percentage and total as it was
+        save_climate_data_chunk(self.regions[0], daily_climate_data(date(2024, 2, 1), 10), (date(2024, 2, 1), date(2024, 2, 10)))
+        self.assertIsNotNone(ClimateIngestionCheckpoint.objects.get(wine_region=self.regions[0]).insights_dirty_from)
+
+        response, recalculated_region_ids = self.recalculate()
+        self.assertEqual(recalculated_region_ids, {self.regions[0].id})
+        self.assertEqual(response['num_insights_written'], 0)
+        self.assertEqual(ClimateInsights.objects.count(), num_insights)
+        self.assertEqual(CurrentClimateInsights.objects.get(wine_region=self.regions[0]).created_at, current_insights.created_at)
+        self.assertIsNone(ClimateIngestionCheckpoint.objects.get(wine_region=self.regions[0]).insights_dirty_from)
+
+
+class CompactClimateInsightsHistoryTests(TestCase):
+    # Insights history on either side of the default retention ages (every row for 30 days, the last row of each week
+    # for a year, then the last row of each month), as (created_at, insights values, kept). NOW is a Sunday.
+    NOW = timezone.make_aware(datetime(2026, 10, 18, 12))
+    HISTORY = [
+        # Monthly: only the last row of each month is looked at, and April's is kept because it differs from March's
+        (datetime(2025, 3, 5), 'A', False),
+        (datetime(2025, 3, 20), 'B', True),
+        (datetime(2025, 4, 10), 'B', False),
+        (datetime(2025, 4, 25), 'C', True),
+        (datetime(2025, 5, 15), 'C', False),  # the same as April's
+        # Weekly, from 2025-10-18
+        (datetime(2026, 6, 1), 'C', False),
+        (datetime(2026, 6, 3), 'D', True),
+        (datetime(2026, 6, 10), 'D', False),  # the same as the week before
+        (datetime(2026, 6, 17), 'E', True),
+        # Daily, from 2026-09-18
+        (datetime(2026, 10, 1), 'E', False),
+        (datetime(2026, 10, 2, 1), 'F', True),
+        (datetime(2026, 10, 2, 2), 'F', False),
+        (datetime(2026, 10, 10), 'E', True),  # a change back to an earlier value
+        (datetime(2026, 10, 17), 'E', False),
+    ]
+    PERCENTAGES = {'A': Decimal('0.10'), 'B': Decimal('0.20'), 'C': Decimal('0.30'), 'D': Decimal('0.40'), 'E': Decimal('0.50'), 'F': Decimal('0.60')}
+
+    def create_history(self, region, history):
+        insights = ClimateInsights.objects.bulk_create(
+            [
+                ClimateInsights(wine_region=region, optimal_conditions_percentage_last_30_years=self.PERCENTAGES[values])
+                for created_at, values, kept in history
+            ]
+        )
+        for row, (created_at, values, kept) in zip(insights, history):
+            ClimateInsights.objects.filter(id=row.id).update(created_at=timezone.make_aware(created_at))
+
+        return {row.id for row, (created_at, values, kept) in zip(insights, history) if kept}
+
+    def test_retention_policy(self):
+        rows = [
+            (row_id, timezone.make_aware(created_at), (values,)) for row_id, (created_at, values, kept) in enumerate(self.HISTORY)
+        ]
+        delete_ids = find_compactable_climate_insights(iter(rows), now=self.NOW)
+
+        self.assertEqual(delete_ids, [row_id for row_id, (created_at, values, kept) in enumerate(self.HISTORY) if not kept])
+        self.assertEqual(find_compactable_climate_insights([], now=self.NOW), [])
+
+    @override_settings(CLIMATE_INSIGHTS_COMPACTION_BATCH_SIZE=3)
+    def test_compacts_each_region_separately(self):
+        regions = WineRegion.objects.all()[:3]
+        kept_ids = self.create_history(regions[0], self.HISTORY)
+        # The same values throughout, so only the first row kept by age survives
+        kept_ids |= self.create_history(regions[1], [(created_at, 'A', created_at == datetime(2025, 3, 20)) for created_at, values, kept in self.HISTORY])
+        # A single row is always kept
+        kept_ids |= self.create_history(regions[2], [(datetime(2020, 1, 1), 'A', True)])
+        num_rows = ClimateInsights.objects.count()
+
+        response = compact_climate_insights_history(dry_run=True, now=self.NOW)
+        self.assertTrue(response['success'], response['error'])
+        self.assertEqual(response['num_rows_deleted'], num_rows - len(kept_ids))
+        self.assertEqual(ClimateInsights.objects.count(), num_rows)
+
+        response = compact_climate_insights_history(now=self.NOW)
+        self.assertTrue(response['success'], response['error'])
+        self.assertEqual(response['num_rows_kept'], len(kept_ids))
+        self.assertEqual(set(ClimateInsights.objects.values_list('id', flat=True)), kept_ids)
+
+        # Compacting again finds nothing more to delete
+        self.assertEqual(compact_climate_insights_history(now=self.NOW)['num_rows_deleted'], 0)
+
+
+class SerializeClimateInsightsTests(TestCase):
+    # The values_list() fast path against the serializer it stands in for, with nulls and decimals that need padding,
+    # rounding or have no fractional part
+    def setUp(self):
+        regions = WineRegion.objects.order_by('id')[:3]
+        insights = [
+            dict(
+                optimal_time_of_year_start_month=None,
+                optimal_time_of_year_end_month=None,
+                past_10_years_winter_precipitation_total=Decimal('0'),
+                past_10_years_percentage_days_in_optimal_temp_range=Decimal('0.00'),
+                past_10_years_percentage_days_in_optimal_humidity_range=Decimal('100'),
+                optimal_conditions_percentage_last_30_years=Decimal('0.01'),
+            ),
+            dict(
+                optimal_time_of_year_start_month=11,
+                optimal_time_of_year_end_month=2,
+                past_10_years_winter_precipitation_total=Decimal('12345678.9'),
+                past_10_years_percentage_days_in_optimal_temp_range=Decimal('33.333'),
+                past_10_years_percentage_days_in_optimal_humidity_range=Decimal('66.667'),
+                optimal_conditions_percentage_last_30_years=Decimal('12.5'),
+            ),
+            dict(
+                optimal_time_of_year_start_month=6,
+                optimal_time_of_year_end_month=6,
+                past_10_years_winter_precipitation_total=Decimal('1.05'),
+                past_10_years_percentage_days_in_optimal_temp_range=Decimal('99.99'),
+                past_10_years_percentage_days_in_optimal_humidity_range=Decimal('0.5'),
+                optimal_conditions_percentage_last_30_years=Decimal('7'),
+            ),
+        ]
+        for region, values in zip(regions, insights):
+            CurrentClimateInsights.objects.create(wine_region=region, created_at=timezone.now(), **values)
+            ClimateInsights.objects.create(wine_region=region, **values)
+
+    def test_matches_serializer(self):
+        for model, serializer_class in ((CurrentClimateInsights, CurrentClimateInsightsSerializer), (ClimateInsights, ClimateInsightsSerializer)):
+            with self.subTest(model=model.__name__):
+                queryset = model.objects.order_by('wine_region_id')
+                expected = serializer_class(queryset, many=True).data
+
+                self.assertEqual(json.dumps(serialize_climate_insights(queryset)), json.dumps(expected))
+                self.assertEqual(json.dumps(async_to_sync(aserialize_climate_insights)(queryset)), json.dumps(expected))
+
+        # The nulls and decimals really were tested
+        first, second = serialize_climate_insights(CurrentClimateInsights.objects.order_by('wine_region_id'))[:2]
+        self.assertIsNone(first['optimal_time_of_year']['start_month'])
+        self.assertEqual(first['performance_past_10_years']['winter_precipitation_total'], '0.00')
+        self.assertEqual(second['performance_past_10_years']['percentage_days_in_optimal_temp_range'], '33.33')
+        self.assertEqual(second['optimal_conditions_percentage_last_30_years'], '12.50')
+
+
+class CurrentClimateInsightsTestCase(TestCase):
+    # Insights for each of the seeded regions, with nothing cached
+    def setUp(self):
+        get_climate_insights_cache().clear()
+        self.created_at = timezone.now()
+        for region in WineRegion.objects.all():
+            CurrentClimateInsights.objects.create(
+                wine_region=region, created_at=self.created_at, past_10_years_winter_precipitation_total=Decimal('100.00')
+            )
+        self.region = WineRegion.objects.order_by('id').first()
+
+    def recalculate_elsewhere(self, precipitation):
+        # New insights written the way another process would write them, without this process being told
+        CurrentClimateInsights.objects.filter(wine_region=self.region).update(
+            past_10_years_winter_precipitation_total=precipitation, created_at=self.created_at + timedelta(hours=1)
+        )
+
+
+class ClimateInsightsCacheTests(CurrentClimateInsightsTestCase):
+    def test_unchanged_insights_are_served_from_the_cache(self):
+        hits = get_climate_insights_cache_stats()['hits']
+        first = self.client.get('/api/climate-insights/').content
+        second = self.client.get('/api/climate-insights/').content
+
+        self.assertEqual(first, second)
+        self.assertEqual(get_climate_insights_cache_stats()['hits'], hits + 1)
+
+    def test_insights_recalculated_in_another_process_are_served_at_once(self):
+        urls = [
+            '/api/climate-insights/',
+            f'/api/climate-insights/{self.region.id}',
+            '/api/climate-insights/ranking?metric=past_10_years_winter_precipitation_total&limit=1',
+        ]
+        for url in urls:
+            self.client.get(url)
+
+        self.recalculate_elsewhere(Decimal('250.00'))
+
+        region_insights = self.client.get(urls[0]).json()[0]
+        self.assertEqual(region_insights['wine_region']['id'], self.region.id)
+        self.assertEqual(region_insights['performance_past_10_years']['winter_precipitation_total'], '250.00')
+        self.assertEqual(self.client.get(urls[1]).json()['performance_past_10_years']['winter_precipitation_total'], '250.00')
+        self.assertEqual(self.client.get(urls[2]).json()['results'][0]['wine_region']['id'], self.region.id)
+
+
+class ClimateInsightsConditionalGetTests(CurrentClimateInsightsTestCase):
+    def assert_body_and_etag_come_from_the_same_version(self, url):
+        old_response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=old_response['ETag']).status_code, 304)
+
+        self.recalculate_elsewhere(Decimal('250.00'))
+
+        # The old ETag no longer matches, and the new one comes with the new insights rather than the cached body
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=old_response['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], old_response['ETag'])
+        self.assertEqual(response.json()['performance_past_10_years']['winter_precipitation_total'], '250.00')
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_body_and_etag_come_from_the_same_version(self):
+        self.assert_body_and_etag_come_from_the_same_version(f'/api/climate-insights/{self.region.id}')
+
+    def test_async_body_and_etag_come_from_the_same_version(self):
+        self.assert_body_and_etag_come_from_the_same_version(f'/api/async/climate-insights/{self.region.id}')
+
+    def test_sync_and_async_views_agree(self):
+        for path in ('', str(self.region.id)):
+            with self.subTest(path=path):
+                response = self.client.get(f'/api/climate-insights/{path}')
+                async_response = self.client.get(f'/api/async/climate-insights/{path}')
+                self.assertEqual(response.content, async_response.content)
+                self.assertEqual(response['ETag'], async_response['ETag'])
+                self.assertEqual(response['Last-Modified'], async_response['Last-Modified'])
+
+
+class ClimateInsightsRankingTests(CurrentClimateInsightsTestCase):
+    # The seeded regions with distinct percentages apart from a tie for the best
+    PERCENTAGES = [Decimal('30.00'), Decimal('50.00'), Decimal('10.00'), Decimal('50.00'), Decimal('20.00')]
+
+    def setUp(self):
+        super().setUp()
+        self.region_ids = list(WineRegion.objects.order_by('id').values_list('id', flat=True))
+        for region_id, percentage in zip(self.region_ids, self.PERCENTAGES):
+            CurrentClimateInsights.objects.filter(wine_region_id=region_id).update(optimal_conditions_percentage_last_30_years=percentage)
+
+        # Best first, ties by region
+        self.ranked_region_ids = [
+            region_id for percentage, region_id in sorted((-percentage, region_id) for region_id, percentage in zip(self.region_ids, self.PERCENTAGES))
+        ]
+
+    def get_ranking(self, **params):
+        response = self.client.get('/api/climate-insights/ranking', {'metric': 'optimal_conditions_percentage_last_30_years', **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['rank'], row['wine_region']['id']) for row in response.json()['results']]
+
+    def test_top_and_bottom(self):
+        all_ranks = list(enumerate(self.ranked_region_ids, start=1))
+
+        self.assertEqual(self.get_ranking(), all_ranks)
+        self.assertEqual(self.get_ranking(order='top', limit=2), all_ranks[:2])
+        # The worst first, keeping the ranks they have from the top
+        self.assertEqual(self.get_ranking(order='bottom'), all_ranks[::-1])
+        self.assertEqual(self.get_ranking(order='bottom', limit=2), all_ranks[:-3:-1])
+
+    def test_results_are_insights(self):
+        response = self.client.get('/api/climate-insights/ranking', {'metric': 'optimal_conditions_percentage_last_30_years', 'limit': 1})
+        first = response.json()['results'][0]
+        self.assertEqual(first['optimal_conditions_percentage_last_30_years'], '50.00')
+        self.assertEqual(first['performance_past_10_years']['winter_precipitation_total'], '100.00')
+
+    def test_invalid_parameters(self):
+        for params in (
+            {},
+            {'metric': 'wine_region_id'},
+            {'metric': 'optimal_conditions_percentage_last_30_years', 'order': 'middle'},
+            {'metric': 'optimal_conditions_percentage_last_30_years', 'limit': 0},
+        ):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/api/climate-insights/ranking', params).status_code, 400)
+
+
+class ClimateMetricsExportTests(TestCase):
+    def setUp(self):
+        region = WineRegion.objects.order_by('id').first()
+        bulk_insert_climate_metrics([(region.id, date(2024, 1, day), Decimal('20.5'), 50, Decimal('1.25')) for day in range(1, 11)])
+
+    def test_parquet_and_arrow_match_csv(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        def export(export_format):
+            return b''.join(self.client.get(f'/api/climate-metrics/export?export_format={export_format}').streaming_content)
+
+        csv_rows = export('csv').decode().splitlines()
+        header, rows = csv_rows[0].split(','), [row.split(',') for row in csv_rows[1:]]
+
+        parquet_table = pq.read_table(pa.BufferReader(export('parquet')))
+        arrow_table = pa.ipc.open_stream(export('arrow')).read_all()
+
+        for table in (parquet_table, arrow_table):
+            self.assertEqual(table.column_names, header)
+            self.assertEqual([[str(value) for value in row.values()] for row in table.to_pylist()], rows)
+
+    def test_missing_pyarrow_is_not_implemented(self):
+        # A None entry in sys.modules makes the import fail
+        with mock.patch.dict('sys.modules', {'pyarrow': None}):
+            for export_format in ('arrow', 'parquet'):
+                response = self.client.get(f'/api/climate-metrics/export?export_format={export_format}')
+                self.assertEqual(response.status_code, 501)
+                self.assertIn('pyarrow', response.json()['error'])
+
+            self.assertEqual(self.client.get('/api/climate-metrics/export?export_format=csv').status_code, 200)
+
+    def test_unknown_format_is_a_bad_request(self):
+        self.assertEqual(self.client.get('/api/climate-metrics/export?export_format=xlsx').status_code, 400)
+
+
+class ClimateMetricsSeriesTests(TestCase):
+    # Two years and a bit of metrics, starting and ending part way through a week, month and year
+    @classmethod
+    def setUpTestData(cls):
+        cls.region = WineRegion.objects.create(name="Series Region", latitude=-35, longitude=138)
+        seed_climate_metrics(cls.region, date(2019, 11, 20), date(2022, 2, 10), warm_months=(1, 2, 3, 12))
+
+    def get_all_pages(self, **params):
+        # Follow the next links from the first page to the last, returning every row and the number of pages
+        url = f'/api/climate-metrics/{self.region.id}'
+        rows, num_pages = [], 0
+        while url:
+            response = self.client.get(url, params if not num_pages else None)
+            self.assertEqual(response.status_code, 200)
+            page = json.loads(b''.join(response.streaming_content))
+            rows += page['results']
+            num_pages += 1
+            url = page['next'] and urlsplit(page['next'])._replace(scheme='', netloc='').geturl()
+
+        return rows, num_pages
+
+    def expected_series(self, resolution, start_date=None, end_date=None):
+        # The periods worked out from the daily rows, as {period start: [(temperature, humidity, precipitation)]}
+        period_starts = {
+            'day': lambda day: day,
+            'week': lambda day: day - timedelta(days=day.weekday()),
+            'month': lambda day: day.replace(day=1),
+            'year': lambda day: day.replace(month=1, day=1),
+        }
+        metrics = ClimateMetrics.objects.filter(wine_region=self.region).order_by('metric_date')
+        if start_date:
+            metrics = metrics.filter(metric_date__gte=start_date)
+        if end_date:
+            metrics = metrics.filter(metric_date__lte=end_date)
+
+        periods = {}
+        for metric in metrics:
+            periods.setdefault(period_starts[resolution](metric.metric_date), []).append(
+                (metric.temperature_mean, metric.relative_humidity_mean, metric.precipitation_sum)
+            )
+
+        return periods
+
+    def test_pages_cover_every_day_once(self):
+        rows, num_pages = self.get_all_pages(limit=100)
+        expected = self.expected_series('day')
+
+        self.assertEqual(num_pages, len(expected) // 100 + 1)
+        self.assertEqual([row['metric_date'] for row in rows], [day.isoformat() for day in expected])
+        for row, [(temperature, humidity, precipitation)] in zip(rows, expected.values()):
+            self.assertEqual(row['temperature_mean'], float(temperature))
+            self.assertEqual(row['relative_humidity_mean'], humidity)
+            self.assertEqual(row['precipitation_sum'], float(precipitation))
+
+    def test_downsampled_pages_match_daily_rows(self):
+        cases = [
+            ('week', 7, None, None),
+            ('month', 5, None, None),
+            ('year', 1, None, None),
+            ('week', 4, date(2020, 2, 13), date(2020, 5, 20)),  # a Thursday to a Wednesday
+            ('month', 2, date(2020, 2, 15), date(2021, 7, 9)),
+            ('year', 1, date(2020, 6, 15), date(2021, 3, 31)),
+        ]
+
+        for resolution, limit, start_date, end_date in cases:
+            with self.subTest(resolution=resolution, start_date=start_date, end_date=end_date):
+                params = {'resolution': resolution, 'limit': limit}
+                if start_date:
+                    params.update(start_date=start_date.isoformat(), end_date=end_date.isoformat())
+                rows, num_pages = self.get_all_pages(**params)
+                expected = self.expected_series(resolution, start_date, end_date)
+
+                self.assertGreater(num_pages, 1)
+                self.assertEqual([row['metric_date'] for row in rows], [period.isoformat() for period in expected])
+                for row, days in zip(rows, expected.values()):
+                    humidities = [humidity for temperature, humidity, precipitation in days if humidity is not None]
+                    self.assertEqual(row['days'], len(days))
+                    # The averages are rounded to one decimal place
+                    self.assertAlmostEqual(row['temperature_mean'], float(sum(day[0] for day in days) / len(days)), delta=0.05 + 1e-9)
+                    self.assertAlmostEqual(row['relative_humidity_mean'], sum(humidities) / len(humidities), delta=0.05 + 1e-9)
+                    self.assertAlmostEqual(row['precipitation_sum'], float(sum(day[2] for day in days)), places=6)
+
+    def test_invalid_parameters(self):
+        url = f'/api/climate-metrics/{self.region.id}'
+        self.assertEqual(self.client.get(url, {'resolution': 'decade'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'start_date': '2021-03-02', 'end_date': '2021-03-01'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/climate-metrics/999999').status_code, 404)
+
+
+class ClimateInsightsBatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.regions = [
+            WineRegion.objects.create(name="Southern Region", latitude=-35, longitude=138),
+            WineRegion.objects.create(name="Northern Region", latitude=45, longitude=4),
+        ]
+        seed_climate_metrics(cls.regions[0], date(2022, 1, 1), date(2024, 12, 31), warm_months=(1, 2, 3, 12))
+        seed_climate_metrics(cls.regions[1], date(2022, 1, 1), date(2024, 12, 31), warm_months=(6, 7, 8))
+
+    def post_batch(self, body):
+        return self.client.post('/api/climate-insights/batch', body, content_type='application/json')
+
+    def test_missing_regions_are_listed_and_the_rest_kept_in_order(self):
+        missing_region_id = WineRegion.objects.order_by('-id').first().id + 1
+        response = self.post_batch({'region_ids': [self.regions[1].id, missing_region_id, self.regions[0].id, self.regions[1].id]})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([insights['region_id'] for insights in response.json()['results']], [self.regions[1].id, self.regions[0].id])
+        self.assertEqual(response.json()['missing_region_ids'], [missing_region_id])
+
+    def test_up_to_1000_regions_in_a_fixed_number_of_queries(self):
+        region_ids = [self.regions[0].id, *range(100000, 100999)]
+        with self.assertNumQueries(2):
+            response = self.post_batch({'region_ids': region_ids})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['missing_region_ids']), 999)
+
+        response = self.post_batch({'region_ids': region_ids + [101000]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('region_ids', response.json())
+
+    def test_rollups_match_the_daily_metrics(self):
+        # Whole months against the default thresholds are read from the monthly rollups. With no default thresholds to
+        # match, the same windows are read from the daily rows instead.
+        windows = [
+            {},
+            {'start_date': '2022-03-01', 'end_date': '2024-08-31'},
+            {'start_date': '2023-12-01'},
+            {'end_date': '2023-01-31'},
+        ]
+        for window in windows:
+            with self.subTest(**window):
+                body = {'region_ids': [region.id for region in self.regions], **window}
+                with CaptureQueriesContext(connection) as queries:
+                    rollup_response = self.post_batch(body)
+                self.assertIn('climate_api_climatemonthlyrollup', queries[-1]['sql'])
+
+                with mock.patch('climate_api.insights.DEFAULT_THRESHOLDS', None), CaptureQueriesContext(connection) as queries:
+                    daily_response = self.post_batch(body)
+                self.assertIn('climate_api_climatemetrics', queries[-1]['sql'])
+
+                self.assertEqual(rollup_response.json(), daily_response.json())
+                self.assertTrue(all(insights['total_days'] for insights in rollup_response.json()['results']))
+
+
+@override_settings(WINE_REGION_INDEX_CHECK_INTERVAL=0)
+class RegionSpatialIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Regions spread over the globe, with some close to the poles and either side of the antimeridian
+        rng = np.random.default_rng(42)
+        latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, 500)))
+        latitudes[:10] = rng.uniform(85, 90, 10) * rng.choice([-1, 1], 10)
+        longitudes = rng.uniform(-180, 180, 500)
+        longitudes[10:20] = rng.uniform(179, 180, 10) * rng.choice([-1, 1], 10)
+        WineRegion.objects.bulk_create(
+            WineRegion(name=f"Region {number}", latitude=round(latitude, 6), longitude=round(longitude, 6))
+            for number, (latitude, longitude) in enumerate(zip(latitudes, longitudes))
+        )
+
+    def brute_force(self, latitude, longitude):
+        # Every region as (distance_km, region_id), nearest first
+        regions = list(WineRegion.objects.values_list('id', 'latitude', 'longitude'))
+        distances_km = haversine_km(
+            latitude, longitude, [float(region[1]) for region in regions], [float(region[2]) for region in regions]
+        )
+        return sorted(zip(distances_km.tolist(), [region[0] for region in regions]))
+
+    def test_nearest_and_within_match_a_brute_force_haversine_scan(self):
+        spatial_index = get_region_spatial_index()
+        rng = np.random.default_rng(7)
+        queries = [(-90.0, 0.0), (90.0, 45.0), (0.0, 180.0), (-34.9, 138.6)]
+        queries += [(float(latitude), float(longitude)) for latitude, longitude in zip(rng.uniform(-90, 90, 50), rng.uniform(-180, 180, 50))]
+
+        for latitude, longitude in queries:
+            with self.subTest(latitude=latitude, longitude=longitude):
+                expected = self.brute_force(latitude, longitude)
+
+                nearest = spatial_index.nearest(latitude, longitude, k=5)
+                self.assertEqual([region_id for region_id, _ in nearest], [region_id for _, region_id in expected[:5]])
+                for (_, distance_km), (expected_km, _) in zip(nearest, expected):
+                    self.assertAlmostEqual(distance_km, expected_km, places=6)
+
+                within = spatial_index.within(latitude, longitude, 1500)
+                self.assertEqual(
+                    [region_id for region_id, _ in within], [region_id for distance_km, region_id in expected if distance_km <= 1500]
+                )
+
+    def test_rebuilt_after_regions_change_without_signals(self):
+        # Changes made with update() and delete() on querysets, as another process might, with no signals sent here
+        region = WineRegion.objects.order_by('id').first()
+        self.assertNotEqual(get_region_spatial_index().nearest(51.5, -0.1, k=1)[0][0], region.id)
+
+        WineRegion.objects.filter(id=region.id).update(latitude=Decimal('51.5'), longitude=Decimal('-0.1'), updated_at=timezone.now())
+        self.assertEqual(get_region_spatial_index().nearest(51.5, -0.1, k=1), [(region.id, 0.0)])
+
+        WineRegion.objects.filter(id=region.id).delete()
+        self.assertNotIn(region.id, [region_id for region_id, _ in get_region_spatial_index().nearest(51.5, -0.1, k=5)])
+
+    def test_regions_are_checked_at_most_once_an_interval(self):
+        get_region_spatial_index()
+        with override_settings(WINE_REGION_INDEX_CHECK_INTERVAL=60), self.assertNumQueries(0):
+            get_region_spatial_index()
+
+
+class RefreshClimateAggregatesForRemovedDaysTests(TestCase):
+    def setUp(self):
+        self.region = WineRegion.objects.create(name="Test Region", latitude=-35, longitude=138)
+        seed_climate_metrics(self.region, date(2021, 1, 1), date(2024, 12, 31), warm_months=(1, 2, 3, 12))
+
+    def get_aggregates(self):
+        def rows(model, *fields):
+            return list(model.objects.filter(wine_region=self.region).order_by(*fields).values_list(*fields))
+
+        return (
+            rows(ClimateMonthlyRollup, 'year', 'month', 'total_days', 'temp_days', 'humidity_days', 'optimal_days', 'precipitation_sum'),
+            rows(
+                ClimateRunningTotal, 'metric_date', 'total_days', 'temp_days', 'humidity_days', 'optimal_days',
+                'precipitation_sum', 'winter_precipitation_sum',
+            ),
+            rows(ClimateHistogramBin, 'month', 'temperature_bin', 'relative_humidity_bin', 'day_count', 'precipitation_sum'),
+        )
+
+    def test_matches_aggregates_built_without_the_removed_days(self):
+        # A year taken out of the metrics, as detaching its partition does, then the same metrics ingested from scratch
+        ClimateMetrics.objects.filter(wine_region=self.region, metric_date__year=2022).delete()
+        refresh_climate_aggregates_for_removed_days(self.region.id, date(2022, 1, 1), date(2022, 12, 31))
+        refreshed = self.get_aggregates()
+
+        for model in (ClimateMonthlyRollup, ClimateRunningTotal, ClimateHistogramBin):
+            model.objects.filter(wine_region=self.region).delete()
+        refresh_monthly_rollups(self.region.id, date(2021, 1, 1), date(2024, 12, 31))
+        refresh_climate_histogram(self.region.id, date(2021, 1, 1), date(2024, 12, 31))
+        refresh_running_totals(self.region.id, date(2021, 1, 1))
+
+        self.assertEqual(refreshed, self.get_aggregates())
+        self.assertFalse(ClimateMonthlyRollup.objects.filter(wine_region=self.region, year=2022).exists())
+        self.assertFalse(ClimateRunningTotal.objects.filter(wine_region=self.region, metric_date__year=2022).exists())
@@ -1,32 +1,431 @@
+import orjson
+from django.conf import settings
+from django.db.models import Count, Max
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import http_date, quote_etag
+from django.views import View
+from django.views.decorators.http import condition
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .serializers import WineRegionSerializer, ClimateInsightsSerializer
-from .models import WineRegion, ClimateInsights
-from climate_api.services import update_climate_data_for_all_regions, calculate_climate_insights_for_region
+from .export import CLIMATE_METRICS_EXPORT_FORMATS, export_climate_metrics, get_export_format_error
+from .insights import calculate_batch_climate_insights, calculate_climate_window_insights, calculate_what_if_insights
+from .insights_cache import aget_cached_climate_insights, get_cached_climate_insights, get_climate_insights_cache_stats
+from .serializers import (
+    ClimateInsightsBatchSerializer,
+    ClimateInsightsRankingSerializer,
+    ClimateMetricsSeriesSerializer,
+    ClimateWindowSerializer,
+    CurrentClimateInsightsSerializer,
+    InsightThresholdsSerializer,
+    NearestWineRegionsSerializer,
+    aserialize_climate_insights,
+    aserialize_wine_regions,
+    serialize_climate_insights,
+    serialize_wine_regions,
+)
+from .models import WineRegion, CurrentClimateInsights
+from .spatial import get_region_spatial_index
+from climate_api.services import (
+    calculate_climate_insights_for_region,
+    get_climate_metrics_series,
+    update_climate_data_for_all_regions,
+)
 
 
     
+def render_climate_insights(region_id=None):
+    # Primary key lookups on the current insights, rather than finding the latest in the full history. Rows go through
+    # the values_list() fast path and orjson rather than the serializer and DRF's renderer - the output is the same.
+    if region_id is not None:
+        insights = serialize_climate_insights(CurrentClimateInsights.objects.filter(wine_region=region_id))
+        if not insights:
+            # Unknown regions keep getting the serializer's empty representation
+            return JSONRenderer().render(CurrentClimateInsightsSerializer(None).data)
+        return orjson.dumps(insights[0])
+
+    return orjson.dumps(serialize_climate_insights(CurrentClimateInsights.objects.order_by("wine_region")))
+
+
+def get_climate_insights_version(request, region_id=None):
+    # (created_at of the latest insights, number of regions) for the response a request will get, from a single indexed
+    # lookup on the current insights. Remembered on the request since both the ETag and Last-Modified are built from it.
+    if not hasattr(request, 'climate_insights_version'):
+        try:
+            if region_id is not None:
+                created_at = CurrentClimateInsights.objects.filter(wine_region=region_id).values_list('created_at', flat=True).first()
+                request.climate_insights_version = (created_at, 1)
+            else:
+                version = CurrentClimateInsights.objects.aggregate(created_at=Max('created_at'), num_regions=Count('pk'))
+                request.climate_insights_version = (version['created_at'], version['num_regions'])
+
+        except Exception:
+            # e.g. a region_id that isn't a number - let the view report it
+            request.climate_insights_version = (None, 0)
+
+    return request.climate_insights_version
+
+
+def climate_insights_last_modified(request, region_id=None):
+    return get_climate_insights_version(request, region_id)[0]
+
+
+def climate_insights_etag(request, region_id=None):
+    return format_climate_insights_etag(region_id, get_climate_insights_version(request, region_id))
+
+
+def format_climate_insights_etag(region_id, version):
+    created_at, num_regions = version
+    if created_at is None:
+        return None
+
+    return f"{region_id if region_id is not None else 'all'}-{num_regions}-{created_at.timestamp():.6f}"
+
+
 class ClimateInsightsView(APIView):
+    # Responses carry an ETag and Last-Modified, so clients polling with If-None-Match or If-Modified-Since get a 304
+    # without the insights being fetched, rendered or sent again until they've been recalculated
+    @method_decorator(condition(etag_func=climate_insights_etag, last_modified_func=climate_insights_last_modified))
     def get(self, request, *args, **kwargs):
         region_id = kwargs.get('region_id', None)
 
         try: 
-            if region_id is not None:
-                insights = ClimateInsights.objects.filter(wine_region=region_id).order_by("-created_at").first()
-                insights_serializer = ClimateInsightsSerializer(insights)
-            else:
-                insights = (
-                    ClimateInsights.objects.order_by("wine_region", "-created_at")
-                    .distinct("wine_region")
-                )
-                insights_serializer = ClimateInsightsSerializer(insights, many=True)
+            # Insights only change when they're recalculated, so the rendered JSON is cached under the same version as
+            # the ETag and served from the cache until the version changes
+            cache_name = f"region:{region_id}" if region_id is not None else "all"
+            body = get_cached_climate_insights(
+                cache_name, get_climate_insights_version(request, region_id), lambda: render_climate_insights(region_id)
+            )
 
-            return Response(insights_serializer.data, status=status.HTTP_200_OK)
+            return HttpResponse(body, content_type="application/json", status=status.HTTP_200_OK)
         
         except Exception as e:
             return Response({"error": f"Failed to fetch climate insights: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            patch_cache_control(response, public=True, max_age=settings.CLIMATE_INSIGHTS_MAX_AGE)
+
+        return response
+
+
+class ClimateInsightsCacheStatsView(APIView):
+    # Hit, miss and fill time counters for the insights response cache, for the process that answers the request
+    def get(self, request, *args, **kwargs):
+        return Response(get_climate_insights_cache_stats(), status=status.HTTP_200_OK)
+
+
+def render_climate_insights_ranking(metric, order, limit):
+    # Read straight off the metric's index: best first with ties by region, or the same ranking from the other end
+    if order == 'top':
+        ranked_insights = CurrentClimateInsights.objects.order_by(f'-{metric}', 'wine_region')
+    else:
+        ranked_insights = CurrentClimateInsights.objects.order_by(metric, '-wine_region')
+
+    insights = serialize_climate_insights(ranked_insights[:limit])
+    num_regions = CurrentClimateInsights.objects.count() if order == 'bottom' else None
+
+    return orjson.dumps({
+        "metric": metric,
+        "order": order,
+        "results": [
+            {"rank": rank + 1 if order == 'top' else num_regions - rank, **region_insights}
+            for rank, region_insights in enumerate(insights)
+        ],
+    })
+
+
+class ClimateInsightsRankingView(APIView):
+    # Regions ranked by an insights metric, e.g. ?metric=optimal_conditions_percentage_last_30_years&order=bottom&limit=5
+    # for the five worst. Rankings only change when insights are recalculated, so they're cached along with the insights.
+    def get(self, request, *args, **kwargs):
+        ranking_serializer = ClimateInsightsRankingSerializer(data=request.query_params)
+        if not ranking_serializer.is_valid():
+            return Response(ranking_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        metric, order, limit = (ranking_serializer.validated_data[field] for field in ('metric', 'order', 'limit'))
+
+        try:
+            body = get_cached_climate_insights(
+                f"ranking:{metric}:{order}:{limit}",
+                get_climate_insights_version(request),
+                lambda: render_climate_insights_ranking(metric, order, limit),
+            )
+            return HttpResponse(body, content_type="application/json", status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": f"Failed to rank climate insights: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ClimateWhatIfInsightsView(APIView):
+    # Insights for a region using custom thresholds passed as query parameters, e.g.
+    # ?temp_min=22&temp_max=30&humidity_min=35&humidity_max=75&winter_months=6&winter_months=7
+    def get(self, request, *args, **kwargs):
+        region_id = kwargs.get('region_id')
+
+        thresholds_serializer = InsightThresholdsSerializer(data=request.query_params)
+        if not thresholds_serializer.is_valid():
+            return Response(thresholds_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if not WineRegion.objects.filter(id=region_id).exists():
+            return Response({"error": f"Wine region {region_id} not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            what_if_insights = calculate_what_if_insights(region_id, thresholds_serializer.to_thresholds())
+            return Response(what_if_insights, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": f"Failed to calculate what-if insights: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ClimateWindowInsightsView(APIView):
+    # Insights for a region over any date range, e.g. ?start_date=2020-06-01&end_date=2020-08-31
+    def get(self, request, *args, **kwargs):
+        region_id = kwargs.get('region_id')
+
+        window_serializer = ClimateWindowSerializer(data=request.query_params)
+        if not window_serializer.is_valid():
+            return Response(window_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if not WineRegion.objects.filter(id=region_id).exists():
+            return Response({"error": f"Wine region {region_id} not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            window_insights = calculate_climate_window_insights(
+                region_id, window_serializer.validated_data['start_date'], window_serializer.validated_data['end_date']
+            )
+            return Response(window_insights, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": f"Failed to calculate window insights: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ClimateInsightsBatchView(APIView):
+    # Window insights for many regions in one request, e.g. POST
+    # {"region_ids": [1, 2, 3], "start_date": "2015-01-01", "end_date": "2024-12-31", "thresholds": {"temp_min": 22}}.
+    # Answered in a fixed number of queries however many regions are asked for.
+    def post(self, request, *args, **kwargs):
+        batch_serializer = ClimateInsightsBatchSerializer(data=request.data)
+        if not batch_serializer.is_valid():
+            return Response(batch_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            batch_insights = calculate_batch_climate_insights(
+                batch_serializer.validated_data['region_ids'],
+                start_date=batch_serializer.validated_data.get('start_date'),
+                end_date=batch_serializer.validated_data.get('end_date'),
+                thresholds=batch_serializer.to_thresholds(),
+            )
+            return Response(batch_insights, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": f"Failed to calculate batch insights: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class NearestWineRegionsView(APIView):
+    # The k regions nearest to a point with their current insights, e.g. ?latitude=-34.9&longitude=138.6&k=3, nearest
+    # first. With radius_km, only regions within that many km are included. Insights are null for a region that
+    # doesn't have any yet.
+    def get(self, request, *args, **kwargs):
+        nearest_serializer = NearestWineRegionsSerializer(data=request.query_params)
+        if not nearest_serializer.is_valid():
+            return Response(nearest_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        params = nearest_serializer.validated_data
+
+        try:
+            spatial_index = get_region_spatial_index()
+            if 'radius_km' in params:
+                matches = spatial_index.within(params['latitude'], params['longitude'], params['radius_km'], limit=params['k'])
+            else:
+                matches = spatial_index.nearest(params['latitude'], params['longitude'], params['k'])
+
+            region_ids = [region_id for region_id, _ in matches]
+            regions = {region['id']: region for region in serialize_wine_regions(WineRegion.objects.filter(id__in=region_ids))}
+            insights = {
+                region_insights.pop('wine_region')['id']: region_insights
+                for region_insights in serialize_climate_insights(CurrentClimateInsights.objects.filter(wine_region__in=region_ids))
+            }
+
+            return Response({
+                "latitude": params['latitude'],
+                "longitude": params['longitude'],
+                "results": [
+                    {
+                        "distance_km": round(distance_km, 3),
+                        "wine_region": regions[region_id],
+                        "insights": insights.get(region_id),
+                    }
+                    for region_id, distance_km in matches if region_id in regions
+                ],
+            }, status=status.HTTP_200_OK)
+
+        except Exception as e:
+            return Response({"error": f"Failed to find nearest wine regions: {e}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class ClimateMetricsSeriesView(APIView):
+    # A region's daily metrics, or averages per week, month or year, e.g. ?resolution=month&start_date=1995-01-01.
+    # The JSON is streamed out as rows are read, a page of up to `limit` rows at a time, with a link to the next page.
+    def get(self, request, *args, **kwargs):
+        region_id = kwargs.get('region_id')
+
+        params_serializer = ClimateMetricsSeriesSerializer(data=request.query_params)
+        if not params_serializer.is_valid():
+            return Response(params_serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if not WineRegion.objects.filter(id=region_id).exists():
+            return Response({"error": f"Wine region {region_id} not found"}, status=status.HTTP_404_NOT_FOUND)
+
+        params = params_serializer.validated_data
+        series = get_climate_metrics_series(
+            region_id,
+            resolution=params['resolution'],
+            start_date=params.get('start_date'),
+            end_date=params.get('end_date'),
+            after=params.get('after'),
+            limit=params['limit'] + 1,  # one extra row to tell whether there's another page
+        )
+
+        return StreamingHttpResponse(
+            stream_climate_metrics_series(request, region_id, params, series), content_type="application/json"
+        )
+
+
+def stream_climate_metrics_series(request, region_id, params, series, rows_per_chunk=500):
+    yield orjson.dumps({"region_id": region_id, "resolution": params['resolution']})[:-1] + b',"results":['
+
+    chunk = []
+    num_rows = 0
+    last_metric_date = None
+    has_next_page = False
+    for row in series:
+        if num_rows == params['limit']:
+            has_next_page = True
+            break
+
+        chunk.append(orjson.dumps(row))
+        num_rows += 1
+        last_metric_date = row['metric_date']
+
+        if len(chunk) == rows_per_chunk:
+            yield (b',' if num_rows > rows_per_chunk else b'') + b','.join(chunk)
+            chunk = []
+
+    if chunk:
+        yield (b',' if num_rows > len(chunk) else b'') + b','.join(chunk)
+
+    next_url = None
+    if has_next_page:
+        query_params = request.query_params.copy()
+        query_params['after'] = last_metric_date.isoformat()
+        next_url = request.build_absolute_uri(f"{request.path}?{query_params.urlencode()}")
+
+    yield b'],"next":' + orjson.dumps(next_url) + b'}'
+
+
+class ClimateMetricsExportView(APIView):
+    # Every region's daily metrics in one file, e.g. ?export_format=parquet ('csv', 'arrow' or 'parquet'). The query
+    # parameter isn't called "format" because DRF keeps that one for picking a renderer.
+    def get(self, request, *args, **kwargs):
+        export_format = request.query_params.get('export_format', 'csv')
+
+        # An unknown format is the request's fault, a known one this server can't write (without pyarrow) isn't
+        error = get_export_format_error(export_format)
+        if error:
+            if export_format in CLIMATE_METRICS_EXPORT_FORMATS:
+                return Response({"error": error}, status=status.HTTP_501_NOT_IMPLEMENTED)
+            return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, extension = CLIMATE_METRICS_EXPORT_FORMATS[export_format]
+        response = StreamingHttpResponse(stream_climate_metrics_export(export_format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="climate_metrics.{extension}"'
+        return response
+
+
+def stream_climate_metrics_export(export_format):
+    stats = {}
+    yield from export_climate_metrics(export_format, stats=stats)
+
+    rows_per_second = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+    print(f"Exported {stats['rows']} climate metrics as {export_format} in {stats['seconds']:.2f}s ({rows_per_second:.0f} rows/s)")
+
+
+# ********
+# ASYNC
+# ********
+# Async versions of the read endpoints, for running under an ASGI server (see asgi.py). They return the same bodies and
+# headers as the sync views, but a request waiting on the database or the cache doesn't hold on to a worker thread
+# while it waits. DRF's APIView can't run async handlers, so these are plain Django views.
+
+async def arender_climate_insights(region_id=None):
+    if region_id is not None:
+        insights = await aserialize_climate_insights(CurrentClimateInsights.objects.filter(wine_region=region_id))
+        if not insights:
+            return JSONRenderer().render(CurrentClimateInsightsSerializer(None).data)
+        return orjson.dumps(insights[0])
+
+    return orjson.dumps(await aserialize_climate_insights(CurrentClimateInsights.objects.order_by("wine_region")))
+
+
+async def aget_climate_insights_version(region_id=None):
+    try:
+        if region_id is not None:
+            created_at = await (
+                CurrentClimateInsights.objects.filter(wine_region=region_id).values_list('created_at', flat=True).afirst()
+            )
+            return (created_at, 1)
+
+        version = await CurrentClimateInsights.objects.aaggregate(created_at=Max('created_at'), num_regions=Count('pk'))
+        return (version['created_at'], version['num_regions'])
+
+    except Exception:
+        return (None, 0)
+
+
+class AsyncClimateInsightsView(View):
+    # ClimateInsightsView, including the conditional GETs and Cache-Control
+    async def get(self, request, region_id=None):
+        version = await aget_climate_insights_version(region_id)
+        etag = format_climate_insights_etag(region_id, version)
+        etag = quote_etag(etag) if etag is not None else None
+        last_modified = int(version[0].timestamp()) if version[0] is not None else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            try:
+                cache_name = f"region:{region_id}" if region_id is not None else "all"
+                body = await aget_cached_climate_insights(cache_name, version, lambda: arender_climate_insights(region_id))
+                response = HttpResponse(body, content_type="application/json", status=status.HTTP_200_OK)
+
+            except Exception as e:
+                return HttpResponse(
+                    orjson.dumps({"error": f"Failed to fetch climate insights: {e}"}),
+                    content_type="application/json",
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+
+        if last_modified is not None:
+            response.headers["Last-Modified"] = http_date(last_modified)
+        if etag is not None:
+            response.headers["ETag"] = etag
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            patch_cache_control(response, public=True, max_age=settings.CLIMATE_INSIGHTS_MAX_AGE)
+
+        return response
+
+
+class AsyncWineRegionView(View):
+    # WineRegionView
+    async def get(self, request):
+        wine_regions = await aserialize_wine_regions(WineRegion.objects.all())
+
+        return HttpResponse(orjson.dumps({'wine_regions': wine_regions}), content_type="application/json")
+
 
 # ********
 # TESTING 
@@ -37,10 +436,8 @@ class WineRegionView(APIView):
     def get(self, request, *args, **kwargs):
         wine_regions = WineRegion.objects.all()
         
-        wine_regions_serializer = WineRegionSerializer(wine_regions, many=True)
-        
         return Response({ 
-                'wine_regions': wine_regions_serializer.data 
+                'wine_regions': serialize_wine_regions(wine_regions)
             }, status=status.HTTP_200_OK) 
     
 class ClimateMetricsView(APIView):
@@ -13,4 +13,8 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'wine_climate.settings')
 
+# Processes serving requests through the ASGI application run the background task, unless
+# CLIMATE_BACKGROUND_JOBS says otherwise (see climate_api.apps)
+os.environ.setdefault('CLIMATE_BACKGROUND_JOBS', 'true')
+
 application = get_asgi_application()
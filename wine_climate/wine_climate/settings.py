@@ -91,9 +91,20 @@ DATABASES = {
     #     'ENGINE': 'django.db.backends.sqlite3',
     #     'NAME': BASE_DIR / 'db.sqlite3',
     # }
-    'default': dj_database_url.config(default=os.getenv('DATABASE_URL'))
+    'default': dj_database_url.config(
+        default=os.getenv('DATABASE_URL'),
+        conn_max_age=int(os.getenv('DATABASE_CONN_MAX_AGE', 0)),
+        conn_health_checks=True,
+    )
 }
 
+# The sync (WSGI) and async (ASGI) views share the one connection setup above. Set DATABASE_CONN_MAX_AGE to keep
+# connections open between requests under a WSGI server, whose worker threads are long-lived. Under an ASGI server
+# each request runs its queries in a thread of its own, so leave it at 0 there (connections are closed at the end of
+# each request) and put a pooler such as PgBouncer in front of the database if connecting becomes the bottleneck.
+# Either way the number of connections open at once is about the number of requests in flight, so it needs to stay
+# under the database's max_connections.
+
 if 'test' in sys.argv:
     DATABASES['default'] = {
         'ENGINE': 'django.db.backends.sqlite3',
@@ -101,6 +112,85 @@ if 'test' in sys.argv:
     }
 
 
+# Cache
+# Local memory by default, which is per process. Set REDIS_URL (e.g. redis://localhost:6379/0) to share one cache
+# between processes - any server that speaks the Redis protocol will do, and it needs the redis package installed.
+
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'wine-climate',
+        }
+    }
+
+
+# Climate data ingestion
+
+# Seconds between runs of the background task that fetches new metrics and recalculates insights
+CLIMATE_UPDATE_INTERVAL = int(os.getenv('CLIMATE_UPDATE_INTERVAL', 86400))
+
+# Whether this process runs that background task (and builds the nearest-region index at startup): 'true', 'false', or
+# 'auto' to run it only when serving requests - through wine_climate.wsgi, wine_climate.asgi or runserver, never in
+# management commands
+CLIMATE_BACKGROUND_JOBS = os.getenv('CLIMATE_BACKGROUND_JOBS', 'auto').lower()
+
+CLIMATE_API_URL = os.getenv('CLIMATE_API_URL', 'https://climate-api.open-meteo.com/v1/climate')
+
+# Number of regions sent in one climate API request, and how many of those requests run at the same time
+CLIMATE_FETCH_BATCH_SIZE = int(os.getenv('CLIMATE_FETCH_BATCH_SIZE', 10))
+CLIMATE_FETCH_CONCURRENCY = int(os.getenv('CLIMATE_FETCH_CONCURRENCY', 8))
+
+# Seconds to wait on each climate API request, and how often to retry a failed one (with exponential backoff)
+CLIMATE_FETCH_TIMEOUT = float(os.getenv('CLIMATE_FETCH_TIMEOUT', 60))
+CLIMATE_FETCH_RETRIES = int(os.getenv('CLIMATE_FETCH_RETRIES', 3))
+CLIMATE_FETCH_BACKOFF = float(os.getenv('CLIMATE_FETCH_BACKOFF', 0.5))
+
+# Number of ClimateMetrics rows per INSERT when the COPY fast path isn't available
+CLIMATE_METRICS_BATCH_SIZE = int(os.getenv('CLIMATE_METRICS_BATCH_SIZE', 5000))
+
+# Number of ClimateMetrics rows read, and written out, at a time by the bulk export
+CLIMATE_EXPORT_BATCH_SIZE = int(os.getenv('CLIMATE_EXPORT_BATCH_SIZE', 50000))
+
+
+# Climate insights
+
+# How insights are aggregated: 'rollup' (from the monthly rollups), 'orm' (from the daily metrics, in the database)
+# or 'array' (from the daily metrics, with NumPy in memory)
+CLIMATE_INSIGHTS_ENGINE = os.getenv('CLIMATE_INSIGHTS_ENGINE', 'rollup')
+
+# Cache that rendered insights responses are kept in, and for how many seconds. Entries are keyed on the version of the
+# insights in the database, so recalculated insights are picked up straight away whichever cache this is.
+CLIMATE_INSIGHTS_CACHE = os.getenv('CLIMATE_INSIGHTS_CACHE', 'default')
+CLIMATE_INSIGHTS_CACHE_TIMEOUT = int(os.getenv('CLIMATE_INSIGHTS_CACHE_TIMEOUT', 86400))
+
+# How long clients may use an insights response before checking back (sent as Cache-Control max-age). Insights change
+# at most once per update interval, so a client is at most this far behind a recalculation, and checking back with the
+# ETag it was given costs a 304 without a body.
+CLIMATE_INSIGHTS_MAX_AGE = int(os.getenv('CLIMATE_INSIGHTS_MAX_AGE', CLIMATE_UPDATE_INTERVAL // 24))
+
+# Retention for the insights history: every row is kept for CLIMATE_INSIGHTS_KEEP_DAILY_DAYS, then the last row of each
+# week up to CLIMATE_INSIGHTS_KEEP_WEEKLY_DAYS old, then the last row of each month. Compaction deletes this many rows
+# per transaction.
+CLIMATE_INSIGHTS_KEEP_DAILY_DAYS = int(os.getenv('CLIMATE_INSIGHTS_KEEP_DAILY_DAYS', 30))
+CLIMATE_INSIGHTS_KEEP_WEEKLY_DAYS = int(os.getenv('CLIMATE_INSIGHTS_KEEP_WEEKLY_DAYS', 365))
+CLIMATE_INSIGHTS_COMPACTION_BATCH_SIZE = int(os.getenv('CLIMATE_INSIGHTS_COMPACTION_BATCH_SIZE', 1000))
+
+
+# Wine regions
+
+# Most seconds a process goes between checking whether regions have changed, and so how long after a change its
+# nearest-region index can still be out of date. Each check is a count of the regions.
+WINE_REGION_INDEX_CHECK_INTERVAL = float(os.getenv('WINE_REGION_INDEX_CHECK_INTERVAL', 1))
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
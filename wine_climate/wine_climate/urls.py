@@ -22,7 +22,20 @@ urlpatterns = [
     path('admin/', admin.site.urls),
 
     path('api/climate-insights/', views.ClimateInsightsView.as_view()),
+    path('api/climate-insights/cache-stats', views.ClimateInsightsCacheStatsView.as_view()),
+    path('api/climate-insights/batch', views.ClimateInsightsBatchView.as_view()),
+    path('api/climate-insights/ranking', views.ClimateInsightsRankingView.as_view()),
     path('api/climate-insights/<region_id>', views.ClimateInsightsView.as_view()),
+    path('api/climate-insights/<int:region_id>/what-if', views.ClimateWhatIfInsightsView.as_view()),
+    path('api/climate-insights/<int:region_id>/window', views.ClimateWindowInsightsView.as_view()),
+    path('api/wine-regions/nearest', views.NearestWineRegionsView.as_view()),
+    path('api/climate-metrics/export', views.ClimateMetricsExportView.as_view()),
+    path('api/climate-metrics/<int:region_id>', views.ClimateMetricsSeriesView.as_view()),
+
+    # ASYNC (for ASGI servers)
+    path('api/async/climate-insights/', views.AsyncClimateInsightsView.as_view()),
+    path('api/async/climate-insights/<region_id>', views.AsyncClimateInsightsView.as_view()),
+    path('api/async/wine_regions/', views.AsyncWineRegionView.as_view()),
 
     # TESTING
     path('api/wine_regions/', views.WineRegionView.as_view()),